@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for Helios
+
+each module can be run as a script, and is exercised by the test suite
+"""
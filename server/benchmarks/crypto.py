@@ -0,0 +1,273 @@
+"""
+Micro-benchmarks of the crypto hot paths, with the production ElGamal parameters
+
+Run from the server directory, to time every benchmark and compare the
+results against the stored baseline:
+
+    python -m benchmarks.crypto --output results.json
+
+The baseline records the times of a reference machine. Regenerate it there
+with --save-baseline after an intended change in performance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "crypto-baseline.json")
+
+# a benchmark regresses when it gets this many times slower than its baseline
+DEFAULT_TOLERANCE = 1.5
+
+DEFAULT_ROUNDS = 5
+
+# the size of the discrete log table, as many votes as a tally can count
+DLOG_TABLE_SIZE = 1000
+
+# registered benchmarks, in order
+BENCHMARKS = []
+
+
+def benchmark(number=1):
+    """
+    register a benchmark, a function of the fixture timed number times per round
+    """
+
+    def register(func):
+        BENCHMARKS.append((func.__name__, func, number))
+        return func
+
+    return register
+
+
+class Fixture(object):
+    """
+    what the benchmarks work on: a keypair over the production parameters,
+    a ciphertext with its proofs, and a two-question ballot
+    """
+
+    def __init__(self):
+        from helios.crypto import algs
+        from helios.datatypes import LDObject
+        from helios.views import ELGAMAL_PARAMS
+        from helios.workflows import homomorphic
+
+        self.keypair = ELGAMAL_PARAMS.generate_keypair()
+        self.pk = self.keypair.pk
+        self.sk = self.keypair.sk
+
+        self.plaintexts = homomorphic.EncryptedAnswer.generate_plaintexts(self.pk)
+        self.randomness = algs.Utils.random_mpz_lt(self.pk.q)
+        self.ciphertext = self.pk.encrypt_with_r(self.plaintexts[1], self.randomness)
+        self.proof = self.disjunctive_proof()
+        assert self.verify_disjunctive_proof()
+
+        self.vote = homomorphic.EncryptedVote.fromElectionAndAnswers(
+            BenchmarkElection(self.pk), [[0], [1]]
+        )
+        self.vote_dict = LDObject.instantiate(
+            self.vote, datatype="legacy/EncryptedVote"
+        ).toDict()
+
+    def disjunctive_proof(self):
+        from helios.crypto import algs
+
+        return self.ciphertext.generate_disjunctive_encryption_proof(
+            self.plaintexts, 1, self.randomness, algs.EG_disjunctive_challenge_generator
+        )
+
+    def verify_disjunctive_proof(self):
+        from helios.crypto import algs
+
+        return self.ciphertext.verify_disjunctive_encryption_proof(
+            self.plaintexts, self.proof, algs.EG_disjunctive_challenge_generator
+        )
+
+
+class BenchmarkElection(object):
+    """
+    the parts of an election a ballot is encrypted for
+    """
+
+    uuid = "00000000-0000-0000-0000-000000000000"
+    hash = "benchmark"
+
+    def __init__(self, public_key, questions=None):
+        self.public_key = public_key
+        self.questions = questions or [
+            {"answers": ["yes", "no"], "min": 0, "max": 1},
+            {"answers": ["alice", "bob", "carol"], "min": 0, "max": 1},
+        ]
+
+
+@benchmark(number=10)
+def encrypt_with_r(fixture):
+    fixture.pk.encrypt_with_r(fixture.plaintexts[1], fixture.randomness)
+
+
+@benchmark(number=5)
+def disjunctive_proof_generation(fixture):
+    fixture.disjunctive_proof()
+
+
+@benchmark(number=5)
+def disjunctive_proof_verification(fixture):
+    fixture.verify_disjunctive_proof()
+
+
+@benchmark(number=10)
+def check_group_membership(fixture):
+    from helios.crypto import algs
+
+    ciphertext = algs.EGCiphertext(fixture.ciphertext.alpha, fixture.ciphertext.beta)
+    ciphertext.check_group_membership(fixture.pk)
+
+
+@benchmark(number=10)
+def decryption_factor_and_proof(fixture):
+    fixture.sk.decryption_factor_and_proof(fixture.ciphertext)
+
+
+@benchmark()
+def dlog_table(fixture):
+    from helios.workflows import homomorphic
+
+    table = homomorphic.DLogTable(base=fixture.pk.g, modulus=fixture.pk.p)
+    table.precompute(DLOG_TABLE_SIZE)
+
+
+@benchmark(number=10)
+def ballot_serialization(fixture):
+    from helios.datatypes import LDObject
+
+    LDObject.instantiate(fixture.vote, datatype="legacy/EncryptedVote").serialize()
+
+
+@benchmark(number=10)
+def ballot_deserialization(fixture):
+    from helios.datatypes import LDObject
+
+    LDObject.fromDict(fixture.vote_dict, type_hint="legacy/EncryptedVote")
+
+
+def run_benchmarks(rounds=DEFAULT_ROUNDS, names=None, number=None):
+    """
+    time the benchmarks, returns the results as a dictionary ready for JSON
+
+    each round runs a benchmark its own number of times, unless number is
+    given, and the time of one run is reported, from the best and the
+    median round.
+    """
+    from helios.views import ELGAMAL_PARAMS
+
+    fixture = Fixture()
+    results = {}
+    for name, func, default_number in BENCHMARKS:
+        if names and name not in names:
+            continue
+
+        runs = number or default_number
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(runs):
+                func(fixture)
+            times.append((time.perf_counter() - start) / runs)
+
+        results[name] = {
+            "best": min(times),
+            "median": statistics.median(times),
+            "rounds": rounds,
+            "number": runs,
+        }
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "p_bits": ELGAMAL_PARAMS.p.bit_length(),
+        "q_bits": ELGAMAL_PARAMS.q.bit_length(),
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    the benchmarks slower than their baseline by more than the tolerance,
+    as (name, ratio) pairs. benchmarks missing from either side are ignored.
+    """
+    regressions = []
+    for name, result in sorted(results["results"].items()):
+        if name not in baseline["results"]:
+            continue
+
+        ratio = result["best"] / baseline["results"][name]["best"]
+        if ratio > tolerance:
+            regressions.append((name, ratio))
+
+    return regressions
+
+
+def load_baseline(path=BASELINE_PATH):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def format_results(results, baseline=None):
+    lines = []
+    for name, result in results["results"].items():
+        line = "%-32s %10.3f ms" % (name, result["best"] * 1000)
+        if baseline and name in baseline["results"]:
+            line += "  %5.2fx baseline" % (
+                result["best"] / baseline["results"][name]["best"]
+            )
+        lines.append(line)
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("names", nargs="*", help="the benchmarks to run, all by default")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baseline instead of comparing",
+    )
+    options = parser.parse_args(argv)
+
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.base")
+    import django
+
+    django.setup()
+
+    results = run_benchmarks(rounds=options.rounds, names=options.names)
+    if options.output:
+        with open(options.output, "w") as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(format_results(results))
+        return 0
+
+    baseline = load_baseline(options.baseline)
+    print(format_results(results, baseline))
+
+    regressions = compare(results, baseline, tolerance=options.tolerance)
+    for name, ratio in regressions:
+        print("REGRESSION %s: %.2fx slower than the baseline" % (name, ratio))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+Election-scale macro benchmark, on a synthetic frozen election
+
+An election with a Helios trustee is frozen with the given questions, then
+filled with voters who each cast a valid encrypted ballot. Encrypting every
+ballot would take longer than what is measured, so a pool of encrypted
+answers, with their proofs, is generated ahead, in parallel, and each
+ballot is put together from it. The ballots are as expensive to verify,
+tally and decrypt as if they had been encrypted one by one.
+
+The phases are timed along with the peak resident memory so far:
+
+- generate: encrypting the pool of answers
+- store: inserting the voters and their cast votes, in batches
+- verify: verifying the cast votes, as the verification task does
+- compute_tally, helios_trustee_decrypt, combine_decryptions
+
+It runs against the default database. The rows are inserted with bulk
+queries that work on Postgres and SQLite alike.
+"""
+
+import datetime
+import multiprocessing
+import random
+import resource
+import sys
+import time
+import uuid
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from benchmarks.crypto import BenchmarkElection
+from helios.crypto import elgamal
+from helios.datatypes import LDObject
+from helios.models import CastVote, Election, Voter
+from helios.views import ELGAMAL_PARAMS
+from helios.workflows import homomorphic
+from helios_auth.models import User
+
+DEFAULT_POOL_SIZE = 100
+
+# small enough for the query parameter limit of SQLite
+DEFAULT_BATCH_SIZE = 500
+
+
+def peak_rss_mb():
+    """
+    the peak resident memory of this process so far, in megabytes
+    """
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return peak_rss / (1024 * 1024)
+    return peak_rss / 1024
+
+
+def make_questions(num_questions, num_answers):
+    return [
+        {
+            "answer_urls": [None] * num_answers,
+            "answers": ["answer %s" % a for a in range(num_answers)],
+            "choice_type": "approval",
+            "max": 1,
+            "min": 0,
+            "question": "question %s?" % q,
+            "result_type": "absolute",
+            "short_name": "question %s" % q,
+            "tally_type": "homomorphic",
+        }
+        for q in range(num_questions)
+    ]
+
+
+def encrypt_answer(task):
+    """
+    an encrypted answer selecting one choice, run in the worker processes
+    """
+    (p, q, g, y), questions, question_num, answer_num = task
+    pk = elgamal.PublicKey()
+    pk.p, pk.q, pk.g, pk.y = p, q, g, y
+
+    encrypted_answer = homomorphic.EncryptedAnswer.fromElectionAndAnswer(
+        BenchmarkElection(pk, questions), question_num, [answer_num]
+    )
+    return question_num, answer_num, encrypted_answer
+
+
+class ElectionBenchmark(object):
+    def __init__(
+        self,
+        num_voters,
+        num_questions=1,
+        num_answers=2,
+        pool_size=DEFAULT_POOL_SIZE,
+        processes=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        num_verify=None,
+        log=None,
+    ):
+        self.num_voters = num_voters
+        self.questions = make_questions(num_questions, num_answers)
+        self.pool_size = pool_size
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.num_verify = num_verify
+        self.log = log or (lambda message: None)
+
+        self.phases = []
+        self.election = None
+        self.election_hash = None
+        self.answer_pool = None
+        self.expected_result = None
+
+    def timed(self, phase, func, count=None):
+        """
+        run one phase of the benchmark and record how long it took
+        """
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+
+        result = {"phase": phase, "seconds": elapsed, "peak_rss_mb": peak_rss_mb()}
+        if count:
+            result["count"] = count
+            result["per_second"] = count / elapsed
+        self.phases.append(result)
+
+        self.log(
+            "%s: %.2fs%s, peak RSS %.0f MB"
+            % (
+                phase,
+                elapsed,
+                ", %.1f/s" % result["per_second"] if count else "",
+                result["peak_rss_mb"],
+            )
+        )
+
+    def create_election(self):
+        admin = User.objects.create(
+            user_type="password", user_id="benchmark-%s" % uuid.uuid4(), info={}
+        )
+        self.election, _ = Election.get_or_create(
+            uuid=str(uuid.uuid4()),
+            short_name="benchmark-%s" % uuid.uuid4(),
+            name="Election Benchmark",
+            description="",
+            admin=admin,
+        )
+        self.election.questions = self.questions
+        self.election.openreg = True
+        self.election.generate_trustee(ELGAMAL_PARAMS)
+        self.election.freeze()
+
+        # as the booth gets it, hashed from the stored election
+        self.election = Election.objects.get(id=self.election.id)
+        self.election_hash = self.election.hash.decode()
+
+    def generate_answer_pool(self):
+        pk = self.election.public_key
+        pk_values = (pk.p, pk.q, pk.g, pk.y)
+
+        # every choice of every question is selected in turn
+        tasks = [
+            (pk_values, self.questions, question_num, i % len(question["answers"]))
+            for question_num, question in enumerate(self.questions)
+            for i in range(self.pool_size)
+        ]
+
+        if self.processes > 1:
+            with multiprocessing.Pool(self.processes) as pool:
+                encrypted_answers = pool.map(encrypt_answer, tasks)
+        else:
+            encrypted_answers = [encrypt_answer(task) for task in tasks]
+
+        self.answer_pool = [[] for _ in self.questions]
+        for question_num, answer_num, encrypted_answer in encrypted_answers:
+            self.answer_pool[question_num].append((answer_num, encrypted_answer))
+
+    def make_vote(self):
+        """
+        a ballot put together from the pool, with the choices it makes
+        """
+        picks = [random.choice(answers) for answers in self.answer_pool]
+
+        vote = homomorphic.EncryptedVote()
+        vote.encrypted_answers = [encrypted_answer for _, encrypted_answer in picks]
+        vote.election_hash = self.election_hash
+        vote.election_uuid = self.election.uuid
+        return vote, [answer_num for answer_num, _ in picks]
+
+    def store_ballots(self):
+        self.expected_result = [[0] * len(q["answers"]) for q in self.questions]
+
+        for first in range(0, self.num_voters, self.batch_size):
+            count = min(self.batch_size, self.num_voters - first)
+            voters = []
+            for i in range(first, first + count):
+                voter = Voter(
+                    uuid=str(uuid.uuid4()),
+                    election=self.election,
+                    voter_login_id="voter%s" % i,
+                    voter_name="Voter %s" % i,
+                    voter_email="voter%s@example.com" % i,
+                )
+                voter.update_hashes()
+                voters.append(voter)
+            Voter.objects.bulk_create(voters)
+
+            # bulk_create doesn't set the primary keys on SQLite
+            voters = self.election.voter_set.filter(
+                voter_login_id__in=[v.voter_login_id for v in voters]
+            )
+
+            cast_at = datetime.datetime.utcnow()
+            cast_votes = []
+            for voter in voters:
+                vote, answer_nums = self.make_vote()
+                for question_num, answer_num in enumerate(answer_nums):
+                    self.expected_result[question_num][answer_num] += 1
+
+                cast_votes.append(
+                    CastVote(
+                        voter=voter,
+                        vote=vote,
+                        vote_hash=LDObject.instantiate(vote).hash.decode(),
+                        cast_at=cast_at,
+                        verified_at=cast_at,
+                    )
+                )
+            CastVote.objects.bulk_create(cast_votes)
+
+        # every voter's ballot is their latest verified vote
+        latest = CastVote.objects.filter(voter=OuterRef("pk")).order_by("-id")
+        self.election.voter_set.update(
+            cast_vote=Subquery(latest.values("id")[:1]),
+            vote_hash=Subquery(latest.values("vote_hash")[:1]),
+            cast_at=Subquery(latest.values("cast_at")[:1]),
+        )
+        self.election.reconcile_counters()
+
+    def verify_ballots(self):
+        cast_votes = CastVote.objects.filter(voter__election=self.election).order_by(
+            "id"
+        )
+        if self.num_verify is not None:
+            cast_votes = cast_votes[: self.num_verify]
+
+        for cast_vote in cast_votes.iterator():
+            if not cast_vote.vote.verify(cast_vote.voter.election):
+                raise Exception("ballot %s does not verify" % cast_vote.id)
+
+    def num_verified(self):
+        if self.num_verify is None:
+            return self.num_voters
+        return min(self.num_verify, self.num_voters)
+
+    def run(self):
+        """
+        run every phase, returns the results as a dictionary ready for JSON
+        """
+        self.create_election()
+
+        num_answers = self.pool_size * len(self.questions)
+        self.timed("generate", self.generate_answer_pool, count=num_answers)
+        self.timed("store", self.store_ballots, count=self.num_voters)
+        if self.num_verified():
+            self.timed("verify", self.verify_ballots, count=self.num_verified())
+        self.timed("compute_tally", self.election.compute_tally, count=self.num_voters)
+        self.timed("helios_trustee_decrypt", self.election.helios_trustee_decrypt)
+        self.timed("combine_decryptions", self.election.combine_decryptions)
+
+        return {
+            "voters": self.num_voters,
+            "questions": len(self.questions),
+            "answers": len(self.questions[0]["answers"]),
+            "pool_size": self.pool_size,
+            "processes": self.processes,
+            "result_ok": self.election.result == self.expected_result,
+            "phases": self.phases,
+        }
+
+
+def run_benchmark(keep=False, **kwargs):
+    """
+    run the benchmark in a transaction, rolled back unless keep
+    """
+    with transaction.atomic():
+        results = ElectionBenchmark(**kwargs).run()
+        if not keep:
+            transaction.set_rollback(True)
+
+    return results
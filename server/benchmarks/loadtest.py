@@ -0,0 +1,503 @@
+"""
+End-to-end load test of the cast flow, over HTTP
+
+Simulated voters go through the cast flow as a browser does, each with
+its own session:
+
+- login: the password voter login. Open registration voters come with a
+  site session instead, the site login being a third party's, and are
+  registered as they confirm their first ballot
+- cast: posting the encrypted ballot
+- cast_confirm_get, cast_confirm_post: confirming it, which queues its
+  verification
+- cast_done: the confirmation page
+- tracker: looking the ballot up by its tracker
+
+The ballots are encrypted ahead, so that only the server is measured. By
+default the server runs in this process, on a free local port, and cast
+votes are verified by eager Celery tasks, inside the confirming request.
+Given the URL of another server sharing the database, the load goes there.
+
+The report has the throughput, latency percentiles of every step, and the
+verification lag, from when a vote is cast to when it is verified.
+"""
+
+import collections
+import math
+import multiprocessing
+import re
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from celery import current_app
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.servers.basehttp import WSGIRequestHandler, WSGIServer
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+from benchmarks.election import encrypt_answer, make_questions
+from helios.crypto import utils as cryptoutils
+from helios.datatypes import LDObject
+from helios.models import CastVote, Election, Voter
+from helios.views import ELGAMAL_PARAMS
+from helios.workflows import homomorphic
+from helios_auth.models import User
+
+# voters arrive all at once (burst), evenly (steady), or faster and faster
+# until the polls close (rush), over the duration in seconds
+Scenario = collections.namedtuple(
+    "Scenario",
+    ["name", "voters", "concurrency", "arrival", "duration", "openreg", "tracker"],
+)
+
+SCENARIOS = collections.OrderedDict(
+    (scenario.name, scenario)
+    for scenario in [
+        Scenario(
+            name="closing_hour_rush",
+            voters=200,
+            concurrency=50,
+            arrival="rush",
+            duration=10.0,
+            openreg=False,
+            tracker=True,
+        ),
+        Scenario(
+            name="open_registration_burst",
+            voters=200,
+            concurrency=100,
+            arrival="burst",
+            duration=0.0,
+            openreg=True,
+            tracker=False,
+        ),
+        Scenario(
+            name="steady",
+            voters=100,
+            concurrency=10,
+            arrival="steady",
+            duration=10.0,
+            openreg=False,
+            tracker=True,
+        ),
+    ]
+)
+
+STEPS = [
+    "login",
+    "cast",
+    "cast_confirm_get",
+    "cast_confirm_post",
+    "cast_done",
+    "tracker",
+]
+
+PERCENTILES = (50, 90, 95, 99)
+
+# password users can't register themselves in an open election
+OPENREG_USER_TYPE = "google"
+
+CSRF_TOKEN_RE = re.compile(r'name="csrf_token" value="([^"]+)"')
+
+
+def arrival_times(arrival, num_voters, duration):
+    """
+    when each voter starts, in seconds from the start of the test
+    """
+    if arrival == "burst" or not duration:
+        return [0.0] * num_voters
+
+    if arrival == "rush":
+        # the arrival rate grows linearly up to the end
+        return [duration * math.sqrt(i / num_voters) for i in range(num_voters)]
+
+    return [duration * i / num_voters for i in range(num_voters)]
+
+
+def percentiles(values):
+    """
+    the nearest-rank percentiles of the values, with their mean and maximum
+    """
+    values = sorted(values)
+    if not values:
+        return {}
+
+    result = {
+        "p%s" % p: values[int(math.ceil(p / 100.0 * len(values))) - 1]
+        for p in PERCENTILES
+    }
+    result["mean"] = sum(values) / len(values)
+    result["max"] = values[-1]
+    return result
+
+
+class ThreadedWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StepFailed(Exception):
+    pass
+
+
+class VoterSession(object):
+    """
+    one simulated voter, going through the cast flow with a browser session
+    """
+
+    def __init__(self, load_test, credentials, ballot):
+        self.load_test = load_test
+        self.election_url = "%s/helios/elections/%s" % (
+            load_test.base_url,
+            load_test.election.uuid,
+        )
+        self.username, self.password = credentials
+        self.ballot = ballot
+        self.session = requests.Session()
+        if load_test.scenario.openreg:
+            self.session.cookies.set(settings.SESSION_COOKIE_NAME, self.password)
+        self.timings = []
+
+    def request(self, step, method, url, expected_status, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, url, allow_redirects=False, timeout=60, **kwargs
+            )
+        except requests.RequestException as e:
+            raise StepFailed("%s: %s" % (step, e))
+        finally:
+            self.timings.append((step, time.perf_counter() - start))
+
+        if response.status_code != expected_status:
+            raise StepFailed("%s: HTTP %s" % (step, response.status_code))
+
+        return response
+
+    def login(self):
+        response = self.request(
+            "login",
+            "POST",
+            self.election_url + "/password_voter_login",
+            302,
+            data={"voter_id": self.username, "password": self.password},
+        )
+        if "bad_voter_login" in response.headers["Location"]:
+            raise StepFailed("login: bad voter login")
+
+    def vote(self):
+        if not self.load_test.scenario.openreg:
+            self.login()
+        self.request(
+            "cast",
+            "POST",
+            self.election_url + "/cast",
+            302,
+            data={"encrypted_vote": self.ballot},
+        )
+
+        response = self.request(
+            "cast_confirm_get", "GET", self.election_url + "/cast_confirm", 200
+        )
+        csrf_token = CSRF_TOKEN_RE.search(response.text)
+        if "CAST this ballot" not in response.text or not csrf_token:
+            raise StepFailed("cast_confirm_get: not logged in as a voter")
+
+        self.request(
+            "cast_confirm_post",
+            "POST",
+            self.election_url + "/cast_confirm",
+            302,
+            data={"csrf_token": csrf_token.group(1)},
+        )
+        self.request("cast_done", "GET", self.election_url + "/cast_done", 200)
+
+        if self.load_test.scenario.tracker:
+            vote_hash = cryptoutils.hash_b64(self.ballot.encode("utf-8")).decode()
+            vote_tinyhash = next(CastVote(vote_hash=vote_hash).tinyhash_candidates())
+            self.request(
+                "tracker",
+                "GET",
+                "%s/helios/v/%s" % (self.load_test.base_url, vote_tinyhash),
+                200,
+            )
+
+
+class LoadTest(object):
+    def __init__(
+        self,
+        scenario,
+        base_url=None,
+        num_voters=None,
+        concurrency=None,
+        duration=None,
+        processes=None,
+        log=None,
+    ):
+        self.scenario = scenario._replace(
+            voters=num_voters or scenario.voters,
+            concurrency=concurrency or scenario.concurrency,
+            duration=scenario.duration if duration is None else duration,
+        )
+        self.base_url = base_url
+        self.processes = processes or multiprocessing.cpu_count()
+        self.log = log or (lambda message: None)
+
+        self.election = None
+        self.users = []
+        self.credentials = []
+        self.ballots = []
+        self.server = None
+
+    def setup(self):
+        """
+        the frozen election, its voters or users, and a ballot for each
+        """
+        admin = User.objects.create(
+            user_type="password", user_id="loadtest-%s" % uuid.uuid4(), info={}
+        )
+        self.users.append(admin)
+
+        self.election, _ = Election.get_or_create(
+            uuid=str(uuid.uuid4()),
+            short_name="loadtest-%s" % uuid.uuid4(),
+            name="Load Test",
+            description="",
+            admin=admin,
+        )
+        self.election.questions = make_questions(1, 2)
+        self.election.openreg = self.scenario.openreg
+        self.election.generate_trustee(ELGAMAL_PARAMS)
+
+        # short enough for the login forms
+        prefix = "loadtest-%s" % uuid.uuid4().hex[:12]
+        for i in range(self.scenario.voters):
+            username, password = "%s-%s" % (prefix, i), uuid.uuid4().hex
+            if self.scenario.openreg:
+                user = User.objects.create(
+                    user_type=OPENREG_USER_TYPE,
+                    user_id=username,
+                    name="Voter %s" % i,
+                    info={"name": "Voter %s" % i, "email": "%s@example.com" % username},
+                )
+                self.users.append(user)
+
+                # the session the site login would have left, its key as password
+                session = SessionStore()
+                session["user"] = {"type": user.user_type, "user_id": user.user_id}
+                session.create()
+                password = session.session_key
+            else:
+                Voter(
+                    uuid=str(uuid.uuid4()),
+                    election=self.election,
+                    voter_login_id=username,
+                    voter_password=password,
+                    voter_name="Voter %s" % i,
+                    voter_email="%s@example.com" % username,
+                ).save()
+            self.credentials.append((username, password))
+        self.election.reconcile_counters()
+        self.election.freeze()
+
+        # as the booth gets it, hashed from the stored election
+        self.election = Election.objects.get(id=self.election.id)
+
+        self.log("encrypting %s ballots" % self.scenario.voters)
+        self.ballots = self.encrypt_ballots()
+
+    def encrypt_ballots(self):
+        """
+        one distinct ballot per voter, as the booth would post it
+        """
+        pk = self.election.public_key
+        questions = self.election.questions
+        tasks = [
+            ((pk.p, pk.q, pk.g, pk.y), questions, 0, i % 2)
+            for i in range(self.scenario.voters)
+        ]
+        if self.processes > 1:
+            with multiprocessing.Pool(self.processes) as pool:
+                encrypted_answers = pool.map(encrypt_answer, tasks)
+        else:
+            encrypted_answers = [encrypt_answer(task) for task in tasks]
+
+        election_hash = self.election.hash.decode()
+        ballots = []
+        for _, _, encrypted_answer in encrypted_answers:
+            vote = homomorphic.EncryptedVote()
+            vote.encrypted_answers = [encrypted_answer]
+            vote.election_hash = election_hash
+            vote.election_uuid = self.election.uuid
+            ballots.append(LDObject.instantiate(vote).serialize())
+
+        return ballots
+
+    def start_server(self):
+        self.server = ThreadedWSGIServer(("127.0.0.1", 0), QuietRequestHandler)
+        self.server.set_app(get_wsgi_application())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = "http://127.0.0.1:%s" % self.server.server_port
+
+    def stop_server(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_voter(self, start, arrival_time, credentials, ballot):
+        delay = start + arrival_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+        voter_session = VoterSession(self, credentials, ballot)
+        try:
+            voter_session.vote()
+            error = None
+        except StepFailed as e:
+            error = str(e)
+
+        return voter_session.timings, error
+
+    def run_voters(self):
+        arrivals = arrival_times(
+            self.scenario.arrival, self.scenario.voters, self.scenario.duration
+        )
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.scenario.concurrency) as executor:
+            outcomes = list(
+                executor.map(
+                    lambda args: self.run_voter(start, *args),
+                    zip(arrivals, self.credentials, self.ballots),
+                )
+            )
+        return outcomes, time.perf_counter() - start
+
+    def verification_lags(self):
+        cast_votes = CastVote.objects.filter(voter__election=self.election)
+        lags = [
+            (verified_at - cast_at).total_seconds()
+            for cast_at, verified_at in cast_votes.exclude(verified_at=None).values_list(
+                "cast_at", "verified_at"
+            )
+        ]
+        return lags, cast_votes.exclude(invalidated_at=None).count()
+
+    def run(self):
+        """
+        run the scenario, returns the results as a dictionary ready for JSON
+        """
+        in_process = self.base_url is None
+        if in_process:
+            self.start_server()
+
+        self.log(
+            "%s: %s voters, %s at a time, against %s"
+            % (
+                self.scenario.name,
+                self.scenario.voters,
+                self.scenario.concurrency,
+                self.base_url,
+            )
+        )
+        try:
+            # the verification task runs in the confirming request, and no mail goes out
+            with override_settings(
+                EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"
+            ):
+                always_eager = current_app.conf.task_always_eager
+                current_app.conf.task_always_eager = True
+                try:
+                    outcomes, elapsed = self.run_voters()
+                finally:
+                    current_app.conf.task_always_eager = always_eager
+        finally:
+            if in_process:
+                self.stop_server()
+
+        timings = collections.defaultdict(list)
+        errors = collections.Counter()
+        for voter_timings, error in outcomes:
+            for step, seconds in voter_timings:
+                timings[step].append(seconds * 1000)
+            if error:
+                errors[error] += 1
+
+        num_requests = sum(len(t) for t in timings.values())
+        completed = sum(1 for _, error in outcomes if not error)
+        lags, num_invalidated = self.verification_lags()
+
+        return {
+            "scenario": self.scenario._asdict(),
+            "seconds": elapsed,
+            "completed": completed,
+            "errors": dict(errors),
+            "votes_per_second": completed / elapsed,
+            "requests_per_second": num_requests / elapsed,
+            "latency_ms": {
+                step: percentiles(timings[step]) for step in STEPS if step in timings
+            },
+            "verified": len(lags),
+            "invalidated": num_invalidated,
+            "verification_lag_s": percentiles(lags),
+        }
+
+    def teardown(self):
+        if self.election:
+            self.election.delete()
+        for user in self.users:
+            user.delete()
+        if self.scenario.openreg:
+            for _, session_key in self.credentials:
+                SessionStore(session_key).delete()
+
+
+def format_results(results):
+    lines = [
+        "%s voters cast in %.1fs, %.1f votes/s, %.1f requests/s, %s errors"
+        % (
+            results["completed"],
+            results["seconds"],
+            results["votes_per_second"],
+            results["requests_per_second"],
+            sum(results["errors"].values()),
+        )
+    ]
+    for error, count in results["errors"].items():
+        lines.append("  %s x %s" % (count, error))
+
+    lines.append(
+        "%-20s %9s %9s %9s %9s %9s" % ("latency (ms)", "p50", "p90", "p95", "p99", "max")
+    )
+    for step, latency in results["latency_ms"].items():
+        lines.append(
+            "%-20s %9.1f %9.1f %9.1f %9.1f %9.1f"
+            % (
+                step,
+                latency["p50"],
+                latency["p90"],
+                latency["p95"],
+                latency["p99"],
+                latency["max"],
+            )
+        )
+
+    lag = results["verification_lag_s"]
+    if lag:
+        lines.append(
+            "verification lag (s): p50 %.3f, p99 %.3f, max %.3f"
+            % (lag["p50"], lag["p99"], lag["max"])
+        )
+    lines.append(
+        "%s votes verified, %s invalidated"
+        % (results["verified"], results["invalidated"])
+    )
+
+    return "\n".join(lines)
@@ -40,6 +40,16 @@ DATABASES = {
     }
 }
 
+# frozen elections and users are cached, see Election.get_by_uuid
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env("REDIS_URL", default="redis://redis:6379/1"),
+        "TIMEOUT": int(env("CACHE_TIMEOUT", default="300")),
+        "OPTIONS": {"CLIENT_CLASS": "django_redis.client.DefaultClient"},
+    }
+}
+
 
 # Local time zone for this installation. Choices can be found here:
 # http://en.wikipedia.org/wiki/List_of_tz_zones_by_name
@@ -96,6 +106,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "helios.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "urls"
@@ -167,6 +178,9 @@ MEDIA_ROOT = str(APPS_DIR.path("media"))
 # a relative path where voter upload files are stored
 VOTER_UPLOAD_REL_PATH = "voters/%Y/%m/%d"
 
+# a relative path where the ballot exports of tallied elections are stored
+BALLOT_EXPORT_REL_PATH = "ballots/%Y/%m/%d"
+
 # Change your email settings
 DEFAULT_FROM_EMAIL = env("DEFAULT_FROM_EMAIL", default="ben@adida.net")
 DEFAULT_FROM_NAME = env("DEFAULT_FROM_NAME", default="Ben for Helios")
@@ -206,6 +220,43 @@ HELIOS_ADMIN_ONLY = False
 HELIOS_VOTERS_UPLOAD = True
 HELIOS_VOTERS_EMAIL = True
 
+# number of ballots between two checkpoints of a running tally (0 disables them)
+HELIOS_TALLY_CHECKPOINT_INTERVAL = int(
+    env("HELIOS_TALLY_CHECKPOINT_INTERVAL", default="1000")
+)
+
+# number of Celery tasks an election tally is split across (1 tallies serially)
+HELIOS_TALLY_SHARDS = int(env("HELIOS_TALLY_SHARDS", default="1"))
+
+# voter alias numbers each process reserves at once during open registration
+HELIOS_ALIAS_BLOCK_SIZE = int(env("HELIOS_ALIAS_BLOCK_SIZE", default="100"))
+
+# voter QR codes generated per query by the background job
+HELIOS_QR_CODE_BATCH_SIZE = int(env("HELIOS_QR_CODE_BATCH_SIZE", default="500"))
+
+# how long browsers may cache a voter QR code, in seconds
+HELIOS_QR_CODE_MAX_AGE = int(env("HELIOS_QR_CODE_MAX_AGE", default="2592000"))
+
+# how long proxies may serve the JSON of a frozen public election, in seconds
+HELIOS_ELECTION_JSON_MAX_AGE = int(env("HELIOS_ELECTION_JSON_MAX_AGE", default="60"))
+
+# fraction of requests profiled by helios.profiling.ProfilingMiddleware (0 disables it)
+HELIOS_PROFILING_SAMPLE_RATE = float(env("HELIOS_PROFILING_SAMPLE_RATE", default="0"))
+
+# count the crypto operations of each process, as shown on the stats pages; they
+# can also be turned on and off from there while running
+HELIOS_CRYPTO_COUNTERS = env("HELIOS_CRYPTO_COUNTERS", default="1") == "1"
+
+# seconds from cast to verified past which the stats pages warn that vote
+# verification is falling behind
+HELIOS_VERIFICATION_ALERT_SECONDS = int(
+    env("HELIOS_VERIFICATION_ALERT_SECONDS", default="60")
+)
+
+# seconds after which a background job that stopped reporting its progress is taken
+# for lost with its worker, and can be started again
+HELIOS_JOB_STALE_SECONDS = int(env("HELIOS_JOB_STALE_SECONDS", default="600"))
+
 # are elections private by default?
 HELIOS_PRIVATE_DEFAULT = False
 
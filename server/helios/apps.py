@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class HeliosConfig(AppConfig):
     name = "helios"
     verbose_name = "Helios"
+
+    def ready(self):
+        from helios.crypto import opcounters
+
+        if settings.HELIOS_CRYPTO_COUNTERS:
+            opcounters.enable()
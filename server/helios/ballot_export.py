@@ -0,0 +1,93 @@
+"""
+Export of the ballot bulletin board as newline-delimited JSON
+
+Each line is the latest verified cast vote of a voter, the ballot that is
+tallied. Only the exported columns are read, in keyset pages, and votes are
+decoded straight from their stored bytes, so memory use doesn't grow with
+the size of the election.
+"""
+
+import zlib
+
+from django.db import models
+
+from helios import utils
+from helios.datatypes import LDObject, ballotcodec
+
+BATCH_SIZE = 500
+
+# gzip container, with a constant header so that equal exports hash the same
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def short_ballot_dict(cast_at, voter_uuid, voter_hash, vote_hash):
+    """
+    the JSON of a short cast vote, from the columns of its voter
+    """
+    return {
+        "cast_at": LDObject.instantiate(cast_at, datatype="core/Timestamp").toDict(),
+        "vote_hash": vote_hash,
+        "voter_hash": voter_hash,
+        "voter_uuid": voter_uuid,
+    }
+
+
+def vote_dict(raw_vote):
+    """
+    the legacy dictionary of a stored vote, binary encoded or still legacy JSON
+    """
+    raw_vote = bytes(raw_vote)
+    if ballotcodec.is_encoded(raw_vote):
+        return ballotcodec.decode_dict(raw_vote)
+
+    return utils.from_json(raw_vote)
+
+
+def iter_ballots(election, batch_size=BATCH_SIZE):
+    # the raw bytes of the vote, without the field decoding them into crypto objects
+    raw_vote = models.ExpressionWrapper(
+        models.F("cast_vote__vote"), output_field=models.BinaryField()
+    )
+    ballots = (
+        election.voter_set.exclude(cast_vote=None)
+        .annotate(raw_vote=raw_vote)
+        .order_by("id")
+    )
+    last_voter_id = 0
+
+    while True:
+        rows = list(
+            ballots.filter(id__gt=last_voter_id).values_list(
+                "id", "cast_at", "uuid", "voter_hash", "vote_hash", "raw_vote"
+            )[:batch_size]
+        )
+        if not rows:
+            return
+
+        for row in rows:
+            ballot = short_ballot_dict(*row[1:5])
+            ballot["vote"] = vote_dict(row[5])
+            yield ballot
+
+        last_voter_id = rows[-1][0]
+
+
+def iter_ndjson(election, compress=False, batch_size=BATCH_SIZE):
+    """
+    the export as chunks of bytes, gzipped if compress
+    """
+    chunks = (
+        (utils.to_json(ballot) + "\n").encode("utf-8")
+        for ballot in iter_ballots(election, batch_size=batch_size)
+    )
+    if not compress:
+        yield from chunks
+        return
+
+    compressor = zlib.compressobj(wbits=GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+
+    yield compressor.flush()
@@ -11,7 +11,10 @@ import hashlib
 import logging
 import math
 
-from . import randpool, number
+from helios import profiling
+
+from . import opcounters, randpool, number
+from .opcounters import modexp
 
 
 # some utilities
@@ -61,6 +64,7 @@ class Utils:
             return y, x - (y * (a / b))
 
     @classmethod
+    @opcounters.counted("inverse")
     def inverse(cls, mpz, mod):
         # return cls.xgcd(mpz,mod)[0]
         return number.inverse(mpz, mod)
@@ -117,7 +121,7 @@ class ElGamal:
         # find g that generates the q-order subgroup
         while True:
             EG.g = Utils.random_mpz_lt(EG.p)
-            if pow(EG.g, EG.q, EG.p) == 1:
+            if modexp(EG.g, EG.q, EG.p) == 1:
                 break
 
         return EG
@@ -158,7 +162,7 @@ class EGKeyPair:
         self.pk.q = q
 
         self.sk.x = Utils.random_mpz_lt(q)
-        self.pk.y = pow(g, self.sk.x, p)
+        self.pk.y = modexp(g, self.sk.x, p)
 
         self.sk.pk = self.pk
 
@@ -170,6 +174,7 @@ class EGPublicKey:
         self.g = None
         self.q = None
 
+    @opcounters.counted("encrypt")
     def encrypt_with_r(self, plaintext, r, encode_message=False):
         """
         expecting plaintext.m to be a big integer
@@ -180,15 +185,15 @@ class EGPublicKey:
         # make sure m is in the right subgroup
         if encode_message:
             y = plaintext.m + 1
-            if pow(y, self.q, self.p) == 1:
+            if modexp(y, self.q, self.p) == 1:
                 m = y
             else:
                 m = -y % self.p
         else:
             m = plaintext.m
 
-        ciphertext.alpha = pow(self.g, r, self.p)
-        ciphertext.beta = (m * pow(self.y, r, self.p)) % self.p
+        ciphertext.alpha = modexp(self.g, r, self.p)
+        ciphertext.beta = (m * modexp(self.y, r, self.p)) % self.p
 
         return ciphertext
 
@@ -236,14 +241,15 @@ class EGPublicKey:
         result.y = (self.y * other.y) % result.p
         return result
 
+    @opcounters.counted("proof_verify")
     def verify_sk_proof(self, dlog_proof, challenge_generator=None):
         """
       verify the proof of knowledge of the secret key
       g^response = commitment * y^challenge
       """
-        left_side = pow(self.g, dlog_proof.response, self.p)
+        left_side = modexp(self.g, dlog_proof.response, self.p)
         right_side = (
-            dlog_proof.commitment * pow(self.y, dlog_proof.challenge, self.p)
+            dlog_proof.commitment * modexp(self.y, dlog_proof.challenge, self.p)
         ) % self.p
 
         expected_challenge = challenge_generator(dlog_proof.commitment) % self.q
@@ -269,7 +275,7 @@ class EGPublicKey:
         if not (number.size(self.q) >= 256):
             raise Exception("q of insufficient length. Should be 256 bits or greater.")
 
-        if pow(self.g, self.q, self.p) != 1:
+        if modexp(self.g, self.q, self.p) != 1:
             raise Exception("g does not generate subgroup of order q.")
 
         if not (1 < self.g < self.p - 1):
@@ -278,7 +284,7 @@ class EGPublicKey:
         if not (1 < self.y < self.p - 1):
             raise Exception("y out of range.")
 
-        if pow(self.y, self.q, self.p) != 1:
+        if modexp(self.y, self.q, self.p) != 1:
             raise Exception("g does not generate proper group.")
 
     @classmethod
@@ -307,12 +313,14 @@ class EGSecretKey:
         self.x = None
         self.pk = None
 
+    @opcounters.counted("decrypt")
     def decryption_factor(self, ciphertext):
         """
         provide the decryption factor, not yet inverted because of needed proof
         """
-        return pow(ciphertext.alpha, self.x, self.pk.p)
+        return modexp(ciphertext.alpha, self.x, self.pk.p)
 
+    @opcounters.counted("proof_generate")
     def decryption_factor_and_proof(self, ciphertext, challenge_generator=None):
         """
         challenge generator is almost certainly
@@ -334,6 +342,7 @@ class EGSecretKey:
 
         return dec_factor, proof
 
+    @opcounters.counted("decrypt")
     def decrypt(self, ciphertext, dec_factor=None, decode_m=False):
         """
         Decrypt a ciphertext. Optional parameter decides whether to encode the message into the proper subgroup.
@@ -354,6 +363,7 @@ class EGSecretKey:
         else:
             return EGPlaintext(m, self.pk)
 
+    @opcounters.counted("proof_generate")
     def prove_decryption(self, ciphertext):
         """
         given g, y, alpha, beta/(encoded m), prove equality of discrete log
@@ -368,17 +378,17 @@ class EGSecretKey:
         """
 
         m = (
-            Utils.inverse(pow(ciphertext.alpha, self.x, self.pk.p), self.pk.p)
+            Utils.inverse(modexp(ciphertext.alpha, self.x, self.pk.p), self.pk.p)
             * ciphertext.beta
         ) % self.pk.p
         beta_over_m = (ciphertext.beta * Utils.inverse(m, self.pk.p)) % self.pk.p
 
         # pick a random w
         w = Utils.random_mpz_lt(self.pk.q)
-        a = pow(self.pk.g, w, self.pk.p)
-        b = pow(ciphertext.alpha, w, self.pk.p)
+        a = modexp(self.pk.g, w, self.pk.p)
+        b = modexp(ciphertext.alpha, w, self.pk.p)
 
-        c = int(hashlib.sha1(str(a) + "," + str(b)).hexdigest(), 16)
+        c = int(hashlib.sha1((str(a) + "," + str(b)).encode("utf-8")).hexdigest(), 16)
 
         t = (w + self.x * c) % self.pk.q
 
@@ -396,6 +406,7 @@ class EGSecretKey:
 
     toJSONDict = to_dict
 
+    @opcounters.counted("proof_generate")
     def prove_sk(self, challenge_generator):
         """
       Generate a PoK of the secret key
@@ -404,7 +415,7 @@ class EGSecretKey:
       Prover computes response = w + x*challenge mod q, where x is the secret key.
       """
         w = Utils.random_mpz_lt(self.pk.q)
-        commitment = pow(self.pk.g, w, self.pk.p)
+        commitment = modexp(self.pk.g, w, self.pk.p)
         challenge = challenge_generator(commitment) % self.pk.q
         response = (w + (self.x * challenge)) % self.pk.q
 
@@ -473,8 +484,8 @@ class EGCiphertext:
         that's no good when we do plaintext encoding of 1.
         """
         new_c = EGCiphertext()
-        new_c.alpha = (self.alpha * pow(self.pk.g, r, self.pk.p)) % self.pk.p
-        new_c.beta = (self.beta * pow(self.pk.y, r, self.pk.p)) % self.pk.p
+        new_c.alpha = (self.alpha * modexp(self.pk.g, r, self.pk.p)) % self.pk.p
+        new_c.beta = (self.beta * modexp(self.pk.y, r, self.pk.p)) % self.pk.p
         new_c.pk = self.pk
 
         return new_c
@@ -502,6 +513,7 @@ class EGCiphertext:
 
         return self.alpha == other.alpha and self.beta == other.beta
 
+    @opcounters.counted("proof_generate")
     def generate_encryption_proof(self, plaintext, randomness, challenge_generator):
         """
       Generate the disjunctive encryption proof of encryption
@@ -513,8 +525,8 @@ class EGCiphertext:
         proof = EGZKProof()
 
         # compute A=g^w, B=y^w
-        proof.commitment["A"] = pow(self.pk.g, w, self.pk.p)
-        proof.commitment["B"] = pow(self.pk.y, w, self.pk.p)
+        proof.commitment["A"] = modexp(self.pk.g, w, self.pk.p)
+        proof.commitment["B"] = modexp(self.pk.y, w, self.pk.p)
 
         # generate challenge
         proof.challenge = challenge_generator(proof.commitment)
@@ -524,6 +536,7 @@ class EGCiphertext:
 
         return proof
 
+    @opcounters.counted("proof_generate")
     def simulate_encryption_proof(self, plaintext, challenge=None):
         # generate a random challenge if not provided
         if not challenge:
@@ -542,18 +555,19 @@ class EGCiphertext:
 
         # now we compute A and B
         proof.commitment["A"] = (
-            Utils.inverse(pow(self.alpha, proof.challenge, self.pk.p), self.pk.p)
-            * pow(self.pk.g, proof.response, self.pk.p)
+            Utils.inverse(modexp(self.alpha, proof.challenge, self.pk.p), self.pk.p)
+            * modexp(self.pk.g, proof.response, self.pk.p)
         ) % self.pk.p
         proof.commitment["B"] = (
             Utils.inverse(
-                pow(beta_over_plaintext, proof.challenge, self.pk.p), self.pk.p
+                modexp(beta_over_plaintext, proof.challenge, self.pk.p), self.pk.p
             )
-            * pow(self.pk.y, proof.response, self.pk.p)
+            * modexp(self.pk.y, proof.response, self.pk.p)
         ) % self.pk.p
 
         return proof
 
+    @opcounters.counted("proof_generate")
     def generate_disjunctive_encryption_proof(
         self, plaintexts, real_index, randomness, challenge_generator
     ):
@@ -595,6 +609,7 @@ class EGCiphertext:
 
         return EGZKDisjunctiveProof(proofs)
 
+    @opcounters.counted("proof_verify")
     def verify_encryption_proof(self, plaintext, proof):
         """
       Checks for the DDH tuple g, y, alpha, beta/plaintext.
@@ -604,27 +619,28 @@ class EGCiphertext:
       """
         # check that A, B are in the correct group
         if not (
-            pow(proof.commitment["A"], self.pk.q, self.pk.p) == 1
-            and pow(proof.commitment["B"], self.pk.q, self.pk.p) == 1
+            modexp(proof.commitment["A"], self.pk.q, self.pk.p) == 1
+            and modexp(proof.commitment["B"], self.pk.q, self.pk.p) == 1
         ):
             return False
 
         # check that g^response = A * alpha^challenge
-        first_check = pow(self.pk.g, proof.response, self.pk.p) == (
-            (pow(self.alpha, proof.challenge, self.pk.p) * proof.commitment["A"])
+        first_check = modexp(self.pk.g, proof.response, self.pk.p) == (
+            (modexp(self.alpha, proof.challenge, self.pk.p) * proof.commitment["A"])
             % self.pk.p
         )
 
         # check that y^response = B * (beta/m)^challenge
         beta_over_m = (self.beta * Utils.inverse(plaintext.m, self.pk.p)) % self.pk.p
-        second_check = pow(self.pk.y, proof.response, self.pk.p) == (
-            (pow(beta_over_m, proof.challenge, self.pk.p) * proof.commitment["B"])
+        second_check = modexp(self.pk.y, proof.response, self.pk.p) == (
+            (modexp(beta_over_m, proof.challenge, self.pk.p) * proof.commitment["B"])
             % self.pk.p
         )
 
         # print "1,2: %s %s " % (first_check, second_check)
         return first_check and second_check
 
+    @opcounters.counted("proof_verify")
     def verify_disjunctive_encryption_proof(
         self, plaintexts, proof, challenge_generator
     ):
@@ -655,6 +671,7 @@ class EGCiphertext:
             sum([p.challenge for p in proof.proofs]) % self.pk.q
         )
 
+    @opcounters.counted("proof_verify")
     def verify_decryption_proof(self, plaintext, proof):
         """
       Checks for the DDH tuple g, alpha, y, beta/plaintext
@@ -662,12 +679,14 @@ class EGCiphertext:
       """
         return False
 
+    @opcounters.counted("proof_verify")
     def verify_decryption_factor(self, dec_factor, dec_proof, public_key):
         """
       when a ciphertext is decrypted by a dec factor, the proof needs to be checked
       """
         pass
 
+    @opcounters.counted("decrypt")
     def decrypt(self, decryption_factors, public_key):
         """
       decrypt a ciphertext given a list of decryption factors (from multiple trustees)
@@ -681,6 +700,7 @@ class EGCiphertext:
 
         return running_decryption
 
+    @profiling.timed("crypto")
     def check_group_membership(self, pk):
         """
       checks to see if an ElGamal element belongs to the group in the pk
@@ -691,15 +711,37 @@ class EGCiphertext:
         elif not (1 < self.beta < pk.p - 1):
             return False
 
-        elif pow(self.alpha, pk.q, pk.p) != 1:
+        elif modexp(self.alpha, pk.q, pk.p) != 1:
             return False
 
-        elif pow(self.beta, pk.q, pk.p) != 1:
+        elif modexp(self.beta, pk.q, pk.p) != 1:
             return False
 
         else:
             return True
 
+    @classmethod
+    @profiling.timed("crypto")
+    def check_group_membership_batch(cls, elements, pk, n_bits=64):
+        """
+      checks at once whether many elements are likely to belong to the group
+      in the pk: each is raised to a small random exponent, and only their
+      product is raised to q, for one full exponentiation instead of one each.
+
+      this filters out malformed input, it is not a proof: an element crafted
+      with a component of small order may pass, so check_group_membership is
+      the check to rely on.
+      """
+        product = 1
+        for element in elements:
+            if not (1 < element < pk.p - 1):
+                return False
+
+            exponent = Utils.random_mpz(n_bits)
+            product = (product * modexp(element, exponent, pk.p)) % pk.p
+
+        return modexp(product, pk.q, pk.p) == 1
+
     def to_dict(self):
         return {"alpha": str(self.alpha), "beta": str(self.beta)}
 
@@ -734,6 +776,7 @@ class EGZKProof(object):
         self.response = None
 
     @classmethod
+    @opcounters.counted("proof_generate")
     def generate(cls, little_g, little_h, x, p, q, challenge_generator):
         """
       generate a DDH tuple proof, where challenge generator is
@@ -747,8 +790,8 @@ class EGZKProof(object):
         proof = cls()
 
         # compute A = little_g^w, B=little_h^w
-        proof.commitment["A"] = pow(little_g, w, p)
-        proof.commitment["B"] = pow(little_h, w, p)
+        proof.commitment["A"] = modexp(little_g, w, p)
+        proof.commitment["B"] = modexp(little_h, w, p)
 
         # get challenge
         proof.challenge = challenge_generator(proof.commitment)
@@ -779,25 +822,26 @@ class EGZKProof(object):
             "response": str(self.response),
         }
 
+    @opcounters.counted("proof_verify")
     def verify(self, little_g, little_h, big_g, big_h, p, q, challenge_generator=None):
         """
     Verify a DH tuple proof
     """
         # check that A, B are in the correct group
         if not (
-            pow(proof.commitment["A"], self.pk.q, self.pk.p) == 1
-            and pow(proof.commitment["B"], self.pk.q, self.pk.p) == 1
+            modexp(proof.commitment["A"], self.pk.q, self.pk.p) == 1
+            and modexp(proof.commitment["B"], self.pk.q, self.pk.p) == 1
         ):
             return False
 
         # check that little_g^response = A * big_g^challenge
-        first_check = pow(little_g, self.response, p) == (
-            (pow(big_g, self.challenge, p) * self.commitment["A"]) % p
+        first_check = modexp(little_g, self.response, p) == (
+            (modexp(big_g, self.challenge, p) * self.commitment["A"]) % p
         )
 
         # check that little_h^response = B * big_h^challenge
-        second_check = pow(little_h, self.response, p) == (
-            (pow(big_h, self.challenge, p) * self.commitment["B"]) % p
+        second_check = modexp(little_h, self.response, p) == (
+            (modexp(big_h, self.challenge, p) * self.commitment["B"]) % p
         )
 
         # check the challenge?
@@ -857,7 +901,7 @@ def EG_disjunctive_challenge_generator(commitments):
         array_to_hash.append(str(commitment["B"]))
 
     string_to_hash = ",".join(array_to_hash)
-    return int(hashlib.sha1(string_to_hash).hexdigest(), 16)
+    return int(hashlib.sha1(string_to_hash.encode("utf-8")).hexdigest(), 16)
 
 
 # a challenge generator for Fiat-Shamir with A,B commitment
@@ -11,6 +11,10 @@ ben@adida.net
 import hashlib
 import logging
 
+from helios import profiling
+
+from . import opcounters
+from .opcounters import modexp
 from .algs import Utils
 
 
@@ -39,7 +43,7 @@ class Cryptosystem(object):
         # find g that generates the q-order subgroup
         while True:
             EG.g = Utils.random_mpz_lt(EG.p)
-            if pow(EG.g, EG.q, EG.p) == 1:
+            if modexp(EG.g, EG.q, EG.p) == 1:
                 break
 
         return EG
@@ -60,6 +64,7 @@ class KeyPair(object):
         self.pk = PublicKey()
         self.sk = SecretKey()
 
+    @profiling.timed("crypto")
     def generate(self, p, q, g):
         """
       Generate an ElGamal keypair
@@ -69,7 +74,7 @@ class KeyPair(object):
         self.pk.q = q
 
         self.sk.x = Utils.random_mpz_lt(q)
-        self.pk.y = pow(g, self.sk.x, p)
+        self.pk.y = modexp(g, self.sk.x, p)
 
         self.sk.public_key = self.pk
 
@@ -81,6 +86,7 @@ class PublicKey:
         self.g = None
         self.q = None
 
+    @opcounters.counted("encrypt")
     def encrypt_with_r(self, plaintext, r, encode_message=False):
         """
         expecting plaintext.m to be a big integer
@@ -91,15 +97,15 @@ class PublicKey:
         # make sure m is in the right subgroup
         if encode_message:
             y = plaintext.m + 1
-            if pow(y, self.q, self.p) == 1:
+            if modexp(y, self.q, self.p) == 1:
                 m = y
             else:
                 m = -y % self.p
         else:
             m = plaintext.m
 
-        ciphertext.alpha = pow(self.g, r, self.p)
-        ciphertext.beta = (m * pow(self.y, r, self.p)) % self.p
+        ciphertext.alpha = modexp(self.g, r, self.p)
+        ciphertext.beta = (m * modexp(self.y, r, self.p)) % self.p
 
         return ciphertext
 
@@ -133,14 +139,16 @@ class PublicKey:
         result.y = (self.y * other.y) % result.p
         return result
 
+    @profiling.timed("crypto")
+    @opcounters.counted("proof_verify")
     def verify_sk_proof(self, dlog_proof, challenge_generator=None):
         """
       verify the proof of knowledge of the secret key
       g^response = commitment * y^challenge
       """
-        left_side = pow(self.g, dlog_proof.response, self.p)
+        left_side = modexp(self.g, dlog_proof.response, self.p)
         right_side = (
-            dlog_proof.commitment * pow(self.y, dlog_proof.challenge, self.p)
+            dlog_proof.commitment * modexp(self.y, dlog_proof.challenge, self.p)
         ) % self.p
 
         expected_challenge = challenge_generator(dlog_proof.commitment) % self.q
@@ -159,12 +167,14 @@ class SecretKey:
     def pk(self):
         return self.public_key
 
+    @opcounters.counted("decrypt")
     def decryption_factor(self, ciphertext):
         """
         provide the decryption factor, not yet inverted because of needed proof
         """
-        return pow(ciphertext.alpha, self.x, self.pk.p)
+        return modexp(ciphertext.alpha, self.x, self.pk.p)
 
+    @opcounters.counted("proof_generate")
     def decryption_factor_and_proof(self, ciphertext, challenge_generator=None):
         """
         challenge generator is almost certainly
@@ -186,6 +196,7 @@ class SecretKey:
 
         return dec_factor, proof
 
+    @opcounters.counted("decrypt")
     def decrypt(self, ciphertext, dec_factor=None, decode_m=False):
         """
         Decrypt a ciphertext. Optional parameter decides whether to encode the message into the proper subgroup.
@@ -206,6 +217,7 @@ class SecretKey:
         else:
             return Plaintext(m, self.pk)
 
+    @opcounters.counted("proof_generate")
     def prove_decryption(self, ciphertext):
         """
         given g, y, alpha, beta/(encoded m), prove equality of discrete log
@@ -220,17 +232,17 @@ class SecretKey:
         """
 
         m = (
-            Utils.inverse(pow(ciphertext.alpha, self.x, self.pk.p), self.pk.p)
+            Utils.inverse(modexp(ciphertext.alpha, self.x, self.pk.p), self.pk.p)
             * ciphertext.beta
         ) % self.pk.p
         beta_over_m = (ciphertext.beta * Utils.inverse(m, self.pk.p)) % self.pk.p
 
         # pick a random w
         w = Utils.random_mpz_lt(self.pk.q)
-        a = pow(self.pk.g, w, self.pk.p)
-        b = pow(ciphertext.alpha, w, self.pk.p)
+        a = modexp(self.pk.g, w, self.pk.p)
+        b = modexp(ciphertext.alpha, w, self.pk.p)
 
-        c = int(hashlib.sha1(str(a) + "," + str(b)).hexdigest(), 16)
+        c = int(hashlib.sha1((str(a) + "," + str(b)).encode("utf-8")).hexdigest(), 16)
 
         t = (w + self.x * c) % self.pk.q
 
@@ -243,6 +255,8 @@ class SecretKey:
             },
         )
 
+    @profiling.timed("crypto")
+    @opcounters.counted("proof_generate")
     def prove_sk(self, challenge_generator):
         """
       Generate a PoK of the secret key
@@ -251,7 +265,7 @@ class SecretKey:
       Prover computes response = w + x*challenge mod q, where x is the secret key.
       """
         w = Utils.random_mpz_lt(self.pk.q)
-        commitment = pow(self.pk.g, w, self.pk.p)
+        commitment = modexp(self.pk.g, w, self.pk.p)
         challenge = challenge_generator(commitment) % self.pk.q
         response = (w + (self.x * challenge)) % self.pk.q
 
@@ -296,8 +310,8 @@ class Ciphertext:
         that's no good when we do plaintext encoding of 1.
         """
         new_c = Ciphertext()
-        new_c.alpha = (self.alpha * pow(self.pk.g, r, self.pk.p)) % self.pk.p
-        new_c.beta = (self.beta * pow(self.pk.y, r, self.pk.p)) % self.pk.p
+        new_c.alpha = (self.alpha * modexp(self.pk.g, r, self.pk.p)) % self.pk.p
+        new_c.beta = (self.beta * modexp(self.pk.y, r, self.pk.p)) % self.pk.p
         new_c.pk = self.pk
 
         return new_c
@@ -325,6 +339,7 @@ class Ciphertext:
 
         return self.alpha == other.alpha and self.beta == other.beta
 
+    @opcounters.counted("proof_generate")
     def generate_encryption_proof(self, plaintext, randomness, challenge_generator):
         """
       Generate the disjunctive encryption proof of encryption
@@ -336,8 +351,8 @@ class Ciphertext:
         proof = ZKProof()
 
         # compute A=g^w, B=y^w
-        proof.commitment["A"] = pow(self.pk.g, w, self.pk.p)
-        proof.commitment["B"] = pow(self.pk.y, w, self.pk.p)
+        proof.commitment["A"] = modexp(self.pk.g, w, self.pk.p)
+        proof.commitment["B"] = modexp(self.pk.y, w, self.pk.p)
 
         # generate challenge
         proof.challenge = challenge_generator(proof.commitment)
@@ -347,6 +362,7 @@ class Ciphertext:
 
         return proof
 
+    @opcounters.counted("proof_generate")
     def simulate_encryption_proof(self, plaintext, challenge=None):
         # generate a random challenge if not provided
         if not challenge:
@@ -365,18 +381,19 @@ class Ciphertext:
 
         # now we compute A and B
         proof.commitment["A"] = (
-            Utils.inverse(pow(self.alpha, proof.challenge, self.pk.p), self.pk.p)
-            * pow(self.pk.g, proof.response, self.pk.p)
+            Utils.inverse(modexp(self.alpha, proof.challenge, self.pk.p), self.pk.p)
+            * modexp(self.pk.g, proof.response, self.pk.p)
         ) % self.pk.p
         proof.commitment["B"] = (
             Utils.inverse(
-                pow(beta_over_plaintext, proof.challenge, self.pk.p), self.pk.p
+                modexp(beta_over_plaintext, proof.challenge, self.pk.p), self.pk.p
             )
-            * pow(self.pk.y, proof.response, self.pk.p)
+            * modexp(self.pk.y, proof.response, self.pk.p)
         ) % self.pk.p
 
         return proof
 
+    @opcounters.counted("proof_generate")
     def generate_disjunctive_encryption_proof(
         self, plaintexts, real_index, randomness, challenge_generator
     ):
@@ -418,6 +435,7 @@ class Ciphertext:
 
         return ZKDisjunctiveProof(proofs)
 
+    @opcounters.counted("proof_verify")
     def verify_encryption_proof(self, plaintext, proof):
         """
       Checks for the DDH tuple g, y, alpha, beta/plaintext.
@@ -427,21 +445,22 @@ class Ciphertext:
       """
 
         # check that g^response = A * alpha^challenge
-        first_check = pow(self.pk.g, proof.response, self.pk.p) == (
-            (pow(self.alpha, proof.challenge, self.pk.p) * proof.commitment["A"])
+        first_check = modexp(self.pk.g, proof.response, self.pk.p) == (
+            (modexp(self.alpha, proof.challenge, self.pk.p) * proof.commitment["A"])
             % self.pk.p
         )
 
         # check that y^response = B * (beta/m)^challenge
         beta_over_m = (self.beta * Utils.inverse(plaintext.m, self.pk.p)) % self.pk.p
-        second_check = pow(self.pk.y, proof.response, self.pk.p) == (
-            (pow(beta_over_m, proof.challenge, self.pk.p) * proof.commitment["B"])
+        second_check = modexp(self.pk.y, proof.response, self.pk.p) == (
+            (modexp(beta_over_m, proof.challenge, self.pk.p) * proof.commitment["B"])
             % self.pk.p
         )
 
         # print "1,2: %s %s " % (first_check, second_check)
         return first_check and second_check
 
+    @opcounters.counted("proof_verify")
     def verify_disjunctive_encryption_proof(
         self, plaintexts, proof, challenge_generator
     ):
@@ -472,6 +491,7 @@ class Ciphertext:
             sum([p.challenge for p in proof.proofs]) % self.pk.q
         )
 
+    @opcounters.counted("proof_verify")
     def verify_decryption_proof(self, plaintext, proof):
         """
       Checks for the DDH tuple g, alpha, y, beta/plaintext
@@ -479,12 +499,14 @@ class Ciphertext:
       """
         return False
 
+    @opcounters.counted("proof_verify")
     def verify_decryption_factor(self, dec_factor, dec_proof, public_key):
         """
       when a ciphertext is decrypted by a dec factor, the proof needs to be checked
       """
         pass
 
+    @opcounters.counted("decrypt")
     def decrypt(self, decryption_factors, public_key):
         """
       decrypt a ciphertext given a list of decryption factors (from multiple trustees)
@@ -517,6 +539,7 @@ class ZKProof(object):
         self.response = None
 
     @classmethod
+    @opcounters.counted("proof_generate")
     def generate(cls, little_g, little_h, x, p, q, challenge_generator):
         """
       generate a DDH tuple proof, where challenge generator is
@@ -530,8 +553,8 @@ class ZKProof(object):
         proof = cls()
 
         # compute A = little_g^w, B=little_h^w
-        proof.commitment["A"] = pow(little_g, w, p)
-        proof.commitment["B"] = pow(little_h, w, p)
+        proof.commitment["A"] = modexp(little_g, w, p)
+        proof.commitment["B"] = modexp(little_h, w, p)
 
         # get challenge
         proof.challenge = challenge_generator(proof.commitment)
@@ -542,18 +565,19 @@ class ZKProof(object):
         # return proof
         return proof
 
+    @opcounters.counted("proof_verify")
     def verify(self, little_g, little_h, big_g, big_h, p, q, challenge_generator=None):
         """
     Verify a DH tuple proof
     """
         # check that little_g^response = A * big_g^challenge
-        first_check = pow(little_g, self.response, p) == (
-            (pow(big_g, self.challenge, p) * self.commitment["A"]) % p
+        first_check = modexp(little_g, self.response, p) == (
+            (modexp(big_g, self.challenge, p) * self.commitment["A"]) % p
         )
 
         # check that little_h^response = B * big_h^challenge
-        second_check = pow(little_h, self.response, p) == (
-            (pow(big_h, self.challenge, p) * self.commitment["B"]) % p
+        second_check = modexp(little_h, self.response, p) == (
+            (modexp(big_h, self.challenge, p) * self.commitment["B"]) % p
         )
 
         # check the challenge?
@@ -584,7 +608,7 @@ def disjunctive_challenge_generator(commitments):
         array_to_hash.append(str(commitment["B"]))
 
     string_to_hash = ",".join(array_to_hash)
-    return int(hashlib.sha1(string_to_hash).hexdigest(), 16)
+    return int(hashlib.sha1(string_to_hash.encode("utf-8")).hexdigest(), 16)
 
 
 # a challenge generator for Fiat-Shamir with A,B commitment
@@ -594,4 +618,4 @@ def fiatshamir_challenge_generator(commitment):
 
 def DLog_challenge_generator(commitment):
     string_to_hash = str(commitment)
-    return int(hashlib.sha1(string_to_hash).hexdigest(), 16)
+    return int(hashlib.sha1(string_to_hash.encode("utf-8")).hexdigest(), 16)
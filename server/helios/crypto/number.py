@@ -76,7 +76,7 @@ def inverse(u, v):
     u3, v3 = int(u), int(v)
     u1, v1 = 1, 0
     while v3 > 0:
-        q = u3 / v3
+        q = u3 // v3
         u1, v1 = v1, u1 - v1 * q
         u3, v3 = v3, u3 - v3 * q
     while u1 < 0:
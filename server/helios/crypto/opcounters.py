@@ -0,0 +1,188 @@
+"""
+Counters of the crypto operations done by this process
+
+Each operation is counted, along with the time it took, while counting is
+enabled, which it can be at any time with enable() and disable(). A call
+within another of the same operation is only counted once, by the outer
+one, so that a disjunctive proof counts as one proof. The times of
+different operations overlap: an encryption's time includes its modular
+exponentiations.
+
+counting() takes the counts of a block of code, enabling the counters
+for its duration.
+"""
+
+import threading
+import time
+from functools import wraps
+
+OPERATIONS = (
+    "modexp",
+    "inverse",
+    "encrypt",
+    "decrypt",
+    "proof_generate",
+    "proof_verify",
+    "dlog_lookup",
+)
+
+_enabled = False
+_lock = threading.Lock()
+_counts = dict.fromkeys(OPERATIONS, 0)
+_seconds = dict.fromkeys(OPERATIONS, 0.0)
+
+# the operations running in each thread
+_local = threading.local()
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def add(operation, seconds):
+    with _lock:
+        _counts[operation] += 1
+        _seconds[operation] += seconds
+
+
+def modexp(base, exponent, modulus):
+    """
+    pow(base, exponent, modulus), counted
+    """
+    if not _enabled:
+        return pow(base, exponent, modulus)
+
+    start = time.perf_counter()
+    result = pow(base, exponent, modulus)
+    add("modexp", time.perf_counter() - start)
+    return result
+
+
+def counted(operation):
+    """
+    count every call of the decorated function as the operation
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+
+            running = _local.__dict__.setdefault("running", set())
+            if operation in running:
+                return func(*args, **kwargs)
+
+            running.add(operation)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add(operation, time.perf_counter() - start)
+                running.discard(operation)
+
+        return wrapper
+
+    return decorator
+
+
+def snapshot():
+    """
+    the counts and cumulative seconds of every operation so far
+    """
+    with _lock:
+        return {
+            operation: {"count": _counts[operation], "seconds": _seconds[operation]}
+            for operation in OPERATIONS
+        }
+
+
+def reset():
+    with _lock:
+        for operation in OPERATIONS:
+            _counts[operation] = 0
+            _seconds[operation] = 0.0
+
+
+def difference(before, after):
+    return {
+        operation: {
+            "count": after[operation]["count"] - before[operation]["count"],
+            "seconds": after[operation]["seconds"] - before[operation]["seconds"],
+        }
+        for operation in OPERATIONS
+    }
+
+
+class counting(object):
+    """
+    count the operations of a block, in counts once it is over
+
+    the counters are process-wide: operations done by other threads during
+    the block are counted too.
+    """
+
+    def __init__(self):
+        self.counts = None
+
+    def __enter__(self):
+        self.was_enabled = _enabled
+        enable()
+        self.before = snapshot()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.counts = difference(self.before, snapshot())
+        if not self.was_enabled:
+            disable()
+
+
+def format_counts(counts):
+    """
+    the operations that happened, on one line, as they are logged
+    """
+    return ", ".join(
+        "%s=%s (%.1fms)" % (operation, c["count"], c["seconds"] * 1000)
+        for operation, c in counts.items()
+        if c["count"]
+    )
+
+
+def prometheus_text(counts, labels=None):
+    """
+    the counts in the Prometheus text exposition format
+    """
+    label_text = "".join(
+        ',%s="%s"' % (name, value) for name, value in sorted((labels or {}).items())
+    )
+    lines = [
+        "# HELP helios_crypto_operations_total Crypto operations done.",
+        "# TYPE helios_crypto_operations_total counter",
+    ]
+    for operation in OPERATIONS:
+        lines.append(
+            'helios_crypto_operations_total{operation="%s"%s} %s'
+            % (operation, label_text, counts[operation]["count"])
+        )
+
+    lines += [
+        "# HELP helios_crypto_operation_seconds_total Time spent in crypto operations.",
+        "# TYPE helios_crypto_operation_seconds_total counter",
+    ]
+    for operation in OPERATIONS:
+        lines.append(
+            'helios_crypto_operation_seconds_total{operation="%s"%s} %.6f'
+            % (operation, label_text, counts[operation]["seconds"])
+        )
+
+    return "\n".join(lines) + "\n"
@@ -26,7 +26,7 @@ And when data comes in:
   LDObject.deserialize(json_string, type=...)
 """
 
-from helios import utils
+from helios import profiling, utils
 from helios.crypto import utils as cryptoutils
 
 
@@ -83,9 +83,11 @@ class LDObjectContainer(object):
 
         return self._ld_object
 
+    @profiling.timed("serialization")
     def toJSONDict(self, complete=False):
         return self.ld_object.toJSONDict(complete=complete)
 
+    @profiling.timed("serialization")
     def toJSON(self):
         return self.ld_object.serialize()
 
@@ -121,6 +123,7 @@ class LDObject(object):
         self.structured_fields = {}
 
     @classmethod
+    @profiling.timed("serialization")
     def instantiate(cls, obj, datatype=None):
         "FIXME: should datatype override the object's internal datatype? probably not"
         if isinstance(obj, LDObject):
@@ -185,10 +188,12 @@ class LDObject(object):
                 new_val = self.process_value_in(f, d[f])
                 self._setattr_wrapped(f, new_val)
 
+    @profiling.timed("serialization")
     def serialize(self):
         d = self.toDict(complete=True)
         return utils.to_json(d)
 
+    @profiling.timed("serialization")
     def toDict(self, alternate_fields=None, complete=False):
         val = {}
 
@@ -217,6 +222,7 @@ class LDObject(object):
     toJSONDict = toDict
 
     @classmethod
+    @profiling.timed("serialization")
     def fromDict(cls, d, type_hint=None):
         # null objects
         if d is None:
@@ -0,0 +1,338 @@
+"""
+Compact binary encoding of encrypted votes
+
+An encoded vote is a small header followed by two columns of fixed-width
+big-endian integers: the group elements (ciphertexts and proof commitments)
+and the exponents (proof challenges and responses), both in document order.
+
+  magic (3 bytes) | version (1 byte)
+  group element width (2 bytes) | exponent width (2 bytes)
+  election hash | election uuid          (2 byte length + utf-8 each)
+  number of answers (2 bytes)
+  per answer: number of choices, proofs per individual proof,
+              proofs in the overall proof (2 bytes each)
+  group elements | exponents
+
+The encoding maps losslessly to the legacy JSON of the vote: encode() refuses
+any vote that would not decode back to the exact same legacy dictionary.
+"""
+
+import struct
+
+from helios.crypto import elgamal
+from helios.workflows import homomorphic
+
+MAGIC = b"\x00HB"
+VERSION = 1
+
+# marks a null string or proof list in the header
+NULL = 0xFFFF
+
+VOTE_FIELDS = {"answers", "election_hash", "election_uuid"}
+ANSWER_FIELDS = {"choices", "individual_proofs", "overall_proof"}
+
+
+class BallotEncodingError(Exception):
+    pass
+
+
+def is_encoded(data):
+    return bytes(data[: len(MAGIC)]) == MAGIC
+
+
+##
+## encoding
+##
+
+
+def _int(value):
+    if not isinstance(value, str):
+        raise BallotEncodingError("not a big integer: %r" % (value,))
+
+    return int(value)
+
+
+def _pack_count(count):
+    if count >= NULL:
+        raise BallotEncodingError("too many elements: %s" % count)
+
+    return struct.pack(">H", count)
+
+
+def _pack_optional_count(count):
+    if count is None:
+        return struct.pack(">H", NULL)
+
+    return _pack_count(count)
+
+
+def _pack_string(value):
+    if value is None:
+        return struct.pack(">H", NULL)
+
+    if not isinstance(value, str):
+        raise BallotEncodingError("not a string: %r" % (value,))
+
+    encoded = value.encode("utf-8")
+    return _pack_count(len(encoded)) + encoded
+
+
+def _pack_ints(values, width):
+    try:
+        return b"".join(value.to_bytes(width, "big") for value in values)
+    except OverflowError:
+        raise BallotEncodingError("negative integer")
+
+
+def _add_proofs(proofs, group, exponents):
+    for proof in proofs:
+        if set(proof) != {"commitment", "challenge", "response"}:
+            raise BallotEncodingError("unexpected proof fields")
+
+        commitment = proof["commitment"]
+        if set(commitment) != {"A", "B"}:
+            raise BallotEncodingError("unexpected commitment fields")
+
+        group.extend([_int(commitment["A"]), _int(commitment["B"])])
+        exponents.extend([_int(proof["challenge"]), _int(proof["response"])])
+
+
+def encode(vote_dict):
+    """
+    encode the legacy dictionary of an encrypted vote
+    """
+    try:
+        data = _encode(vote_dict)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        raise BallotEncodingError("malformed vote: %s" % e)
+
+    # anything non-canonical (leading zeros, signs...) would not survive
+    if decode_dict(data) != vote_dict:
+        raise BallotEncodingError("vote does not encode losslessly")
+
+    return data
+
+
+def _encode(vote_dict):
+    if set(vote_dict) != VOTE_FIELDS or not isinstance(vote_dict["answers"], list):
+        raise BallotEncodingError("unexpected vote fields")
+
+    group = []
+    exponents = []
+    answers_header = [_pack_count(len(vote_dict["answers"]))]
+
+    for answer in vote_dict["answers"]:
+        if set(answer) != ANSWER_FIELDS:
+            raise BallotEncodingError("unexpected answer fields")
+
+        choices = answer["choices"]
+        for choice in choices:
+            if set(choice) != {"alpha", "beta"}:
+                raise BallotEncodingError("unexpected ciphertext fields")
+            group.extend([_int(choice["alpha"]), _int(choice["beta"])])
+
+        individual_proofs = answer["individual_proofs"]
+        num_individual_proofs = None
+        if individual_proofs is not None:
+            if len(individual_proofs) != len(choices):
+                raise BallotEncodingError("one individual proof per choice expected")
+
+            num_individual_proofs = len(individual_proofs[0]) if choices else 0
+            for proofs in individual_proofs:
+                if len(proofs) != num_individual_proofs:
+                    raise BallotEncodingError("individual proofs of different sizes")
+                _add_proofs(proofs, group, exponents)
+
+        overall_proof = answer["overall_proof"]
+        num_overall_proofs = None
+        if overall_proof is not None:
+            num_overall_proofs = len(overall_proof)
+            _add_proofs(overall_proof, group, exponents)
+
+        answers_header.append(_pack_count(len(choices)))
+        answers_header.append(_pack_optional_count(num_individual_proofs))
+        answers_header.append(_pack_optional_count(num_overall_proofs))
+
+    group_width = max([(value.bit_length() + 7) // 8 for value in group] + [1])
+    exponent_width = max([(value.bit_length() + 7) // 8 for value in exponents] + [1])
+
+    return b"".join(
+        [
+            MAGIC,
+            struct.pack(">BHH", VERSION, group_width, exponent_width),
+            _pack_string(vote_dict["election_hash"]),
+            _pack_string(vote_dict["election_uuid"]),
+        ]
+        + answers_header
+        + [_pack_ints(group, group_width), _pack_ints(exponents, exponent_width)]
+    )
+
+
+##
+## decoding
+##
+
+
+class _Reader(object):
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def string(self):
+        (length,) = self.unpack(">H")
+        if length == NULL:
+            return None
+
+        value = bytes(self.data[self.offset : self.offset + length]).decode("utf-8")
+        self.offset += length
+        return value
+
+    def ints(self, count, width):
+        start = self.offset
+        self.offset += count * width
+        if self.offset > len(self.data):
+            raise BallotEncodingError("truncated ballot")
+
+        return [
+            int.from_bytes(self.data[i : i + width], "big")
+            for i in range(start, self.offset, width)
+        ]
+
+
+def _parse(data):
+    """
+    returns the election hash and uuid, the layout of the answers,
+    and iterators over the group elements and exponents
+    """
+    if not is_encoded(data):
+        raise BallotEncodingError("not an encoded ballot")
+
+    reader = _Reader(data)
+    reader.offset = len(MAGIC)
+
+    version, group_width, exponent_width = reader.unpack(">BHH")
+    if version != VERSION:
+        raise BallotEncodingError("unknown ballot encoding version %s" % version)
+
+    election_hash = reader.string()
+    election_uuid = reader.string()
+
+    (num_answers,) = reader.unpack(">H")
+    layout = [reader.unpack(">HHH") for _ in range(num_answers)]
+
+    num_group = 0
+    num_exponents = 0
+    for num_choices, num_individual_proofs, num_overall_proofs in layout:
+        num_proofs = 0
+        if num_individual_proofs != NULL:
+            num_proofs += num_choices * num_individual_proofs
+        if num_overall_proofs != NULL:
+            num_proofs += num_overall_proofs
+
+        num_group += 2 * num_choices + 2 * num_proofs
+        num_exponents += 2 * num_proofs
+
+    group = reader.ints(num_group, group_width)
+    exponents = reader.ints(num_exponents, exponent_width)
+
+    if reader.offset != len(reader.data):
+        raise BallotEncodingError("trailing data in ballot")
+
+    return election_hash, election_uuid, layout, iter(group), iter(exponents)
+
+
+def decode_dict(data):
+    """
+    decode to the legacy dictionary of the vote, without building crypto objects
+    """
+    election_hash, election_uuid, layout, group, exponents = _parse(data)
+
+    def proofs(count):
+        return [
+            {
+                "commitment": {"A": str(next(group)), "B": str(next(group))},
+                "challenge": str(next(exponents)),
+                "response": str(next(exponents)),
+            }
+            for _ in range(count)
+        ]
+
+    answers = []
+    for num_choices, num_individual_proofs, num_overall_proofs in layout:
+        choices = [
+            {"alpha": str(next(group)), "beta": str(next(group))}
+            for _ in range(num_choices)
+        ]
+
+        individual_proofs = None
+        if num_individual_proofs != NULL:
+            individual_proofs = [proofs(num_individual_proofs) for _ in choices]
+
+        overall_proof = None
+        if num_overall_proofs != NULL:
+            overall_proof = proofs(num_overall_proofs)
+
+        answers.append(
+            {
+                "choices": choices,
+                "individual_proofs": individual_proofs,
+                "overall_proof": overall_proof,
+            }
+        )
+
+    return {
+        "answers": answers,
+        "election_hash": election_hash,
+        "election_uuid": election_uuid,
+    }
+
+
+def decode(data):
+    """
+    decode straight to a homomorphic.EncryptedVote
+    """
+    election_hash, election_uuid, layout, group, exponents = _parse(data)
+
+    def proofs(count):
+        zk_proofs = []
+        for _ in range(count):
+            proof = elgamal.ZKProof()
+            proof.commitment = {"A": next(group), "B": next(group)}
+            proof.challenge = next(exponents)
+            proof.response = next(exponents)
+            zk_proofs.append(proof)
+        return elgamal.ZKDisjunctiveProof(zk_proofs)
+
+    encrypted_answers = []
+    for num_choices, num_individual_proofs, num_overall_proofs in layout:
+        choices = [
+            elgamal.Ciphertext(alpha=next(group), beta=next(group))
+            for _ in range(num_choices)
+        ]
+
+        individual_proofs = None
+        if num_individual_proofs != NULL:
+            individual_proofs = [proofs(num_individual_proofs) for _ in choices]
+
+        overall_proof = None
+        if num_overall_proofs != NULL:
+            overall_proof = proofs(num_overall_proofs)
+
+        encrypted_answers.append(
+            homomorphic.EncryptedAnswer(
+                choices=choices,
+                individual_proofs=individual_proofs,
+                overall_proof=overall_proof,
+            )
+        )
+
+    vote = homomorphic.EncryptedVote()
+    vote.encrypted_answers = encrypted_answers
+    vote.election_hash = election_hash
+    vote.election_uuid = election_uuid
+    return vote
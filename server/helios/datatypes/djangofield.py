@@ -6,11 +6,13 @@ http://www.djangosnippets.org/snippets/377/
 and adapted to LDObject
 """
 import json
+import zlib
 
 from django.db import models
 from pyparsing import basestring
 
-from . import LDObject
+from helios.utils import to_json
+from . import LDObject, ballotcodec
 
 
 class LDObjectField(models.TextField):
@@ -72,3 +74,205 @@ class LDObjectField(models.TextField):
     def value_to_string(self, obj):
         value = self._get_val_from_obj(obj)
         return self.get_db_prep_value(value, None)
+
+
+class EncryptedVoteField(models.BinaryField):
+    """
+    Stores an encrypted vote in the compact binary ballot encoding.
+
+    Rows that still hold the legacy JSON text (and votes the binary
+    encoding cannot represent exactly) are read and written as JSON.
+    """
+
+    TYPE_HINT = "legacy/EncryptedVote"
+
+    def to_python(self, value):
+        if value is None or isinstance(value, (bytes, memoryview, str)):
+            return self.from_db_value(value)
+
+        return value
+
+    def from_db_value(self, value, *args, **kwargs):
+        if value is None:
+            return None
+
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        else:
+            value = bytes(value)
+
+        if ballotcodec.is_encoded(value):
+            return ballotcodec.decode(value)
+
+        return LDObject.fromDict(
+            json.loads(value.decode("utf-8")), type_hint=self.TYPE_HINT
+        ).wrapped_obj
+
+    def get_prep_value(self, value):
+        if value is None or isinstance(value, (bytes, memoryview)):
+            return value
+
+        if isinstance(value, str):
+            vote_dict = json.loads(value)
+        else:
+            ld_object = LDObject.instantiate(value, datatype=self.TYPE_HINT)
+            vote_dict = ld_object.toDict(complete=True)
+
+        try:
+            return ballotcodec.encode(vote_dict)
+        except ballotcodec.BallotEncodingError:
+            return to_json(vote_dict).encode("utf-8")
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        if value is None:
+            return None
+
+        return LDObject.instantiate(value, datatype=self.TYPE_HINT).serialize()
+
+
+##
+## compressed fields
+##
+
+# compressed values start with this, followed by the compression algorithm;
+# anything else is a value stored as plain UTF-8 text
+COMPRESSED_MAGIC = b"\x00HZ"
+ZLIB = b"z"
+
+# short values are not worth compressing
+COMPRESSION_THRESHOLD = 128
+
+
+def compress(data):
+    if len(data) < COMPRESSION_THRESHOLD and not data.startswith(b"\x00"):
+        return data
+
+    return COMPRESSED_MAGIC + ZLIB + zlib.compress(data)
+
+
+def decompress(data):
+    if not data.startswith(COMPRESSED_MAGIC):
+        return data
+
+    algorithm = data[len(COMPRESSED_MAGIC) : len(COMPRESSED_MAGIC) + 1]
+    if algorithm != ZLIB:
+        raise Exception("unknown compression algorithm %r" % algorithm)
+
+    return zlib.decompress(data[len(COMPRESSED_MAGIC) + 1 :])
+
+
+class CompressedValue(object):
+    """
+    the raw column value of a compressed field, until it is first accessed
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+
+class CompressedFieldDescriptor(object):
+    """
+    decompresses and loads the value of a compressed field on first access
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+
+        attname = self.field.attname
+        if attname not in instance.__dict__:
+            instance.refresh_from_db(fields=[attname])
+
+        value = instance.__dict__[attname]
+        if isinstance(value, CompressedValue):
+            value = self.field.to_python(value)
+            instance.__dict__[attname] = value
+
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedFieldMixin(object):
+    """
+    Stores the serialized value of the field compressed in a bytea column.
+
+    Values are only decompressed and loaded when the attribute is first read,
+    and an untouched value is written back as is. Rows written before the
+    field was compressed are read as plain text.
+    """
+
+    def get_internal_type(self):
+        return "BinaryField"
+
+    def contribute_to_class(self, cls, name, **kwargs):
+        super(CompressedFieldMixin, self).contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.attname, CompressedFieldDescriptor(self))
+
+    def load(self, text):
+        return text
+
+    def from_db_value(self, value, *args, **kwargs):
+        if value is None:
+            return None
+
+        return CompressedValue(bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, CompressedValue):
+            value = value.data
+
+        if isinstance(value, (bytes, memoryview)):
+            value = decompress(bytes(value)).decode("utf-8")
+
+        if isinstance(value, str):
+            return self.load(value)
+
+        return value
+
+    def pre_save(self, model_instance, add):
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedValue):
+            return value
+
+        return super(CompressedFieldMixin, self).pre_save(model_instance, add)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if isinstance(value, CompressedValue):
+            return connection.Database.Binary(value.data)
+
+        if not prepared:
+            value = self.get_prep_value(value)
+
+        if value is None:
+            return None
+
+        return connection.Database.Binary(compress(value.encode("utf-8")))
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
+
+
+class CompressedTextField(CompressedFieldMixin, models.TextField):
+    pass
+
+
+class CompressedJSONField(CompressedFieldMixin, models.TextField):
+    def load(self, text):
+        return json.loads(text)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+
+        return json.dumps(value)
+
+
+class CompressedLDObjectField(CompressedFieldMixin, LDObjectField):
+    def load(self, text):
+        return LDObjectField.from_db_value(self, text)
@@ -28,6 +28,7 @@ ELECTION_BBOARD = "election@bboard"
 ELECTION_AUDITED_BALLOTS = "election@audited-ballots"
 
 ELECTION_GET_RANDOMNESS = "election@get-randomness"
+ELECTION_BOOTH_BUNDLE = "election@booth-bundle"
 ELECTION_ENCRYPT_BALLOT = "election@encrypt-ballot"
 ELECTION_QUESTIONS = "election@questions"
 ELECTION_SET_REG = "election@set-reg"
@@ -37,6 +38,8 @@ ELECTION_REGISTER = "election@register"
 ELECTION_FREEZE = "election@freeze"
 
 ELECTION_COMPUTE_TALLY = "election@compute-tally"
+ELECTION_JOBS = "election@jobs"
+ELECTION_PERFORMANCE = "election@performance"
 ELECTION_COMBINE_DECRYPTIONS = "election@combine-decryptions"
 ELECTION_RELEASE_RESULT = "election@release-result"
 
@@ -56,7 +59,9 @@ ELECTION_VOTERS_ELIGIBILITY = "election@voters@eligibility"
 ELECTION_VOTERS_EMAIL = "election@voters@email"
 ELECTION_VOTER = "election@voter"
 ELECTION_VOTER_DELETE = "election@voter@delete"
+ELECTION_VOTER_QR_CODE = "election@voter@qr-code"
 
 ELECTION_BALLOTS_LIST = "election@ballots@list"
+ELECTION_BALLOTS_EXPORT = "election@ballots@export"
 ELECTION_BALLOTS_VOTER = "election@ballots@voter"
 ELECTION_BALLOTS_VOTER_LAST = "election@ballots@voter@last"
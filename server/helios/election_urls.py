@@ -88,6 +88,11 @@ urlpatterns = [
     ),
     # get randomness
     url(r"^get-randomness$", views.get_randomness, name=names.ELECTION_GET_RANDOMNESS),
+    url(
+        r"^booth-bundle$",
+        views.one_election_booth_bundle,
+        name=names.ELECTION_BOOTH_BUNDLE,
+    ),
     # server-side encryption
     url(r"^encrypt-ballot$", views.encrypt_ballot, name=names.ELECTION_ENCRYPT_BALLOT),
     # construct election
@@ -113,6 +118,14 @@ urlpatterns = [
         views.one_election_compute_tally,
         name=names.ELECTION_COMPUTE_TALLY,
     ),
+    # progress of the background jobs
+    url(r"^jobs$", views.one_election_jobs, name=names.ELECTION_JOBS),
+    # how long each stage of the election took
+    url(
+        r"^performance$",
+        views.one_election_performance,
+        name=names.ELECTION_PERFORMANCE,
+    ),
     url(
         r"^combine_decryptions$",
         views.combine_decryptions,
@@ -163,8 +176,16 @@ urlpatterns = [
         views.voter_delete,
         name=names.ELECTION_VOTER_DELETE,
     ),
+    url(
+        r"^voters/(?P<voter_uuid>[^/]+)/qrcode.png$",
+        views.voter_qr_code,
+        name=names.ELECTION_VOTER_QR_CODE,
+    ),
     # ballots
     url(r"^ballots/$", views.ballot_list, name=names.ELECTION_BALLOTS_LIST),
+    url(
+        r"^ballots/export$", views.ballot_list_export, name=names.ELECTION_BALLOTS_EXPORT
+    ),
     url(
         r"^ballots/(?P<voter_uuid>[^/]+)/all$",
         views.voter_votes,
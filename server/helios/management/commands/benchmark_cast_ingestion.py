@@ -0,0 +1,131 @@
+"""
+measure how fast cast votes are ingested: the insert of each ballot with its
+tinyhash, then storing it as the voter's latest vote.
+
+runs against a throwaway election inside a transaction that is rolled back,
+so it can be pointed at a real database.
+"""
+
+import base64
+import os
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+
+from helios.crypto import elgamal
+from helios.models import CastVote, Election, Voter
+from helios.workflows import homomorphic
+from helios_auth.models import User
+
+
+def random_vote_hash(prefix=""):
+    vote_hash = base64.b64encode(os.urandom(32)).decode()[:-1]
+    return prefix + vote_hash[len(prefix) :]
+
+
+def synthetic_vote(election):
+    """
+    a vote of bare random ciphertexts, enough to be stored
+    """
+    vote = homomorphic.EncryptedVote()
+    vote.encrypted_answers = [
+        homomorphic.EncryptedAnswer(
+            choices=[
+                elgamal.Ciphertext(
+                    alpha=int.from_bytes(os.urandom(256), "big"),
+                    beta=int.from_bytes(os.urandom(256), "big"),
+                )
+                for _ in range(2)
+            ]
+        )
+    ]
+    vote.election_hash = random_vote_hash()
+    vote.election_uuid = election.uuid
+    return vote
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "benchmark the ingestion of cast votes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ballots", type=int, default=1000)
+        parser.add_argument(
+            "--colliding",
+            action="store_true",
+            help="give every ballot the same hash prefix, so that tinyhashes collide",
+        )
+
+    def handle(self, *args, **options):
+        num_ballots = options["ballots"]
+        prefix = random_vote_hash()[:CastVote.TINYHASH_MIN_LENGTH]
+
+        with transaction.atomic():
+            admin = User.objects.create(
+                user_type="password", user_id="benchmark-%s" % uuid.uuid4(), info={}
+            )
+            election, _ = Election.get_or_create(
+                short_name="benchmark-%s" % uuid.uuid4(),
+                name="Cast Ingestion Benchmark",
+                description="",
+                admin=admin,
+            )
+            voters = [
+                Voter(
+                    uuid=str(uuid.uuid4()),
+                    election=election,
+                    voter_login_id="voter%s" % i,
+                )
+                for i in range(num_ballots)
+            ]
+            # bulk_create doesn't call save(), which stores the hashes
+            for voter in voters:
+                voter.update_hashes()
+            Voter.objects.bulk_create(voters)
+
+            # bulk_create doesn't set the primary keys on Django 1.11
+            voters = list(election.voter_set.order_by("id"))
+
+            cast_votes = [
+                CastVote(
+                    voter=voter,
+                    vote=synthetic_vote(election),
+                    vote_hash=random_vote_hash(prefix if options["colliding"] else ""),
+                )
+                for voter in voters
+            ]
+
+            with CaptureQueriesContext(connection) as cast_queries:
+                start = time.perf_counter()
+                for cast_vote in cast_votes:
+                    cast_vote.save()
+                cast_time = time.perf_counter() - start
+
+            with CaptureQueriesContext(connection) as store_queries:
+                start = time.perf_counter()
+                for voter, cast_vote in zip(voters, cast_votes):
+                    cast_vote.verified_at = now()
+                    cast_vote.save()
+                    voter.store_vote(cast_vote)
+                store_time = time.perf_counter() - start
+
+            transaction.set_rollback(True)
+
+        for phase, elapsed, queries in [
+            ("cast", cast_time, cast_queries),
+            ("store", store_time, store_queries),
+        ]:
+            self.stdout.write(
+                "%s: %s ballots in %.2fs, %.1f ballots/s, %.1f queries/ballot"
+                % (
+                    phase,
+                    num_ballots,
+                    elapsed,
+                    num_ballots / elapsed,
+                    len(queries) / num_ballots,
+                )
+            )
@@ -0,0 +1,65 @@
+"""
+time the tally of a synthetic election with many voters, from the ballots
+to the result, along with the peak memory use.
+
+runs inside a transaction that is rolled back, unless --keep is given.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import election
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "benchmark verifying, tallying and decrypting a synthetic election"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--voters", type=int, default=1000)
+        parser.add_argument("--questions", type=int, default=1)
+        parser.add_argument("--answers", type=int, default=2)
+        parser.add_argument(
+            "--pool-size",
+            type=int,
+            default=election.DEFAULT_POOL_SIZE,
+            help="how many encrypted answers per question the ballots are made of",
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="processes encrypting the answers, one per CPU by default",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=election.DEFAULT_BATCH_SIZE
+        )
+        parser.add_argument(
+            "--verify",
+            type=int,
+            help="how many ballots to verify, all by default",
+        )
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument(
+            "--keep", action="store_true", help="keep the election in the database"
+        )
+
+    def handle(self, *args, **options):
+        results = election.run_benchmark(
+            keep=options["keep"],
+            num_voters=options["voters"],
+            num_questions=options["questions"],
+            num_answers=options["answers"],
+            pool_size=options["pool_size"],
+            processes=options["processes"],
+            batch_size=options["batch_size"],
+            num_verify=options["verify"],
+            log=self.stdout.write,
+        )
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
+
+        if not results["result_ok"]:
+            self.stderr.write("the result doesn't match the ballots")
@@ -0,0 +1,46 @@
+"""
+re-encode votes still stored as legacy JSON text in the binary ballot encoding
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from helios.models import CastVote
+
+# rows whose vote does not start with the binary encoding's leading zero byte
+LEGACY_VOTE_WHERE = "get_byte(vote, 0) <> 0"
+
+
+def convert_votes(model, batch_size):
+    converted = 0
+    last_id = 0
+
+    while True:
+        rows = list(
+            model.objects.exclude(vote=None)
+            .filter(id__gt=last_id)
+            .extra(where=[LEGACY_VOTE_WHERE])
+            .order_by("id")
+            .only("id", "vote")[:batch_size]
+        )
+        if not rows:
+            return converted
+
+        with transaction.atomic():
+            for row in rows:
+                model.objects.filter(id=row.id).update(vote=row.vote)
+
+        converted += len(rows)
+        last_id = rows[-1].id
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "convert votes stored as JSON text to the binary ballot encoding"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        converted = convert_votes(CastVote, options["batch_size"])
+        self.stdout.write("%s votes converted" % converted)
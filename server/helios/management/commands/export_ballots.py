@@ -0,0 +1,42 @@
+"""
+export the ballots of an election as newline-delimited JSON
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from helios import ballot_export
+from helios.models import Election
+
+
+class Command(BaseCommand):
+    args = "election_uuid"
+    help = "export the tallied ballots of an election as newline-delimited JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("election_uuid")
+        parser.add_argument("--output", help="file to write to, instead of stdout")
+        parser.add_argument("--gzip", action="store_true")
+        parser.add_argument(
+            "--batch-size", type=int, default=ballot_export.BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        election = Election.get_by_uuid(options["election_uuid"])
+        if not election:
+            raise CommandError("no election %s" % options["election_uuid"])
+
+        chunks = ballot_export.iter_ndjson(
+            election, compress=options["gzip"], batch_size=options["batch_size"]
+        )
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
@@ -79,6 +79,7 @@ def process_csv_file(election, f):
                 election=election,
             )
             voter.save()
+            election.increment_voters()
 
     return num_voters
 
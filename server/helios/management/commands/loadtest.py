@@ -0,0 +1,61 @@
+"""
+drive the cast flow over HTTP with many simulated voters, and report the
+throughput, latency percentiles and verification lag.
+
+the election, its voters and their ballots are created ahead, and deleted
+afterwards unless --keep is given.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from benchmarks import loadtest
+
+
+class Command(BaseCommand):
+    args = ""
+    help = "load test the cast flow against a local server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=list(loadtest.SCENARIOS))
+        parser.add_argument(
+            "--url",
+            help="the server to load, sharing this database, instead of one in this process",
+        )
+        parser.add_argument("--voters", type=int)
+        parser.add_argument("--concurrency", type=int)
+        parser.add_argument(
+            "--duration", type=float, help="the seconds over which voters arrive"
+        )
+        parser.add_argument(
+            "--processes",
+            type=int,
+            help="processes encrypting the ballots, one per CPU by default",
+        )
+        parser.add_argument("--output", help="write the results as JSON to this file")
+        parser.add_argument(
+            "--keep", action="store_true", help="keep the election in the database"
+        )
+
+    def handle(self, *args, **options):
+        load_test = loadtest.LoadTest(
+            loadtest.SCENARIOS[options["scenario"]],
+            base_url=options["url"] and options["url"].rstrip("/"),
+            num_voters=options["voters"],
+            concurrency=options["concurrency"],
+            duration=options["duration"],
+            processes=options["processes"],
+            log=self.stdout.write,
+        )
+        try:
+            load_test.setup()
+            results = load_test.run()
+        finally:
+            if not options["keep"]:
+                load_test.teardown()
+
+        self.stdout.write(loadtest.format_results(results))
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
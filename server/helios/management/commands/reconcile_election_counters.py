@@ -0,0 +1,31 @@
+"""
+recount voters, cast votes and queued votes of elections, repairing drifted counters
+"""
+
+from django.core.management.base import BaseCommand
+
+from helios.models import Election
+
+
+class Command(BaseCommand):
+    args = "[election_uuid ...]"
+    help = "repair the voter, cast vote and queued vote counters of elections"
+
+    def add_arguments(self, parser):
+        parser.add_argument("election_uuids", nargs="*")
+
+    def handle(self, *args, **options):
+        elections = Election.objects.order_by("id")
+        if options["election_uuids"]:
+            elections = elections.filter(uuid__in=options["election_uuids"])
+
+        num_drifted = 0
+        for election in elections.iterator():
+            if election.reconcile_counters():
+                num_drifted += 1
+                self.stdout.write(
+                    "%s: %s voters, %s cast votes"
+                    % (election.uuid, election.voters_count, election.cast_votes_count)
+                )
+
+        self.stdout.write("%s elections repaired" % num_drifted)
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:32
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import helios.datatypes.djangofield
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0002_qrcode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TallyCheckpoint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tally', helios.datatypes.djangofield.LDObjectField()),
+                ('last_voter_id', models.IntegerField()),
+                ('ballots_digest', models.CharField(max_length=100)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='helios.Election')),
+            ],
+        ),
+    ]
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:35
+from __future__ import unicode_literals
+
+from django.db import migrations
+import helios.datatypes.djangofield
+from helios.datatypes import ballotcodec
+from helios.utils import to_json
+
+
+# existing votes keep their JSON text, as UTF-8 bytes, and are still readable;
+# the convert_votes_to_binary command re-encodes them in batches afterwards
+TO_BYTEA = 'ALTER TABLE "helios_{table}" ALTER COLUMN "vote" TYPE bytea USING convert_to("vote", \'UTF8\')'
+TO_TEXT = 'ALTER TABLE "helios_{table}" ALTER COLUMN "vote" TYPE text USING convert_from("vote", \'UTF8\')'
+
+
+def decode_votes(apps, schema_editor):
+    """
+    before going back to text columns, store every encoded vote as its legacy JSON
+    """
+    with schema_editor.connection.cursor() as cursor:
+        for table in ['castvote', 'voter']:
+            cursor.execute(
+                'SELECT id, "vote" FROM "helios_{table}" WHERE substring("vote" from 1 for %s) = %s'.format(
+                    table=table
+                ),
+                [len(ballotcodec.MAGIC), ballotcodec.MAGIC],
+            )
+            for row_id, value in cursor.fetchall():
+                vote_json = to_json(ballotcodec.decode_dict(bytes(value)))
+                cursor.execute(
+                    'UPDATE "helios_{table}" SET "vote" = %s WHERE id = %s'.format(
+                        table=table
+                    ),
+                    [vote_json.encode('utf-8'), row_id],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0003_tallycheckpoint'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            TO_BYTEA.format(table='castvote'),
+            TO_TEXT.format(table='castvote'),
+            state_operations=[
+                migrations.AlterField(
+                    model_name='castvote',
+                    name='vote',
+                    field=helios.datatypes.djangofield.EncryptedVoteField(),
+                ),
+            ],
+        ),
+        migrations.RunSQL(
+            TO_BYTEA.format(table='voter'),
+            TO_TEXT.format(table='voter'),
+            state_operations=[
+                migrations.AlterField(
+                    model_name='voter',
+                    name='vote',
+                    field=helios.datatypes.djangofield.EncryptedVoteField(null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(migrations.RunPython.noop, decode_votes),
+    ]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# point each voter at the verified cast vote their copy of the vote came from
+LINK_CAST_VOTES = """
+UPDATE helios_voter SET cast_vote_id = (
+    SELECT c.id FROM helios_castvote c
+    WHERE c.voter_id = helios_voter.id
+      AND c.vote_hash = helios_voter.vote_hash
+      AND c.verified_at IS NOT NULL
+    ORDER BY c.cast_at DESC, c.id DESC
+    LIMIT 1
+)
+WHERE vote_hash IS NOT NULL
+"""
+
+COPY_CAST_VOTES = """
+UPDATE helios_voter SET vote = c.vote
+FROM helios_castvote c
+WHERE c.id = helios_voter.cast_vote_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0004_binary_votes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='cast_vote',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='helios.CastVote'),
+        ),
+        migrations.RunSQL(LINK_CAST_VOTES, COPY_CAST_VOTES),
+        migrations.RemoveField(
+            model_name='voter',
+            name='vote',
+        ),
+    ]
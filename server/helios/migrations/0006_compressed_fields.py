@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:38
+from __future__ import unicode_literals
+
+from django.db import migrations
+import helios.datatypes.djangofield
+
+
+# existing values are kept as plain UTF-8, which compressed fields still read
+TO_BYTEA = 'ALTER TABLE "helios_{table}" ALTER COLUMN "{column}" TYPE bytea USING convert_to("{column}"{cast}, \'UTF8\')'
+TO_TEXT = 'ALTER TABLE "helios_{table}" ALTER COLUMN "{column}" TYPE {type} USING convert_from("{column}", \'UTF8\'){cast}'
+
+COLUMNS = [
+    ('auditedballot', 'raw_vote', 'text'),
+    ('election', 'encrypted_tally', 'text'),
+    ('election', 'result_proof', 'jsonb'),
+    ('trustee', 'decryption_proofs', 'text'),
+    ('voterfile', 'voter_file_content', 'text'),
+]
+
+
+def alter_column(table, column, type, field):
+    # jsonb only converts to and from bytea through text
+    to_text, from_text = ('', '') if type == 'text' else ('::text', '::' + type)
+    return migrations.RunSQL(
+        TO_BYTEA.format(table=table, column=column, cast=to_text),
+        TO_TEXT.format(table=table, column=column, type=type, cast=from_text),
+        state_operations=[
+            migrations.AlterField(model_name=table, name=column, field=field),
+        ],
+    )
+
+
+def decompress_columns(apps, schema_editor):
+    """
+    before going back to text columns, store every value uncompressed
+    """
+    decompress = helios.datatypes.djangofield.decompress
+
+    with schema_editor.connection.cursor() as cursor:
+        for table, column, _ in COLUMNS:
+            cursor.execute(
+                'SELECT id, "{column}" FROM "helios_{table}" WHERE substring("{column}" from 1 for 1) = %s'.format(
+                    table=table, column=column
+                ),
+                [b'\x00'],
+            )
+            for row_id, value in cursor.fetchall():
+                cursor.execute(
+                    'UPDATE "helios_{table}" SET "{column}" = %s WHERE id = %s'.format(
+                        table=table, column=column
+                    ),
+                    [decompress(bytes(value)), row_id],
+                )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0005_voter_cast_vote'),
+    ]
+
+    operations = [
+        alter_column('auditedballot', 'raw_vote', 'text', helios.datatypes.djangofield.CompressedTextField()),
+        alter_column('election', 'encrypted_tally', 'text', helios.datatypes.djangofield.CompressedLDObjectField(null=True)),
+        alter_column('election', 'result_proof', 'jsonb', helios.datatypes.djangofield.CompressedJSONField(null=True)),
+        alter_column('trustee', 'decryption_proofs', 'text', helios.datatypes.djangofield.CompressedLDObjectField(null=True)),
+        alter_column('voterfile', 'voter_file_content', 'text', helios.datatypes.djangofield.CompressedTextField(null=True)),
+        migrations.RunPython(migrations.RunPython.noop, decompress_columns),
+    ]
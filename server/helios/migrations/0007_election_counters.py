@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:39
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0006_compressed_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='cast_votes_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='election',
+            name='voters_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            """
+            update helios_election set
+              voters_count = (
+                select count(*) from helios_voter
+                where helios_voter.election_id = helios_election.id),
+              cast_votes_count = (
+                select count(*) from helios_voter
+                where helios_voter.election_id = helios_election.id
+                and helios_voter.cast_vote_id is not null)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0007_election_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='alias_counter',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            r"""
+            update helios_election set alias_counter = coalesce((
+              select max(cast(substring(alias, 2) as integer)) from helios_voter
+              where helios_voter.election_id = helios_election.id
+              and alias ~ '^V[0-9]+$'), 0)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
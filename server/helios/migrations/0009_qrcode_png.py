@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0008_election_alias_counter'),
+    ]
+
+    operations = [
+        # so that the column can be restored before its values when migrating back
+        migrations.AlterField(
+            model_name='qrcode',
+            name='image_base64',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='qrcode',
+            name='image',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.AddField(
+            model_name='qrcode',
+            name='etag',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        # the base64 was saved as the repr of a bytes object, b'...'
+        migrations.RunSQL(
+            r"""
+            update helios_qrcode set image = decode(
+              regexp_replace(image_base64, '^b''(.*)''$', '\1'), 'base64')
+            """,
+            r"""
+            update helios_qrcode set image_base64 =
+              replace(encode(image, 'base64'), E'\n', '');
+            set constraints all immediate
+            """,
+        ),
+        migrations.RunSQL(
+            "update helios_qrcode set etag = md5(image); set constraints all immediate",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='qrcode',
+            name='image',
+            field=models.BinaryField(),
+        ),
+        migrations.AlterField(
+            model_name='qrcode',
+            name='etag',
+            field=models.CharField(max_length=32),
+        ),
+        migrations.RemoveField(
+            model_name='qrcode',
+            name='image_base64',
+        ),
+    ]
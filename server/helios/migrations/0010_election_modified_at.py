@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:47
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0009_qrcode_png'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='election',
+            name='modified_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
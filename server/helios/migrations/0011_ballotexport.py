@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 10:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0010_election_modified_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BallotExport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_file', models.FileField(max_length=250, upload_to='ballots/%Y/%m/%d')),
+                ('sha256', models.CharField(max_length=64)),
+                ('num_ballots', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('election', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='helios.Election')),
+            ],
+        ),
+    ]
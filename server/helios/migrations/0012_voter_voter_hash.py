@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 11:34
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from helios.crypto.utils import hash_b64
+from helios.datatypes import LDObject
+
+
+class VoterFields(object):
+    """
+    the fields of the JSON of a voter, as the Voter model computes them
+    """
+
+    def __init__(self, voter):
+        if voter.user_id:
+            voter_type = voter.user.user_type
+            voter_id = voter.user.user_id
+            name = voter.user.name
+        else:
+            voter_type, voter_id, name = 'password', voter.voter_email, voter.voter_name
+
+        value_to_hash = voter.voter_login_id or voter_id
+        try:
+            value_to_hash = value_to_hash.encode('latin-1')
+        except UnicodeEncodeError:
+            value_to_hash = value_to_hash.encode('utf-8')
+
+        self.election_uuid = voter.election.uuid
+        self.uuid = voter.uuid
+        self.alias = voter.alias
+        self.voter_type = voter_type
+        self.voter_id_hash = hash_b64(value_to_hash).decode()
+        self.name = name
+
+
+def fill_voter_hashes(apps, schema_editor):
+    Voter = apps.get_model('helios', 'Voter')
+
+    voters = Voter.objects.select_related('election', 'user').order_by('id')
+    for voter in voters.iterator():
+        datatype = voter.election.datatype.replace('Election', 'Voter')
+        voter_hash = LDObject.instantiate(VoterFields(voter), datatype=datatype).hash
+        Voter.objects.filter(id=voter.id).update(voter_hash=voter_hash.decode())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0011_ballotexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='voter_hash',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_voter_hashes, migrations.RunPython.noop),
+    ]
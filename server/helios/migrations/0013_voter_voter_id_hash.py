@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 11:40
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from helios.crypto.utils import hash_b64
+
+
+def fill_voter_id_hashes(apps, schema_editor):
+    Voter = apps.get_model('helios', 'Voter')
+
+    voters = Voter.objects.select_related('user').order_by('id')
+    for voter in voters.iterator():
+        if voter.voter_login_id:
+            value_to_hash = voter.voter_login_id
+        elif voter.user_id:
+            value_to_hash = voter.user.user_id
+        else:
+            value_to_hash = voter.voter_email
+
+        try:
+            value_to_hash = value_to_hash.encode('latin-1')
+        except UnicodeEncodeError:
+            value_to_hash = value_to_hash.encode('utf-8')
+
+        Voter.objects.filter(id=voter.id).update(
+            voter_id_hash=hash_b64(value_to_hash).decode()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0012_voter_voter_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='voter',
+            name='voter_id_hash',
+            field=models.CharField(max_length=100, null=True),
+        ),
+        migrations.RunPython(fill_voter_id_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 12:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0013_voter_voter_id_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='election',
+            name='queued_votes_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunSQL(
+            """
+            update helios_election set
+              queued_votes_count = (
+                select count(*) from helios_castvote
+                join helios_voter on helios_voter.id = helios_castvote.voter_id
+                where helios_voter.election_id = helios_election.id
+                and helios_castvote.verified_at is null
+                and helios_castvote.invalidated_at is null)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.20 on 2026-10-19 12:07
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('helios', '0015_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectionStageTiming',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(max_length=50)),
+                ('label', models.CharField(max_length=250, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('num_items', models.IntegerField(null=True)),
+                ('peak_per_minute', models.IntegerField(null=True)),
+                ('num_voters', models.IntegerField()),
+                ('num_cast_votes', models.IntegerField()),
+                ('election', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='helios.Election')),
+            ],
+        ),
+    ]
@@ -9,24 +9,50 @@ Ben Adida
 import copy
 import csv
 import datetime
+import gzip
+import hashlib
 import io
 import random
+import tempfile
+import threading
 import uuid
+from contextlib import contextmanager
 
 import bleach
 import csv
 from django.conf import settings
-from django.contrib.postgres.fields import JSONField
-from django.db import models, transaction
+from django.core.cache import cache
+from django.core.files import File
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import TruncMinute
+from django.utils import timezone
 
-from helios import datatypes
+from helios import ballot_export, datatypes, pipeline
 from helios import utils as heliosutils
 from helios.crypto import algs, utils
-from helios.datatypes.djangofield import LDObjectField
+from helios.datatypes.djangofield import (
+    CompressedJSONField,
+    CompressedLDObjectField,
+    CompressedTextField,
+    EncryptedVoteField,
+    LDObjectField,
+)
 
 # useful stuff in helios_auth
 from helios_auth.models import User, AUTH_SYSTEMS
 
+# blocks of voter alias numbers reserved by this process, per election id
+_alias_blocks = {}
+_alias_blocks_lock = threading.Lock()
+
+
+def clear_alias_blocks():
+    """
+    forget the reserved blocks, for when the reservations were rolled back
+    """
+    with _alias_blocks_lock:
+        _alias_blocks.clear()
+
 
 class HeliosModel(models.Model, datatypes.LDObjectContainer):
     class Meta:
@@ -90,7 +116,7 @@ class Election(HeliosModel):
 
     # dates at which this was touched
     created_at = models.DateTimeField(auto_now_add=True)
-    modified_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
 
     # dates at which things happen for the election
     frozen_at = models.DateTimeField(auto_now_add=False, default=None, null=True)
@@ -144,14 +170,14 @@ class Election(HeliosModel):
 
     # encrypted tally, each a JSON string
     # used only for homomorphic tallies
-    encrypted_tally = LDObjectField(type_hint="legacy/Tally", null=True)
+    encrypted_tally = CompressedLDObjectField(type_hint="legacy/Tally", null=True)
 
     # results of the election
     result = LDObjectField(type_hint="legacy/Result", null=True)
 
     # decryption proof, a JSON object
     # no longer needed since it's all trustees
-    result_proof = JSONField(null=True)
+    result_proof = CompressedJSONField(null=True)
 
     # help email
     help_email = models.EmailField(null=True)
@@ -159,6 +185,145 @@ class Election(HeliosModel):
     # downloadable election info
     election_info_url = models.CharField(max_length=300, null=True)
 
+    # denormalized counters, only ever changed with atomic updates
+    voters_count = models.IntegerField(default=0)
+    cast_votes_count = models.IntegerField(default=0)
+
+    # cast votes waiting for verification, indexed to find the elections with a queue
+    queued_votes_count = models.IntegerField(default=0, db_index=True)
+
+    # highest voter alias number handed out so far
+    alias_counter = models.IntegerField(default=0)
+
+    COUNTER_FIELDS = (
+        "voters_count",
+        "cast_votes_count",
+        "queued_votes_count",
+        "alias_counter",
+    )
+
+    def save(self, *args, **kwargs):
+        """
+    never write back the counters, which may have changed since this election was loaded
+    """
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+
+        super(Election, self).save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super(Election, self).delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+
+    ##
+    ## cache of frozen elections, looked up by uuid on every election view
+    ##
+
+    CACHE_VERSION = 1
+
+    @classmethod
+    def cache_key(cls, uuid):
+        return "helios:election:v%s:%s" % (cls.CACHE_VERSION, uuid)
+
+    def invalidate_cache(self):
+        key = self.cache_key(self.uuid)
+        cache.delete(key)
+
+        # again once committed, in case a concurrent request cached the old row
+        transaction.on_commit(lambda: cache.delete(key))
+
+    def cache_snapshot(self):
+        """
+    a copy of the election to cache, without the counters, which change with every
+    vote. they are deferred, and read from the database when first accessed.
+
+    related objects are left out too: the admin user holds a password and a token,
+    and would go stale in the cache.
+    """
+        snapshot = copy.copy(self)
+        for field_name in self.COUNTER_FIELDS:
+            snapshot.__dict__.pop(field_name, None)
+
+        for field in self._meta.concrete_fields:
+            if field.is_relation:
+                snapshot.__dict__.pop(field.get_cache_name(), None)
+        snapshot.__dict__.pop("_prefetched_objects_cache", None)
+
+        return snapshot
+
+    def refresh_from_db(self, using=None, fields=None):
+        # deferred counters are all read at once, when the first of them is accessed
+        if fields is not None and set(fields) & set(self.COUNTER_FIELDS):
+            deferred_counters = set(self.COUNTER_FIELDS) & self.get_deferred_fields()
+            fields = set(fields) | deferred_counters
+
+        super(Election, self).refresh_from_db(using=using, fields=fields)
+
+    def touch(self):
+        """
+    mark the election as modified, when one of its trustees changes
+    """
+        self.modified_at = timezone.now()
+        Election.objects.filter(id=self.id).update(modified_at=self.modified_at)
+        self.invalidate_cache()
+
+    @property
+    def state_etag(self):
+        """
+    changes whenever the JSON of the election, its metadata or its trustees may change
+    """
+        state = [self.uuid] + [
+            str(timestamp)
+            for timestamp in (
+                self.frozen_at,
+                self.tallying_finished_at,
+                self.result_released_at,
+                self.modified_at,
+            )
+        ]
+        return hashlib.sha1("|".join(state).encode("utf-8")).hexdigest()
+
+    BOOTH_BUNDLE_TIMEOUT = 24 * 60 * 60
+
+    def booth_bundle(self):
+        """
+    gzipped JSON of everything the booth loads for this election.
+    cached for frozen elections, under a key that changes with the election state.
+    """
+        key = "helios:booth-bundle:v%s:%s:%s" % (
+            self.CACHE_VERSION,
+            self.uuid,
+            self.state_etag,
+        )
+        bundle = cache.get(key)
+        if bundle is not None:
+            return bundle
+
+        bundle = gzip.compress(
+            heliosutils.to_json(
+                {
+                    # the raw JSON, as the booth hashes it
+                    "election": heliosutils.to_json(self.toJSONDict(complete=True)),
+                    "meta": self.metadata,
+                    "trustees": [
+                        t.toJSONDict(complete=True)
+                        for t in Trustee.get_by_election(self)
+                    ],
+                }
+            ).encode("utf-8")
+        )
+
+        if self.frozen_at:
+            cache.set(key, bundle, self.BOOTH_BUNDLE_TIMEOUT)
+
+        return bundle
+
     # metadata for the election
     @property
     def metadata(self):
@@ -175,11 +340,11 @@ class Election(HeliosModel):
 
     @property
     def num_cast_votes(self):
-        return self.voter_set.exclude(vote=None).count()
+        return self.cast_votes_count
 
     @property
     def num_voters(self):
-        return self.voter_set.count()
+        return self.voters_count
 
     @property
     def num_trustees(self):
@@ -188,28 +353,58 @@ class Election(HeliosModel):
     @property
     def last_alias_num(self):
         """
-    FIXME: we should be tracking alias number, not the V* alias which then
-    makes things a lot harder
+    the highest alias number reserved so far, not necessarily assigned to a voter
     """
         if not self.use_voter_aliases:
             return None
 
-        return (
-            heliosutils.one_val_raw_sql(
-                "select max(cast(substring(alias, 2) as integer)) from "
-                + Voter._meta.db_table
-                + " where election_id = %s",
-                [self.id],
-            )
-            or 0
+        return heliosutils.one_val_raw_sql(
+            "select alias_counter from " + Election._meta.db_table + " where id = %s",
+            [self.id],
+        )
+
+    def reserve_alias_nums(self, count):
+        """
+    reserve count consecutive alias numbers, returns the range of them.
+    the counter row is only locked for the duration of the update,
+    so call this outside of any long transaction.
+    """
+        last = heliosutils.one_val_raw_sql(
+            "update "
+            + Election._meta.db_table
+            + " set alias_counter = alias_counter + %s where id = %s"
+            + " returning alias_counter",
+            [count, self.id],
         )
+        self.alias_counter = last
+        return range(last - count + 1, last + 1)
+
+    def next_alias_num(self):
+        """
+    the next alias number, taken from a block reserved by this process.
+    aliases are unique but may have gaps, as unused numbers of a block are lost
+    when the process exits.
+    """
+        with _alias_blocks_lock:
+            block = _alias_blocks.get(self.id)
+            if not block:
+                block = iter(self.reserve_alias_nums(settings.HELIOS_ALIAS_BLOCK_SIZE))
+                _alias_blocks[self.id] = block
+
+            alias_num = next(block, None)
+            if alias_num is None:
+                block = iter(self.reserve_alias_nums(settings.HELIOS_ALIAS_BLOCK_SIZE))
+                _alias_blocks[self.id] = block
+                alias_num = next(block)
+
+        return alias_num
 
     @property
     def encrypted_tally_hash(self):
         if not self.encrypted_tally:
             return None
 
-        return utils.hash_b64(self.encrypted_tally.toJSON())
+        return utils.hash_b64(self.encrypted_tally.toJSON().encode("utf-8")).decode()
 
     @property
     def is_archived(self):
@@ -260,11 +455,24 @@ class Election(HeliosModel):
 
     @classmethod
     def get_by_uuid(cls, uuid):
+        """
+    frozen elections are served from the cache, as they rarely change
+    """
+        key = cls.cache_key(uuid)
+        election = cache.get(key)
+        if election is not None:
+            return election
+
         try:
-            return cls.objects.select_related().get(uuid=uuid)
+            election = cls.objects.select_related().get(uuid=uuid)
         except cls.DoesNotExist:
             return None
 
+        if election.frozen_at:
+            cache.set(key, election.cache_snapshot())
+
+        return election
+
     @classmethod
     def get_by_short_name(cls, short_name):
         try:
@@ -415,7 +623,7 @@ class Election(HeliosModel):
                     }
                 )
 
-        if self.voter_set.count() == 0 and not self.openreg:
+        if self.num_voters == 0 and not self.openreg:
             issues.append(
                 {
                     "type": "voters",
@@ -428,17 +636,162 @@ class Election(HeliosModel):
     def ready_for_tallying(self):
         return datetime.datetime.utcnow() >= self.tallying_starts_at
 
-    def compute_tally(self):
+    def compute_tally(self, checkpoint_interval=None, job=None):
         """
     tally the election, assuming votes already verified
+
+    the partial tally is checkpointed every checkpoint_interval ballots,
+    so that an interrupted computation resumes from the last checkpoint
+    instead of starting over from the first voter.
+
+    the ballots tallied are reported to the job, if one is given.
+    """
+        if checkpoint_interval is None:
+            checkpoint_interval = settings.HELIOS_TALLY_CHECKPOINT_INTERVAL
+
+        started_at = timezone.now()
+        checkpoint = TallyCheckpoint.get_valid_for_election(self)
+        if checkpoint:
+            tally = checkpoint.restore_tally(self)
+            last_voter_id = checkpoint.last_voter_id
+            ballots_digest = checkpoint.ballots_digest
+            if job:
+                job.advance(tally.num_tallied)
+        else:
+            tally = self.init_tally()
+            last_voter_id = 0
+            ballots_digest = ""
+
+        # the ballots of a checkpoint were tallied by an earlier run, not timed here
+        num_restored = tally.num_tallied
+
+        voters = (
+            self.voters_with_votes().filter(id__gt=last_voter_id).order_by("id")
+        )
+        for voter in voters.iterator():
+            tally.add_vote(voter.vote, verify_p=False)
+            ballots_digest = TallyCheckpoint.chain_digest(
+                ballots_digest, voter.id, voter.vote_hash
+            )
+            if job:
+                job.advance()
+
+            if checkpoint_interval and tally.num_tallied % checkpoint_interval == 0:
+                TallyCheckpoint.save_for_election(
+                    self, tally, voter.id, ballots_digest
+                )
+
+        self.encrypted_tally = tally
+        self.tallying_finished_at = datetime.datetime.utcnow()
+        self.save()
+
+        TallyCheckpoint.objects.filter(election=self).delete()
+        ElectionStageTiming.record(
+            self,
+            ElectionStageTiming.TALLY,
+            started_at,
+            num_items=tally.num_tallied - num_restored,
+        )
+
+    def voters_with_votes(self):
+        """
+    the voters who have a verified vote, with that vote loaded
+    """
+        return self.voter_set.exclude(cast_vote=None).select_related("cast_vote")
+
+    def tally_voter_ranges(self, num_shards):
+        """
+    split the cast voters into at most num_shards contiguous ranges of voter ids,
+    returned as (first_voter_id, last_voter_id) pairs
+    """
+        voter_ids = (
+            self.voter_set.exclude(cast_vote=None)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        num_cast_votes = voter_ids.count()
+        if not num_cast_votes:
+            return []
+
+        shard_size = -(-num_cast_votes // num_shards)
+
+        ranges = []
+        for offset in range(0, num_cast_votes, shard_size):
+            last_offset = min(offset + shard_size, num_cast_votes) - 1
+            ranges.append((voter_ids[offset], voter_ids[last_offset]))
+
+        return ranges
+
+    def compute_partial_tally(self, first_voter_id, last_voter_id, job=None):
+        """
+    tally the votes of one range of voters, to be combined with the others
     """
         tally = self.init_tally()
-        for voter in self.voter_set.exclude(vote=None):
+        voters = (
+            self.voters_with_votes()
+            .filter(id__gte=first_voter_id, id__lte=last_voter_id)
+            .order_by("id")
+        )
+        for voter in voters.iterator():
             tally.add_vote(voter.vote, verify_p=False)
+            if job:
+                job.advance()
+
+        return tally
+
+    def combine_partial_tallies(self, partial_tallies, started_at=None):
+        """
+    multiply the partial tallies of all voter ranges into the encrypted tally.
+    the tally is timed from started_at, when the partial tallies were started.
+    """
+        tally = self.init_tally()
+        for partial_tally in partial_tallies:
+            partial_tally.init_election(self)
+            tally.add_tally(partial_tally)
 
         self.encrypted_tally = tally
+        self.tallying_finished_at = datetime.datetime.utcnow()
         self.save()
 
+        if started_at:
+            ElectionStageTiming.record(
+                self, ElectionStageTiming.TALLY, started_at, num_items=tally.num_tallied
+            )
+
+    def record_verification_timing(self):
+        """
+    record how fast the votes were verified, from the first to the last, as
+    voting ends. recorded again, it replaces the previous record.
+    """
+        verified = CastVote.objects.filter(voter__election=self).exclude(
+            verified_at=None
+        )
+        totals = verified.aggregate(
+            num_items=models.Count("id"),
+            started_at=models.Min("verified_at"),
+            finished_at=models.Max("verified_at"),
+        )
+        if not totals["num_items"]:
+            return None
+
+        peak = (
+            verified.annotate(minute=TruncMinute("verified_at"))
+            .values("minute")
+            .annotate(num_verified=models.Count("id"))
+            .order_by("-num_verified")
+            .first()
+        )
+
+        ElectionStageTiming.objects.filter(
+            election=self, stage=ElectionStageTiming.VERIFICATION
+        ).delete()
+        return ElectionStageTiming.record(
+            self,
+            ElectionStageTiming.VERIFICATION,
+            peak_per_minute=peak["num_verified"],
+            **totals
+        )
+
     def ready_for_decryption(self):
         return self.encrypted_tally != None
 
@@ -470,9 +823,13 @@ class Election(HeliosModel):
         trustees = Trustee.get_by_election(self)
         decryption_factors = [t.decryption_factors for t in trustees]
 
-        self.result = self.encrypted_tally.decrypt_from_factors(
-            decryption_factors, self.public_key
-        )
+        with ElectionStageTiming.timing(
+            self, ElectionStageTiming.COMBINE_DECRYPTIONS
+        ) as timing:
+            self.result = self.encrypted_tally.decrypt_from_factors(
+                decryption_factors, self.public_key
+            )
+            timing["num_items"] = sum(len(q) for q in self.result)
 
         self.append_log(ElectionLog.DECRYPTIONS_COMBINED)
 
@@ -493,13 +850,51 @@ class Election(HeliosModel):
             voters_json = utils.to_json([v.toJSONDict() for v in voters])
             self.voters_hash = utils.hash_b64(voters_json)
 
-    def increment_voters(self):
-        ## FIXME
-        return 0
+    def _increment_counter(self, field_name, count):
+        Election.objects.filter(id=self.id).update(
+            **{field_name: models.F(field_name) + count}
+        )
+
+        # a deferred counter is read once updated
+        if field_name not in self.get_deferred_fields():
+            setattr(self, field_name, getattr(self, field_name) + count)
+
+    def increment_voters(self, count=1):
+        self._increment_counter("voters_count", count)
+
+    def increment_cast_votes(self, count=1):
+        self._increment_counter("cast_votes_count", count)
+
+    def increment_queued_votes(self, count=1):
+        self._increment_counter("queued_votes_count", count)
+
+    def reconcile_counters(self):
+        """
+    recount the voters, cast votes and queued votes, repairing any drift in the
+    counters. returns True if the counters had drifted.
+    """
+        voters_count = self.voter_set.count()
+        cast_votes_count = self.voter_set.exclude(cast_vote=None).count()
+        queued_votes_count = CastVote.objects.filter(
+            voter__election=self, verified_at=None, invalidated_at=None
+        ).count()
+
+        drifted = (voters_count, cast_votes_count, queued_votes_count) != (
+            self.voters_count,
+            self.cast_votes_count,
+            self.queued_votes_count,
+        )
+        if drifted:
+            Election.objects.filter(id=self.id).update(
+                voters_count=voters_count,
+                cast_votes_count=cast_votes_count,
+                queued_votes_count=queued_votes_count,
+            )
+            self.voters_count = voters_count
+            self.cast_votes_count = cast_votes_count
+            self.queued_votes_count = queued_votes_count
 
-    def increment_cast_votes(self):
-        ## FIXME
-        return 0
+        return drifted
 
     def set_eligibility(self):
         """
@@ -574,6 +969,9 @@ class Election(HeliosModel):
 
         self.save()
 
+        # prepare the booth bundle from the stored election, as the booth will see it
+        Election.objects.get(id=self.id).booth_bundle()
+
     def generate_trustee(self, params):
         """
     generate a trustee including the secret key,
@@ -609,12 +1007,18 @@ class Election(HeliosModel):
     def has_helios_trustee(self):
         return self.get_helios_trustee() != None
 
-    def helios_trustee_decrypt(self):
+    def helios_trustee_decrypt(self, job=None):
         tally = self.encrypted_tally
         tally.init_election(self)
 
         trustee = self.get_helios_trustee()
-        factors, proof = tally.decryption_factors_and_proofs(trustee.secret_key)
+        with ElectionStageTiming.timing(
+            self, ElectionStageTiming.TRUSTEE_DECRYPTION, label=trustee.name
+        ) as timing:
+            factors, proof = tally.decryption_factors_and_proofs(
+                trustee.secret_key, progress=job and job.advance
+            )
+            timing["num_items"] = sum(len(q) for q in factors)
 
         trustee.decryption_factors = factors
         trustee.decryption_proofs = proof
@@ -718,6 +1122,79 @@ class Election(HeliosModel):
         return prettified_result
 
 
+class TallyCheckpoint(models.Model):
+    """
+  a partial homomorphic tally, saved periodically while the tally is computed
+  """
+
+    election = models.OneToOneField(Election, on_delete=models.CASCADE)
+
+    # product of all the ballots of voters up to and including last_voter_id
+    tally = LDObjectField(type_hint="legacy/Tally")
+    last_voter_id = models.IntegerField()
+
+    # chained hash of the (voter id, vote hash) pairs in the partial tally
+    ballots_digest = models.CharField(max_length=100)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "helios"
+
+    @classmethod
+    def chain_digest(cls, digest, voter_id, vote_hash):
+        if isinstance(vote_hash, bytes):
+            vote_hash = vote_hash.decode()
+
+        value = "%s|%s:%s" % (digest, voter_id, vote_hash)
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def save_for_election(cls, election, tally, last_voter_id, ballots_digest):
+        checkpoint, _ = cls.objects.update_or_create(
+            election=election,
+            defaults={
+                "tally": tally,
+                "last_voter_id": last_voter_id,
+                "ballots_digest": ballots_digest,
+            },
+        )
+        return checkpoint
+
+    @classmethod
+    def get_valid_for_election(cls, election):
+        """
+    the checkpoint for this election, if the ballots it covers are still the
+    ones cast. A checkpoint that no longer matches is discarded.
+    """
+        try:
+            checkpoint = cls.objects.get(election=election)
+        except cls.DoesNotExist:
+            return None
+
+        voters = (
+            election.voter_set.exclude(cast_vote=None)
+            .filter(id__lte=checkpoint.last_voter_id)
+            .order_by("id")
+            .values_list("id", "vote_hash")
+        )
+
+        digest = ""
+        for voter_id, vote_hash in voters.iterator():
+            digest = cls.chain_digest(digest, voter_id, vote_hash)
+
+        if digest != checkpoint.ballots_digest:
+            checkpoint.delete()
+            return None
+
+        return checkpoint
+
+    def restore_tally(self, election):
+        tally = self.tally
+        tally.init_election(election)
+        return tally
+
+
 class ElectionLog(models.Model):
     """
   a log of events for an election
@@ -735,6 +1212,279 @@ class ElectionLog(models.Model):
         app_label = "helios"
 
 
+class ElectionStageTiming(models.Model):
+    """
+  how long one stage of an election's life took, and how many items it went
+  through, kept with the size of the election for capacity planning
+  """
+
+    VOTER_IMPORT = "voter import"
+    VERIFICATION = "verification"
+    TALLY = "tally"
+    TRUSTEE_DECRYPTION = "trustee decryption"
+    COMBINE_DECRYPTIONS = "combine decryptions"
+
+    STAGES = (
+        VOTER_IMPORT,
+        VERIFICATION,
+        TALLY,
+        TRUSTEE_DECRYPTION,
+        COMBINE_DECRYPTIONS,
+    )
+
+    election = models.ForeignKey(Election, on_delete=models.CASCADE)
+    stage = models.CharField(max_length=50)
+
+    # which voter file or trustee, for the stages done once by each
+    label = models.CharField(max_length=250, null=True)
+
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    num_items = models.IntegerField(null=True)
+
+    # the most items done in one minute, for the stages spread over time
+    peak_per_minute = models.IntegerField(null=True)
+
+    # the size of the election when the stage finished
+    num_voters = models.IntegerField()
+    num_cast_votes = models.IntegerField()
+
+    class Meta:
+        app_label = "helios"
+
+    @classmethod
+    def record(cls, election, stage, started_at, finished_at=None, **values):
+        return cls.objects.create(
+            election=election,
+            stage=stage,
+            started_at=started_at,
+            finished_at=finished_at or timezone.now(),
+            num_voters=election.num_voters,
+            num_cast_votes=election.num_cast_votes,
+            **values
+        )
+
+    @classmethod
+    @contextmanager
+    def timing(cls, election, stage, label=None):
+        """
+    record the time the block takes, with the items it sets in values
+    """
+        started_at = timezone.now()
+        values = {}
+        yield values
+        cls.record(election, stage, started_at, label=label, **values)
+
+    @classmethod
+    def get_by_election(cls, election):
+        return cls.objects.filter(election=election).order_by("started_at", "id")
+
+    @property
+    def seconds(self):
+        return (self.finished_at - self.started_at).total_seconds()
+
+    @property
+    def per_second(self):
+        if self.num_items is None or self.seconds <= 0:
+            return None
+        return self.num_items / self.seconds
+
+    def toJSONDict(self):
+        return {
+            "stage": self.stage,
+            "label": self.label,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat(),
+            "seconds": self.seconds,
+            "num_items": self.num_items,
+            "per_second": self.per_second,
+            "peak_per_minute": self.peak_per_minute,
+            "num_voters": self.num_voters,
+            "num_cast_votes": self.num_cast_votes,
+        }
+
+
+class Job(models.Model):
+    """
+  a long running background task of an election, with how far along it is
+
+  the tasks report their progress with advance(), which writes it at most
+  every PROGRESS_INTERVAL seconds. A task spread over several Celery tasks
+  advances the same job from each. Jobs of the kinds in FINISHED_BY_LAST_ITEM
+  are done once all of their items are processed, the others once their task
+  calls finish(), as a sharded tally is only done when its partial tallies
+  are combined.
+  """
+
+    COMPUTE_TALLY = "compute tally"
+    HELIOS_TRUSTEE_DECRYPT = "helios trustee decrypt"
+    VOTER_FILE_PROCESS = "voter file process"
+    VOTERS_EMAIL = "voters email"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    PROGRESS_INTERVAL = 1
+
+    FINISHED_BY_LAST_ITEM = (VOTERS_EMAIL,)
+
+    election = models.ForeignKey(Election, on_delete=models.CASCADE)
+    uuid = models.CharField(max_length=50, unique=True)
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, default=QUEUED)
+
+    # items processed so far, out of total when it is known
+    processed = models.IntegerField(default=0)
+    total = models.IntegerField(null=True)
+
+    error = models.CharField(max_length=500, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        app_label = "helios"
+
+    @classmethod
+    def create(cls, election, kind, total=None):
+        return cls.objects.create(
+            election=election, uuid=str(uuid.uuid4()), kind=kind, total=total
+        )
+
+    @classmethod
+    def get_active(cls, election, kind):
+        """
+    the queued job of that kind, however long it waits in the queue, or the
+    running one if it reported within HELIOS_JOB_STALE_SECONDS. A running job
+    that did not was lost with its worker.
+    """
+        stale_at = timezone.now() - datetime.timedelta(
+            seconds=settings.HELIOS_JOB_STALE_SECONDS
+        )
+        return (
+            cls.objects.filter(election=election, kind=kind)
+            .filter(
+                models.Q(status=cls.QUEUED)
+                | models.Q(status=cls.RUNNING, updated_at__gte=stale_at)
+            )
+            .order_by("-created_at")
+            .first()
+        )
+
+    @classmethod
+    def get_by_election(cls, election, limit=20):
+        return cls.objects.filter(election=election).order_by("-created_at")[:limit]
+
+    @property
+    def is_active(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    def _update(self, **values):
+        values["updated_at"] = timezone.now()
+        Job.objects.filter(id=self.id).update(**values)
+        for field_name, value in values.items():
+            if not isinstance(value, models.expressions.Combinable):
+                setattr(self, field_name, value)
+
+    def start(self, total=None):
+        self._pending = 0
+        self._reported_at = timezone.now()
+        values = {"status": self.RUNNING, "started_at": self._reported_at}
+        if total is not None:
+            values["total"] = total
+        self._update(**values)
+
+    def set_total(self, total):
+        """
+    the number of items, once the running task has counted them
+    """
+        self._update(total=total)
+
+    def advance(self, count=1):
+        self._pending = getattr(self, "_pending", 0) + count
+
+        reported_at = getattr(self, "_reported_at", None)
+        if (
+            reported_at is None
+            or (timezone.now() - reported_at).total_seconds() >= self.PROGRESS_INTERVAL
+        ):
+            self.flush()
+
+    def flush(self):
+        """
+    write the progress not yet reported, then finish the job if it was the last
+    """
+        pending = getattr(self, "_pending", 0)
+        self._pending = 0
+        self._reported_at = timezone.now()
+        if not pending:
+            return
+
+        self._update(processed=models.F("processed") + pending)
+        self.processed += pending
+
+        # the last of the tasks sharing the job finishes it
+        if self.kind in self.FINISHED_BY_LAST_ITEM and self.total is not None:
+            Job.objects.filter(
+                id=self.id, status=self.RUNNING, processed__gte=self.total
+            ).update(status=self.DONE, finished_at=timezone.now())
+
+    def finish(self):
+        self.flush()
+        self._update(status=self.DONE, finished_at=timezone.now())
+
+    def fail(self, error):
+        self.flush()
+        self._update(
+            status=self.FAILED, finished_at=timezone.now(), error=str(error)[:500]
+        )
+
+    @contextmanager
+    def running(self, total=None):
+        """
+    run the job in the block, done at its end unless it raises
+    """
+        self.start(total)
+        try:
+            yield self
+        except Exception as e:
+            self.fail(e)
+            raise
+        self.finish()
+
+    def toJSONDict(self):
+        """
+    the progress of the job, with its rate in items per second and the
+    seconds it is expected to take still
+    """
+        rate = eta = None
+        if self.started_at and self.processed:
+            end = self.finished_at or timezone.now()
+            elapsed = (end - self.started_at).total_seconds()
+            if elapsed > 0:
+                rate = self.processed / elapsed
+        if rate and self.total is not None and self.is_active:
+            eta = max(self.total - self.processed, 0) / rate
+
+        return {
+            "uuid": self.uuid,
+            "kind": self.kind,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "rate": rate,
+            "eta": eta,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at and self.started_at.isoformat(),
+            "finished_at": self.finished_at and self.finished_at.isoformat(),
+        }
+
+
 ##
 ## UTF8 craziness for CSV
 ##
@@ -770,7 +1520,7 @@ class VoterFile(models.Model):
 
     # we move to storing the content in the DB
     voter_file = models.FileField(upload_to=PATH, max_length=250, null=True)
-    voter_file_content = models.TextField(null=True)
+    voter_file_content = CompressedTextField(null=True)
 
     uploaded_at = models.DateTimeField(auto_now_add=True)
     processing_started_at = models.DateTimeField(auto_now_add=False, null=True)
@@ -782,8 +1532,8 @@ class VoterFile(models.Model):
 
     def itervoters(self):
         if self.voter_file_content:
-            if type(self.voter_file_content) == str:
-                content = self.voter_file_content.encode("utf-8")
+            if type(self.voter_file_content) == bytes:
+                content = self.voter_file_content.decode("utf-8")
             else:
                 content = self.voter_file_content
 
@@ -793,7 +1543,7 @@ class VoterFile(models.Model):
             # this should leave us with only \n
             content = content.replace("\r", "\n").replace("\n\n", "\n")
 
-            voter_stream = io.BytesIO(content)
+            voter_stream = io.StringIO(content)
         else:
             voter_stream = open(self.voter_file.path, "rU")
 
@@ -820,17 +1570,19 @@ class VoterFile(models.Model):
 
             yield return_dict
 
-    def process(self):
+    def process(self, job=None):
+        started_at = timezone.now()
         self.processing_started_at = datetime.datetime.utcnow()
         self.save()
 
         election = self.election
-        last_alias_num = election.last_alias_num
 
         num_voters = 0
         new_voters = []
         for voter in self.itervoters():
             num_voters += 1
+            if job:
+                job.advance()
 
             # does voter for this user already exist
             existing_voter = Voter.get_by_election_and_voter_id(
@@ -852,10 +1604,10 @@ class VoterFile(models.Model):
                 new_voters.append(existing_voter)
                 existing_voter.save()
 
-        if election.use_voter_aliases:
-            voter_alias_integers = list(
-                range(last_alias_num + 1, last_alias_num + 1 + num_voters)
-            )
+        election.increment_voters(len(new_voters))
+
+        if election.use_voter_aliases and new_voters:
+            voter_alias_integers = list(election.reserve_alias_nums(len(new_voters)))
             random.shuffle(voter_alias_integers)
             for i, voter in enumerate(new_voters):
                 voter.alias = "V%s" % voter_alias_integers[i]
@@ -865,6 +1617,14 @@ class VoterFile(models.Model):
         self.processing_finished_at = datetime.datetime.utcnow()
         self.save()
 
+        ElectionStageTiming.record(
+            election,
+            ElectionStageTiming.VOTER_IMPORT,
+            started_at,
+            label="voter file %s" % self.id,
+            num_items=num_voters,
+        )
+
         return num_voters
 
 
@@ -892,11 +1652,28 @@ class Voter(HeliosModel):
     # if election uses aliases
     alias = models.CharField(max_length=100, null=True)
 
-    # we keep a copy here for easy tallying
-    vote = LDObjectField(type_hint="legacy/EncryptedVote", null=True)
+    # the latest verified vote, which is the one tallied
+    cast_vote = models.ForeignKey(
+        "CastVote", null=True, related_name="+", on_delete=models.SET_NULL
+    )
     vote_hash = models.CharField(max_length=100, null=True)
     cast_at = models.DateTimeField(auto_now_add=False, null=True)
 
+    # hashes served with the voter and its ballots, computed on save
+    voter_id_hash = models.CharField(max_length=100, null=True)
+    voter_hash = models.CharField(max_length=100, null=True)
+
+    # fields that the JSON of the voter is made of
+    HASHED_FIELDS = (
+        "election",
+        "uuid",
+        "user",
+        "voter_login_id",
+        "voter_name",
+        "voter_email",
+        "alias",
+    )
+
     class Meta:
         unique_together = ("election", "voter_login_id")
         app_label = "helios"
@@ -904,6 +1681,53 @@ class Voter(HeliosModel):
     def __init__(self, *args, **kwargs):
         super(Voter, self).__init__(*args, **kwargs)
 
+    def save(self, *args, **kwargs):
+        """
+    keep the stored hashes in line with the JSON of the voter
+    """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or set(update_fields) & set(self.HASHED_FIELDS):
+            self.update_hashes()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {
+                    "voter_id_hash",
+                    "voter_hash",
+                }
+
+        super(Voter, self).save(*args, **kwargs)
+
+    def update_hashes(self):
+        """
+    recompute the voter ID hash, then the hash of the JSON it is part of
+    """
+        self.voter_id_hash = self.compute_voter_id_hash()
+        self.voter_hash = self.ld_object.hash.decode()
+
+    @classmethod
+    def update_voter_hashes(cls, voters):
+        """
+    store the hashes of voters whose JSON may have changed, returns how many changed
+    """
+        num_changed = 0
+        for voter in voters:
+            hashes = (voter.voter_id_hash, voter.voter_hash)
+            voter.update_hashes()
+            if (voter.voter_id_hash, voter.voter_hash) != hashes:
+                cls.objects.filter(id=voter.id).update(
+                    voter_id_hash=voter.voter_id_hash, voter_hash=voter.voter_hash
+                )
+                num_changed += 1
+
+        return num_changed
+
+    @property
+    def hash(self):
+        # as stored, rather than serializing the voter again
+        if self.voter_hash:
+            return self.voter_hash.encode("utf-8")
+
+        return self.ld_object.hash
+
     def get_user(self):
         # stub the user so code is not full of IF statements
         return self.user or User(
@@ -911,26 +1735,19 @@ class Voter(HeliosModel):
         )
 
     @classmethod
-    @transaction.atomic
     def register_user_in_election(cls, user, election):
         voter_uuid = str(uuid.uuid4())
         voter = Voter(uuid=voter_uuid, user=user, election=election)
-        
+
         # do we need to generate an alias?
+        # done before the transaction, so that the election row isn't kept locked
         if election.use_voter_aliases:
-            heliosutils.lock_row(Election, election.id)
-            alias_num = election.last_alias_num + 1
-            voter.alias = "V%s" % alias_num
+            voter.alias = "V%s" % election.next_alias_num()
 
-        voter.save()
-        # TODO: fix with proper data
-        qr_code_content = "content"
-        qr_code_base64 = heliosutils.create_qr_code_in_base64(qr_code_content)
-
-        QrCode.objects.create(
-            voter=voter,
-            image_base64=qr_code_base64
-        )
+        # the QR code is generated in the background, see QrCode
+        with transaction.atomic():
+            voter.save()
+            election.increment_voters()
         return voter
 
     @classmethod
@@ -988,13 +1805,16 @@ class Voter(HeliosModel):
 
     @classmethod
     def get_by_election_and_uuid(cls, election, uuid):
-        query = cls.objects.filter(election=election, uuid=uuid)
+        query = cls.objects.filter(election=election, uuid=uuid).select_related("user")
 
         try:
-            return query[0]
+            voter = query[0]
         except:
             return None
 
+        voter.election = election
+        return voter
+
     @classmethod
     def get_by_user(cls, user):
         return cls.objects.select_related().filter(user=user).order_by("-cast_at")
@@ -1003,15 +1823,22 @@ class Voter(HeliosModel):
     def datatype(self):
         return self.election.datatype.replace("Election", "Voter")
 
+    @property
+    def vote(self):
+        if not self.cast_vote_id:
+            return None
+
+        return self.cast_vote.vote
+
     @property
     def vote_tinyhash(self):
         """
     get the tinyhash of the latest castvote
     """
-        if not self.vote_hash:
+        if not self.cast_vote_id:
             return None
 
-        return CastVote.objects.get(vote_hash=self.vote_hash).vote_tinyhash
+        return self.cast_vote.vote_tinyhash
 
     @property
     def election_uuid(self):
@@ -1025,8 +1852,7 @@ class Voter(HeliosModel):
     def voter_id(self):
         return self.get_user().user_id
 
-    @property
-    def voter_id_hash(self):
+    def compute_voter_id_hash(self):
         if self.voter_login_id:
             # for backwards compatibility with v3.0, and since it doesn't matter
             # too much if we hash the email or the unique login ID here.
@@ -1035,12 +1861,15 @@ class Voter(HeliosModel):
             value_to_hash = self.voter_id
 
         try:
-            return utils.hash_b64(value_to_hash)
+            voter_id_hash = utils.hash_b64(value_to_hash)
         except:
             try:
-                return utils.hash_b64(value_to_hash.encode("latin-1"))
+                voter_id_hash = utils.hash_b64(value_to_hash.encode("latin-1"))
             except:
-                return utils.hash_b64(value_to_hash.encode("utf-8"))
+                voter_id_hash = utils.hash_b64(value_to_hash.encode("utf-8"))
+
+        # text, as in the JSON of the voter
+        return voter_id_hash.decode()
 
     @property
     def voter_type(self):
@@ -1056,6 +1885,26 @@ class Voter(HeliosModel):
     def can_update_status(self):
         return self.get_user().can_update_status()
 
+    def delete(self, *args, **kwargs):
+        had_voted = self.cast_vote_id is not None
+        num_queued = self.castvote_set.filter(
+            verified_at=None, invalidated_at=None
+        ).count()
+        result = super(Voter, self).delete(*args, **kwargs)
+
+        self.election.increment_voters(-1)
+        if had_voted:
+            self.election.increment_cast_votes(-1)
+        if num_queued:
+            self.election.increment_queued_votes(-num_queued)
+
+        return result
+
+    @property
+    def qr_code_content(self):
+        # TODO: fix with proper data
+        return "content"
+
     def generate_password(self, length=10):
         if self.voter_password:
             raise Exception("password already exists")
@@ -1069,23 +1918,56 @@ class Voter(HeliosModel):
         if self.cast_at and cast_vote.cast_at < self.cast_at:
             return
 
-        self.vote = cast_vote.vote
+        self.cast_vote = cast_vote
         self.vote_hash = cast_vote.vote_hash
         self.cast_at = cast_vote.cast_at
-        self.save()
+
+        # the first vote is stored by a conditional update, so that of two first
+        # votes stored at once only one counts the voter as having voted
+        first_vote = Voter.objects.filter(id=self.id, cast_vote=None).update(
+            cast_vote=cast_vote, vote_hash=self.vote_hash, cast_at=self.cast_at
+        )
+
+        if first_vote:
+            self.election.increment_cast_votes()
+        else:
+            self.save(update_fields=["cast_vote", "vote_hash", "cast_at"])
 
     def last_cast_vote(self):
-        return CastVote(
-            vote=self.vote, vote_hash=self.vote_hash, cast_at=self.cast_at, voter=self
+        if not self.cast_vote_id:
+            return CastVote(vote=None, vote_hash=None, cast_at=None, voter=self)
+
+        cast_vote = self.cast_vote
+        cast_vote.voter = self
+        return cast_vote
+
+
+# the fields of a user that are part of the JSON of their voters
+USER_HASHED_FIELDS = ("name", "user_type", "user_id")
+
+
+def update_user_voter_hashes(sender, instance, created, update_fields=None, **kwargs):
+    """
+    the name of a user is part of the JSON of their voters
+    """
+    if update_fields is not None and not set(update_fields) & set(USER_HASHED_FIELDS):
+        return
+
+    if not created:
+        Voter.update_voter_hashes(
+            Voter.objects.filter(user=instance).select_related("election", "user")
         )
 
 
+models.signals.post_save.connect(update_user_voter_hashes, sender=User)
+
+
 class CastVote(HeliosModel):
     # the reference to the voter provides the voter_uuid
     voter = models.ForeignKey(Voter, on_delete=models.CASCADE)
 
     # the actual encrypted vote
-    vote = LDObjectField(type_hint="legacy/EncryptedVote")
+    vote = EncryptedVoteField()
 
     # cache the hash of the vote
     vote_hash = models.CharField(max_length=100)
@@ -1119,42 +2001,55 @@ class CastVote(HeliosModel):
 
     @property
     def voter_hash(self):
-        return self.voter.hash
+        return self.voter.voter_hash
 
     @property
     def is_quarantined(self):
         return self.quarantined_p and not self.released_from_quarantine_at
 
-    def set_tinyhash(self):
+    TINYHASH_MIN_LENGTH = 8
+
+    def tinyhash_candidates(self):
         """
-    find a tiny version of the hash for a URL slug.
+    tiny versions of the hash for a URL slug, shortest first
     """
-        safe_hash = self.vote_hash.decode()
+        safe_hash = self.vote_hash
+        if isinstance(safe_hash, bytes):
+            safe_hash = safe_hash.decode()
         for c in ["/", "+"]:
             safe_hash = safe_hash.replace(c, "")
 
-        length = 8
-        while True:
-            vote_tinyhash = safe_hash[:length]
-            if CastVote.objects.filter(vote_tinyhash=vote_tinyhash).count() == 0:
-                break
-            length += 1
-
-        self.vote_tinyhash = vote_tinyhash
+        min_length = min(self.TINYHASH_MIN_LENGTH, len(safe_hash))
+        for length in range(min_length, len(safe_hash) + 1):
+            yield safe_hash[:length]
 
     def save(self, *args, **kwargs):
         """
     override this just to get a hook
     """
-        # not saved yet? then we generate a tiny hash
-        if not self.vote_tinyhash:
-            self.set_tinyhash()
+        if self.vote_tinyhash:
+            return super(CastVote, self).save(*args, **kwargs)
+
+        # not saved yet? then we generate a tiny hash, relying on the unique index
+        # rather than looking for a free one first, and lengthen it on collision
+        for vote_tinyhash in self.tinyhash_candidates():
+            self.vote_tinyhash = vote_tinyhash
+            try:
+                with transaction.atomic():
+                    return super(CastVote, self).save(*args, **kwargs)
+            except IntegrityError:
+                if not CastVote.objects.filter(vote_tinyhash=vote_tinyhash).exists():
+                    self.vote_tinyhash = None
+                    raise
 
-        super(CastVote, self).save(*args, **kwargs)
+        # the whole hash is taken
+        self.vote_tinyhash = None
+        raise IntegrityError("no free tinyhash for vote hash %s" % self.vote_hash)
 
     @classmethod
     def get_by_voter(cls, voter):
-        return cls.objects.filter(voter=voter).order_by("-cast_at")
+        # through the voter, so that every cast vote has it without a query
+        return voter.castvote_set.order_by("-cast_at")
 
     def verify_and_store(self):
         # if it's quarantined, don't let this go through
@@ -1170,27 +2065,38 @@ class CastVote(HeliosModel):
         else:
             self.invalidated_at = datetime.datetime.utcnow()
 
+        # only the first verification of a queued vote takes it off the queue, even
+        # when the queue is forced and two tasks verify it at once
+        was_queued = CastVote.objects.filter(
+            id=self.id, verified_at=None, invalidated_at=None
+        ).update(verified_at=self.verified_at, invalidated_at=self.invalidated_at)
+
         # save and store the vote as the voter's last cast vote
-        self.save()
+        if not was_queued:
+            self.save()
 
         if result:
             self.voter.store_vote(self)
 
+        if was_queued:
+            self.voter.election.increment_queued_votes(-1)
+            pipeline.record_verification(
+                self.cast_at, self.verified_at or self.invalidated_at, result
+            )
+
         return result
 
-    def issues(self, election):
+    def issues(self, election, check_group_membership=True):
         """
     Look for consistency problems
     """
-        issues = []
-
-        # check the election
-        if self.vote.election_uuid != election.uuid:
-            issues.append(
-                "the vote's election UUID does not match the election for which this vote is being cast"
-            )
+        if self.vote is None:
+            return ["the vote is malformed"]
 
-        return issues
+        # everything short of verifying the proofs
+        return self.vote.structure_issues(
+            election, check_group_membership=check_group_membership
+        )
 
 
 class AuditedBallot(models.Model):
@@ -1199,7 +2105,7 @@ class AuditedBallot(models.Model):
   """
 
     election = models.ForeignKey(Election, on_delete=models.CASCADE)
-    raw_vote = models.TextField()
+    raw_vote = CompressedTextField()
     vote_hash = models.CharField(max_length=100)
     added_at = models.DateTimeField(auto_now_add=True)
 
@@ -1224,6 +2130,63 @@ class AuditedBallot(models.Model):
         return query
 
 
+class BallotExport(models.Model):
+    """
+  the ballots of a tallied election, exported once as gzipped NDJSON
+  and named after the hash of their content
+  """
+
+    PATH = settings.BALLOT_EXPORT_REL_PATH
+
+    election = models.OneToOneField(Election, on_delete=models.CASCADE)
+    export_file = models.FileField(upload_to=PATH, max_length=250)
+    sha256 = models.CharField(max_length=64)
+    num_ballots = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = "helios"
+
+    @classmethod
+    def get_by_election(cls, election):
+        try:
+            return cls.objects.get(election=election)
+        except cls.DoesNotExist:
+            return None
+
+    @classmethod
+    def generate(cls, election):
+        """
+    export the ballots to a file, replacing any previous export
+    """
+        digest = hashlib.sha256()
+
+        with tempfile.TemporaryFile() as export_file:
+            for chunk in ballot_export.iter_ndjson(election, compress=True):
+                export_file.write(chunk)
+                digest.update(chunk)
+            export_file.seek(0)
+
+            previous = cls.get_by_election(election)
+            if previous:
+                previous.export_file.delete(save=False)
+                previous.delete()
+
+            export = cls(
+                election=election,
+                sha256=digest.hexdigest(),
+                num_ballots=election.num_cast_votes,
+            )
+            export.export_file.save(
+                "%s-%s.ndjson.gz" % (election.uuid, export.sha256),
+                File(export_file),
+                save=False,
+            )
+            export.save()
+
+        return export
+
+
 class Trustee(HeliosModel):
     election = models.ForeignKey(Election, on_delete=models.CASCADE)
 
@@ -1249,7 +2212,7 @@ class Trustee(HeliosModel):
         type_hint=datatypes.arrayOf(datatypes.arrayOf("core/BigInteger")), null=True
     )
 
-    decryption_proofs = LDObjectField(
+    decryption_proofs = CompressedLDObjectField(
         type_hint=datatypes.arrayOf(datatypes.arrayOf("legacy/EGZKProof")), null=True
     )
 
@@ -1267,6 +2230,12 @@ class Trustee(HeliosModel):
             self.election.append_log("Trustee %s added" % self.name)
 
         super(Trustee, self).save(*args, **kwargs)
+        self.election.touch()
+
+    def delete(self, *args, **kwargs):
+        result = super(Trustee, self).delete(*args, **kwargs)
+        self.election.touch()
+        return result
 
     @classmethod
     def get_by_election(cls, election):
@@ -1303,8 +2272,53 @@ class Trustee(HeliosModel):
             algs.EG_fiatshamir_challenge_generator,
         )
 
+
 class QrCode(models.Model):
+    """
+  PNG QR code of a voter, generated in the background after registration,
+  or on first request if the background job hasn't run yet
+  """
+
     voter = models.OneToOneField(Voter, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
-    image_base64 = models.TextField()
-    
+    image = models.BinaryField()
+    etag = models.CharField(max_length=32)
+
+    @classmethod
+    def render(cls, voter):
+        image = heliosutils.create_qr_code_png(voter.qr_code_content)
+        return cls(voter=voter, image=image, etag=hashlib.md5(image).hexdigest())
+
+    @classmethod
+    def get_or_generate(cls, voter):
+        """
+    the QR code of the voter, with the image deferred
+    """
+        qr_code = cls.objects.filter(voter=voter).defer("image").first()
+        if qr_code is None:
+            rendered = cls.render(voter)
+            qr_code, _ = cls.objects.get_or_create(
+                voter=voter, defaults={"image": rendered.image, "etag": rendered.etag}
+            )
+
+        return qr_code
+
+    @classmethod
+    def generate_missing(cls, voters):
+        """
+    generate the QR codes of those voters that don't have one yet
+    """
+        voters = list(voters.filter(qrcode=None))
+        if not voters:
+            return 0
+
+        qr_codes = [cls.render(voter) for voter in voters]
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(qr_codes)
+        except IntegrityError:
+            # some were generated concurrently, fall back to one at a time
+            for voter in voters:
+                cls.get_or_generate(voter)
+
+        return len(voters)
@@ -0,0 +1,235 @@
+"""
+Vote verification pipeline metrics
+
+Every vote cast, and every verification as it finishes, is added to the
+counters of the minute it happens in. They are kept in the cache, shared by
+every process, for RETENTION_MINUTES: the votes cast, verified and
+invalidated, the ballots rejected as malformed before they were queued, a
+histogram of the times from cast to verified, and the verifications done by
+each worker process.
+
+The queue of each election is its queued_votes_count counter, kept up to
+date as votes are cast and verified, so that none of this scans the cast
+votes.
+
+Verification is falling behind when more than ALERT_FRACTION of the votes
+verified in the last ALERT_WINDOW_MINUTES took longer than
+HELIOS_VERIFICATION_ALERT_SECONDS, or when votes are queued and none was
+verified in that window.
+"""
+
+import datetime
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+# upper bounds of the cast to verified time buckets, in seconds, then one open bucket
+BUCKETS_SECONDS = (1, 2, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+FIELDS = (
+    "cast",
+    "verified",
+    "invalidated",
+    "rejected",
+    "latency_ms",
+    "late",
+) + tuple("bucket_%s" % i for i in range(len(BUCKETS_SECONDS) + 1))
+
+RETENTION_MINUTES = 120
+ALERT_WINDOW_MINUTES = 5
+ALERT_FRACTION = 0.05
+
+CACHE_KEY_PREFIX = "helios:pipeline:v1"
+
+WORKER = "%s:%s" % (socket.gethostname(), os.getpid())
+
+
+def current_minute():
+    return int(time.time() // 60)
+
+
+def cache_key(minute, field):
+    return "%s:%s:%s" % (CACHE_KEY_PREFIX, minute, field)
+
+
+def workers_cache_key(minute):
+    return "%s:%s:workers" % (CACHE_KEY_PREFIX, minute)
+
+
+def worker_field(worker):
+    return "worker:%s" % worker
+
+
+def increment(key, value):
+    cache.add(key, 0, RETENTION_MINUTES * 60)
+    try:
+        cache.incr(key, value)
+    except ValueError:
+        # expired or evicted since it was added
+        cache.set(key, value, RETENTION_MINUTES * 60)
+
+
+def bucket_index(seconds):
+    for i, upper_bound in enumerate(BUCKETS_SECONDS):
+        if seconds <= upper_bound:
+            return i
+    return len(BUCKETS_SECONDS)
+
+
+def as_utc(at):
+    """
+    a naive UTC datetime, as utcnow() returns, from an aware or naive one
+    """
+    if timezone.is_aware(at):
+        return timezone.make_naive(at, timezone.utc)
+    return at
+
+
+def record_cast():
+    increment(cache_key(current_minute(), "cast"), 1)
+
+
+def record_rejection():
+    increment(cache_key(current_minute(), "rejected"), 1)
+
+
+def record_verification(cast_at, verified_at, valid, worker=WORKER):
+    """
+    add a verification that just finished to the counters of this minute
+    """
+    minute = current_minute()
+    if not valid:
+        increment(cache_key(minute, "invalidated"), 1)
+        return
+
+    latency = (as_utc(verified_at) - as_utc(cast_at)).total_seconds()
+    values = {
+        "verified": 1,
+        "latency_ms": max(int(latency * 1000), 0),
+        "bucket_%s" % bucket_index(latency): 1,
+        "late": int(latency > settings.HELIOS_VERIFICATION_ALERT_SECONDS),
+        worker_field(worker): 1,
+    }
+    for field, value in values.items():
+        if value:
+            increment(cache_key(minute, field), value)
+
+    workers = cache.get(workers_cache_key(minute)) or []
+    if worker not in workers:
+        cache.set(
+            workers_cache_key(minute),
+            sorted(set(workers) | {worker}),
+            RETENTION_MINUTES * 60,
+        )
+
+
+def get_series(num_minutes=60, now_minute=None):
+    """
+    the counters of each of the last minutes, the earliest first
+    """
+    if now_minute is None:
+        now_minute = current_minute()
+    minutes = range(now_minute - num_minutes + 1, now_minute + 1)
+
+    workers = cache.get_many([workers_cache_key(minute) for minute in minutes])
+    keys = {}
+    for minute in minutes:
+        fields = FIELDS + tuple(
+            worker_field(worker)
+            for worker in workers.get(workers_cache_key(minute), [])
+        )
+        for field in fields:
+            keys[cache_key(minute, field)] = (minute, field)
+
+    counters = {minute: {} for minute in minutes}
+    for key, value in cache.get_many(keys).items():
+        minute, field = keys[key]
+        counters[minute][field] = value
+
+    return [
+        dict(
+            counters[minute],
+            minute=datetime.datetime.utcfromtimestamp(minute * 60),
+        )
+        for minute in minutes
+    ]
+
+
+def summarize(series):
+    """
+    the totals, rates and cast to verified percentiles of minutes of counters
+    """
+    num_minutes = len(series)
+
+    def total(field):
+        return sum(counters.get(field, 0) for counters in series)
+
+    histogram = [total("bucket_%s" % i) for i in range(len(BUCKETS_SECONDS) + 1)]
+    num_verified = total("verified")
+    num_checked = num_verified + total("invalidated")
+
+    def percentile_seconds(p):
+        """
+        the upper bound of the bucket holding the percentile, None if open
+        """
+        rank = p / 100.0 * num_verified
+        seen = 0
+        for i, count in enumerate(histogram):
+            seen += count
+            if seen >= rank:
+                return BUCKETS_SECONDS[i] if i < len(BUCKETS_SECONDS) else None
+
+    workers = {}
+    for counters in series:
+        for field, value in counters.items():
+            if field.startswith("worker:"):
+                worker = field[len("worker:") :]
+                workers[worker] = workers.get(worker, 0) + value
+
+    return {
+        "minutes": num_minutes,
+        "cast": total("cast"),
+        "verified": num_verified,
+        "invalidated": total("invalidated"),
+        "rejected": total("rejected"),
+        "late": total("late"),
+        "cast_per_minute": total("cast") / float(num_minutes),
+        "verified_per_minute": num_checked / float(num_minutes),
+        "invalidation_rate": total("invalidated") / float(num_checked or 1),
+        "latency_mean_seconds": total("latency_ms") / 1000.0 / (num_verified or 1),
+        "latency_p50_seconds": percentile_seconds(50) if num_verified else 0,
+        "latency_p95_seconds": percentile_seconds(95) if num_verified else 0,
+        "latency_p99_seconds": percentile_seconds(99) if num_verified else 0,
+        "histogram": histogram,
+        "workers": [
+            {"worker": worker, "verified_per_minute": count / float(num_minutes)}
+            for worker, count in sorted(workers.items())
+        ],
+    }
+
+
+def falling_behind(recent, num_votes_in_queue):
+    """
+    whether verification is not keeping up, from the summary of the last
+    ALERT_WINDOW_MINUTES
+    """
+    if num_votes_in_queue and not recent["verified"] + recent["invalidated"]:
+        return True
+
+    return recent["late"] > ALERT_FRACTION * recent["verified"]
+
+
+def get_status(num_votes_in_queue, num_minutes=60):
+    series = get_series(num_minutes)
+    recent = summarize(series[-ALERT_WINDOW_MINUTES:])
+    return {
+        "series": series,
+        "summary": summarize(series),
+        "recent": recent,
+        "falling_behind": falling_behind(recent, num_votes_in_queue),
+        "alert_seconds": settings.HELIOS_VERIFICATION_ALERT_SECONDS,
+    }
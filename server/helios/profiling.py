@@ -0,0 +1,249 @@
+"""
+Sampled request profiling
+
+A sampled request records its wall time, the number and time of its
+database queries, and the time it spends in crypto, in serializing
+datatypes and in rendering helios templates. The samples are added up per
+view in the cache, shared by every process, as totals and a histogram of
+wall times, and shown on the stats pages.
+
+HELIOS_PROFILING_SAMPLE_RATE is the fraction of requests sampled. At 0,
+the default, the middleware takes itself out of the request cycle and the
+timed functions only check for a sample to record into.
+
+The crypto operation counters of helios.crypto.opcounters are per process.
+They are turned on and off for every process through the cache: each
+process follows the last switch when it next syncs, before every Celery
+task and every stats view.
+"""
+
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from helios.crypto import opcounters
+
+CATEGORIES = ("crypto", "serialization", "templates")
+
+# upper bounds of the wall time buckets, in milliseconds, then one open bucket
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+FIELDS = (
+    ("requests", "wall_us", "db_queries", "db_us")
+    + tuple("%s_us" % category for category in CATEGORIES)
+    + tuple("bucket_%s" % i for i in range(len(BUCKETS_MS) + 1))
+)
+
+CACHE_KEY_PREFIX = "helios:profile:v1"
+VIEWS_CACHE_KEY = CACHE_KEY_PREFIX + ":views"
+CRYPTO_COUNTERS_CACHE_KEY = CACHE_KEY_PREFIX + ":crypto-counters"
+
+_local = threading.local()
+
+
+class Profile(object):
+    """
+    the timings of one sampled request, kept by the thread serving it
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(CATEGORIES, 0.0)
+        self.running = set()
+
+
+def timed(category):
+    """
+    count the time of the decorated function toward the category, when it
+    runs in a sampled request. a call within another of the same category
+    is only counted once, by the outer one.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = getattr(_local, "profile", None)
+            if profile is None or category in profile.running:
+                return func(*args, **kwargs)
+
+            profile.running.add(category)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.seconds[category] += time.perf_counter() - start
+                profile.running.discard(category)
+
+        return wrapper
+
+    return decorator
+
+
+def bucket_index(wall_ms):
+    for i, upper_bound in enumerate(BUCKETS_MS):
+        if wall_ms <= upper_bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def cache_key(view_name, field):
+    return "%s:%s:%s" % (CACHE_KEY_PREFIX, view_name, field)
+
+
+def record(view_name, wall_seconds, num_queries, db_seconds, profile):
+    """
+    add one sampled request to the totals of its view
+    """
+    values = {
+        "requests": 1,
+        "wall_us": int(wall_seconds * 1e6),
+        "db_queries": num_queries,
+        "db_us": int(db_seconds * 1e6),
+        "bucket_%s" % bucket_index(wall_seconds * 1000): 1,
+    }
+    for category, seconds in profile.seconds.items():
+        values["%s_us" % category] = int(seconds * 1e6)
+
+    view_names = cache.get(VIEWS_CACHE_KEY) or []
+    if view_name not in view_names:
+        cache.set(VIEWS_CACHE_KEY, sorted(set(view_names) | {view_name}), None)
+
+    for field, value in values.items():
+        if not value:
+            continue
+
+        key = cache_key(view_name, field)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            # evicted since it was added
+            cache.set(key, value, None)
+
+
+def view_profile(view_name, totals):
+    """
+    the means of the sampled requests to a view, with its wall time histogram
+    """
+    num_requests = totals.get("requests", 0)
+    histogram = [totals.get("bucket_%s" % i, 0) for i in range(len(BUCKETS_MS) + 1)]
+
+    def mean_ms(field):
+        return totals.get(field, 0) / 1000.0 / num_requests
+
+    def percentile_ms(p):
+        """
+        the upper bound of the bucket holding the percentile, None if open
+        """
+        rank = p / 100.0 * num_requests
+        seen = 0
+        for i, count in enumerate(histogram):
+            seen += count
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else None
+
+    profile = {
+        "view": view_name,
+        "requests": num_requests,
+        "wall_ms": mean_ms("wall_us"),
+        "wall_p50_ms": percentile_ms(50),
+        "wall_p95_ms": percentile_ms(95),
+        "db_queries": totals.get("db_queries", 0) / float(num_requests),
+        "db_ms": mean_ms("db_us"),
+        "histogram": histogram,
+    }
+    for category in CATEGORIES:
+        profile["%s_ms" % category] = mean_ms("%s_us" % category)
+    return profile
+
+
+def get_profiles():
+    """
+    the profile of every sampled view, the most time consuming first
+    """
+    profiles = []
+    for view_name in cache.get(VIEWS_CACHE_KEY) or []:
+        keys = {cache_key(view_name, field): field for field in FIELDS}
+        totals = {keys[key]: value for key, value in cache.get_many(keys).items()}
+        if totals.get("requests"):
+            profiles.append(view_profile(view_name, totals))
+
+    return sorted(profiles, key=lambda p: p["wall_ms"] * p["requests"], reverse=True)
+
+
+def reset_profiles():
+    view_names = cache.get(VIEWS_CACHE_KEY) or []
+    cache.delete_many(
+        [cache_key(view_name, field) for view_name in view_names for field in FIELDS]
+    )
+    cache.delete(VIEWS_CACHE_KEY)
+
+
+def crypto_counters_enabled():
+    """
+    whether the crypto counters were last switched on, or are configured on
+    """
+    enabled = cache.get(CRYPTO_COUNTERS_CACHE_KEY)
+    if enabled is None:
+        return settings.HELIOS_CRYPTO_COUNTERS
+    return enabled
+
+
+def sync_crypto_counters():
+    if crypto_counters_enabled():
+        opcounters.enable()
+    else:
+        opcounters.disable()
+
+
+def switch_crypto_counters(enabled):
+    cache.set(CRYPTO_COUNTERS_CACHE_KEY, enabled, None)
+    sync_crypto_counters()
+
+
+class ProfilingMiddleware(object):
+    """
+    profile a random sample of the requests, by the view that answers them
+
+    the response of a streaming view is timed until it starts streaming.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = settings.HELIOS_PROFILING_SAMPLE_RATE
+        if not self.sample_rate:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = _local.profile = Profile()
+        force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        num_logged = len(connection.queries_log)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            wall_seconds = time.perf_counter() - start
+            connection.force_debug_cursor = force_debug_cursor
+            queries = list(connection.queries_log)[num_logged:]
+            _local.profile = None
+
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match:
+            record(
+                resolver_match.url_name or resolver_match.view_name,
+                wall_seconds,
+                len(queries),
+                sum(float(query["time"]) for query in queries),
+                profile,
+            )
+
+        return response
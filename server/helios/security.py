@@ -130,8 +130,9 @@ def user_can_admin_election(user, election):
     if not user:
         return False
 
-    # election or site administrator
-    return election.admin == user or user.admin_p
+    # election or site administrator, without loading the admin, which cached
+    # elections leave out
+    return election.admin_id == user.id or user.admin_p
 
 
 def user_can_see_election(request, election):
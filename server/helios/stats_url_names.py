@@ -3,3 +3,10 @@ STATS_FORCE_QUEUE = "stats@force-queue"
 STATS_ELECTIONS = "stats@elections"
 STATS_ELECTIONS_PROBLEMS = "stats@elections-problems"
 STATS_RECENT_VOTES = "stats@recent-votes"
+STATS_VERIFICATION = "stats@verification"
+STATS_PERFORMANCE = "stats@performance"
+STATS_PROFILES = "stats@profiles"
+STATS_PROFILES_RESET = "stats@profiles-reset"
+STATS_CRYPTO = "stats@crypto"
+STATS_CRYPTO_METRICS = "stats@crypto-metrics"
+STATS_CRYPTO_SWITCH = "stats@crypto-switch"
@@ -11,6 +11,13 @@ from helios.stats_views import (
     elections,
     recent_problem_elections,
     recent_votes,
+    verification,
+    performance,
+    profiles,
+    profiles_reset,
+    crypto,
+    crypto_metrics,
+    crypto_switch,
 )
 import helios.stats_url_names as names
 
@@ -24,4 +31,11 @@ urlpatterns = [
         name=names.STATS_ELECTIONS_PROBLEMS,
     ),
     url(r"^recent-votes$", recent_votes, name=names.STATS_RECENT_VOTES),
+    url(r"^verification$", verification, name=names.STATS_VERIFICATION),
+    url(r"^performance$", performance, name=names.STATS_PERFORMANCE),
+    url(r"^profiles$", profiles, name=names.STATS_PROFILES),
+    url(r"^profiles/reset$", profiles_reset, name=names.STATS_PROFILES_RESET),
+    url(r"^crypto$", crypto, name=names.STATS_CRYPTO),
+    url(r"^crypto/metrics$", crypto_metrics, name=names.STATS_CRYPTO_METRICS),
+    url(r"^crypto/switch$", crypto_switch, name=names.STATS_CRYPTO_SWITCH),
 ]
@@ -1,19 +1,23 @@
 """
 Helios stats views
 """
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 
 import datetime
+import os
 
-from django.db.models import Max, Count
-from django.http import HttpResponseRedirect
+from django.db.models import Max, Count, Sum
+from django.http import HttpResponse, HttpResponseRedirect
 from django.urls import reverse
 
 from taskapp import tasks
-from helios_auth.security import get_user
-from helios_auth.view_utils import render_template
-from .models import CastVote, Election
+from helios_auth.security import check_csrf, get_user
+from . import pipeline, profiling
+from .crypto import opcounters
+from .view_utils import render_template
+from .models import CastVote, Election, ElectionStageTiming
 
 
 def require_admin(request):
@@ -24,12 +28,31 @@ def require_admin(request):
     return user
 
 
+def num_votes_in_queue():
+    """
+    the votes waiting for verification, from the counters of the elections
+    """
+    return (
+        Election.objects.filter(queued_votes_count__gt=0).aggregate(
+            num_votes=Sum("queued_votes_count")
+        )["num_votes"]
+        or 0
+    )
+
+
 def home(request):
     user = require_admin(request)
-    num_votes_in_queue = CastVote.objects.filter(
-        invalidated_at=None, verified_at=None
-    ).count()
-    return render_template(request, "stats", {"num_votes_in_queue": num_votes_in_queue})
+    num_queued = num_votes_in_queue()
+    return render_template(
+        request,
+        "stats",
+        {
+            "num_votes_in_queue": num_queued,
+            "falling_behind": pipeline.get_status(
+                num_queued, pipeline.ALERT_WINDOW_MINUTES
+            )["falling_behind"],
+        },
+    )
 
 
 def force_queue(request):
@@ -48,8 +71,11 @@ def elections(request):
     limit = int(request.GET.get("limit", 25))
     q = request.GET.get("q", "")
 
-    elections = Election.objects.filter(name__icontains=q)
-    elections.all().order_by("-created_at")
+    elections = (
+        Election.objects.filter(name__icontains=q)
+        .select_related("admin")
+        .order_by("-created_at")
+    )
     elections_paginator = Paginator(elections, limit)
     elections_page = elections_paginator.page(page)
 
@@ -103,3 +129,136 @@ def recent_problem_elections(request):
     return render_template(
         request, "stats_problem_elections", {"elections": elections_with_problems}
     )
+
+
+def verification(request):
+    user = require_admin(request)
+
+    queues = (
+        Election.objects.filter(queued_votes_count__gt=0)
+        .only("uuid", "name", "voters_count", "cast_votes_count", "queued_votes_count")
+        .order_by("-queued_votes_count")
+    )
+    status = pipeline.get_status(sum(e.queued_votes_count for e in queues))
+
+    return render_template(
+        request,
+        "stats_verification",
+        dict(
+            status,
+            summaries=[
+                ("last %s minutes" % status["recent"]["minutes"], status["recent"]),
+                ("last %s minutes" % status["summary"]["minutes"], status["summary"]),
+            ],
+            queues=queues,
+            buckets_seconds=pipeline.BUCKETS_SECONDS,
+            alert_window_minutes=pipeline.ALERT_WINDOW_MINUTES,
+        ),
+    )
+
+
+def performance(request):
+    """
+    the stage timings of every election, by stage then election size, to plan
+    for the next ones
+    """
+    user = require_admin(request)
+
+    stage = request.GET.get("stage", ElectionStageTiming.TALLY)
+    timings = (
+        ElectionStageTiming.objects.filter(stage=stage)
+        .select_related("election")
+        .only(
+            "stage",
+            "label",
+            "started_at",
+            "finished_at",
+            "num_items",
+            "peak_per_minute",
+            "num_voters",
+            "num_cast_votes",
+            "election__uuid",
+            "election__name",
+        )
+        .order_by("-num_cast_votes", "-num_voters", "-started_at")[:200]
+    )
+
+    return render_template(
+        request,
+        "stats_performance",
+        {"stage": stage, "stages": ElectionStageTiming.STAGES, "timings": timings},
+    )
+
+
+def profiles(request):
+    user = require_admin(request)
+
+    return render_template(
+        request,
+        "stats_profiles",
+        {
+            "profiles": profiling.get_profiles(),
+            "buckets_ms": profiling.BUCKETS_MS,
+            "sample_rate": settings.HELIOS_PROFILING_SAMPLE_RATE,
+        },
+    )
+
+
+def profiles_reset(request):
+    user = require_admin(request)
+
+    if request.method == "POST":
+        check_csrf(request)
+        profiling.reset_profiles()
+
+    return HttpResponseRedirect(reverse(profiles))
+
+
+def crypto(request):
+    user = require_admin(request)
+    profiling.sync_crypto_counters()
+
+    operations = []
+    for operation, counts in opcounters.snapshot().items():
+        ms = counts["seconds"] * 1000
+        operations.append(
+            {
+                "operation": operation,
+                "count": counts["count"],
+                "ms": ms,
+                "mean_ms": ms / counts["count"] if counts["count"] else 0,
+            }
+        )
+
+    return render_template(
+        request,
+        "stats_crypto",
+        {
+            "operations": operations,
+            "enabled": opcounters.is_enabled(),
+            "pid": os.getpid(),
+        },
+    )
+
+
+def crypto_metrics(request):
+    """
+    the crypto counters of the process serving the request, for Prometheus
+    """
+    user = require_admin(request)
+    profiling.sync_crypto_counters()
+
+    return HttpResponse(
+        opcounters.prometheus_text(opcounters.snapshot(), {"pid": os.getpid()}),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+def crypto_switch(request):
+    user = require_admin(request)
+
+    if request.method == "POST":
+        check_csrf(request)
+        profiling.switch_crypto_counters(request.POST.get("enabled") == "1")
+
+    return HttpResponseRedirect(reverse(crypto))
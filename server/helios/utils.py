@@ -219,10 +219,13 @@ def lock_row(model, pk):
 
 
 def create_qr_code_in_base64(data):
+    return base64.b64encode(create_qr_code_png(data))
+
+def create_qr_code_png(data):
     qr_code_image = create_qr_code(data)
     byteIO = io.BytesIO()
     qr_code_image.save(byteIO, format='PNG')
-    return base64.b64encode(byteIO.getvalue())
+    return byteIO.getvalue()
 
 def create_qr_code(data) -> PIL.Image:
     qr = qrcode.QRCode(
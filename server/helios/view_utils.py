@@ -11,10 +11,12 @@ from django.conf import settings
 from django.http import HttpResponse
 from django.shortcuts import render_to_response
 from django.template import Context, loader
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 
 import helios
 from helios_auth.security import get_user
-from . import utils
+from . import profiling, utils
 
 
 SUCCESS = HttpResponse("SUCCESS")
@@ -41,6 +43,7 @@ def prepare_vars(request, values):
     return vars_with_user
 
 
+@profiling.timed("templates")
 def render_template(request, template_name, values=None, include_user=True):
     vars_with_user = prepare_vars(request, values)
     t = loader.get_template(template_name + ".html")
@@ -53,6 +56,7 @@ def render_template(request, template_name, values=None, include_user=True):
     )
 
 
+@profiling.timed("templates")
 def render_template_raw(request, template_name, values=None):
     t = loader.get_template(template_name)
 
@@ -90,3 +94,36 @@ def return_json(func):
             raise e
 
     return update_wrapper(convert_to_json, func)
+
+
+# decorator
+def election_state_cache(func):
+    """
+    A decorator for views of election JSON that only changes with the election state.
+    Conditional GETs are answered from the election alone, without serializing,
+    and the JSON of frozen public elections may be cached by proxies.
+    Goes below election_view.
+    """
+
+    @condition(
+        etag_func=lambda request, election, *args, **kwargs: election.state_etag,
+        last_modified_func=lambda request, election, *args, **kwargs: election.modified_at,
+    )
+    def conditional_view(request, election, *args, **kwargs):
+        return func(request, election, *args, **kwargs)
+
+    def add_cache_headers(request, election, *args, **kwargs):
+        response = conditional_view(request, election, *args, **kwargs)
+
+        if election.private_p:
+            patch_cache_control(response, private=True, no_cache=True)
+        elif election.frozen_at:
+            patch_cache_control(
+                response, public=True, max_age=settings.HELIOS_ELECTION_JSON_MAX_AGE
+            )
+        else:
+            patch_cache_control(response, no_cache=True)
+
+        return response
+
+    return update_wrapper(add_cache_headers, func)
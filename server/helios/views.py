@@ -7,6 +7,8 @@ Ben Adida (ben@adida.net)
 
 import base64
 import datetime
+import gzip
+import hashlib
 import json
 import logging
 import os
@@ -19,16 +21,30 @@ import uuid
 from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.db import transaction, IntegrityError
 from django.http import (
     HttpResponse,
     Http404,
     HttpResponseRedirect,
     HttpResponseForbidden,
+    HttpResponseNotModified,
+    FileResponse,
+    StreamingHttpResponse,
 )
 from validate_email import validate_email
 
-from helios import utils, VOTERS_EMAIL, VOTERS_UPLOAD, url_names
+from helios import (
+    ballot_export,
+    pipeline,
+    utils,
+    VOTERS_EMAIL,
+    VOTERS_UPLOAD,
+    url_names,
+)
 from helios.models import (
     User,
     Election,
@@ -37,6 +53,10 @@ from helios.models import (
     VoterFile,
     Trustee,
     AuditedBallot,
+    BallotExport,
+    QrCode,
+    Job,
+    ElectionStageTiming,
 )
 from helios_auth import views as auth_views
 from helios_auth.auth_systems import AUTH_SYSTEMS, can_list_categories
@@ -69,6 +89,7 @@ from .view_utils import (
     return_json,
     render_template,
     render_template_raw,
+    election_state_cache,
 )
 from .workflows import homomorphic
 
@@ -89,6 +110,12 @@ ELGAMAL_PARAMS_LD_OBJECT = datatypes.LDObject.instantiate(
     ELGAMAL_PARAMS, datatype="legacy/EGParams"
 )
 
+# the parameters never change, so clients and proxies may keep them for a day
+ELGAMAL_PARAMS_ETAG = hashlib.sha1(
+    ELGAMAL_PARAMS_LD_OBJECT.serialize().encode("utf-8")
+).hexdigest()
+ELGAMAL_PARAMS_MAX_AGE = 24 * 60 * 60
+
 # single election server? Load the single electionfrom models import Election
 from django.conf import settings
 
@@ -144,6 +171,8 @@ def admin_autologin(request):
 ##
 
 
+@condition(etag_func=lambda request: ELGAMAL_PARAMS_ETAG)
+@cache_control(public=True, max_age=ELGAMAL_PARAMS_MAX_AGE)
 @return_json
 def election_params(request):
     return ELGAMAL_PARAMS_LD_OBJECT.toJSONDict()
@@ -388,6 +417,7 @@ def one_election_extend(request, election):
 
 
 @election_view()
+@election_state_cache
 @return_json
 def one_election_meta(request, election):
     if not election:
@@ -401,6 +431,7 @@ def one_election_meta(request, election):
 ## As of July 2009, there are always trustees for a Helios election: one trustee is acceptable, for simple elections.
 ##
 @election_view()
+@election_state_cache
 @return_json
 def list_trustees(request, election):
     trustees = Trustee.get_by_election(election)
@@ -582,6 +613,25 @@ def get_randomness(request, election):
     }
 
 
+@election_view()
+@election_state_cache
+def one_election_booth_bundle(request, election):
+    """
+  everything the booth loads for an election in one gzipped JSON response,
+  but the randomness, which is fetched separately so that the bundle is cacheable
+  """
+    bundle = election.booth_bundle()
+
+    if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        response = HttpResponse(bundle, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(bundle), content_type="application/json")
+
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
 @election_view(frozen=True)
 @return_json
 def encrypt_ballot(request, election):
@@ -753,9 +803,13 @@ def one_election_cast_confirm(request, election):
 
     # if this user is a voter, prepare some stuff
     if voter:
-        vote = datatypes.LDObject.fromDict(
-            utils.from_json(encrypted_vote), type_hint="legacy/EncryptedVote"
-        ).wrapped_obj
+        try:
+            vote = datatypes.LDObject.fromDict(
+                utils.from_json(encrypted_vote), type_hint="legacy/EncryptedVote"
+            ).wrapped_obj
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # not even shaped like a vote, CastVote.issues says so
+            vote = None
 
         if "HTTP_X_FORWARDED_FOR" in request.META:
             # HTTP_X_FORWARDED_FOR sometimes have a comma delimited list of IP addresses
@@ -790,8 +844,8 @@ def one_election_cast_confirm(request, election):
             past_votes = None
 
         if cast_vote:
-            # check for issues
-            issues = cast_vote.issues(election)
+            # check for issues, leaving the group membership check to the cast
+            issues = cast_vote.issues(election, check_group_membership=False)
         else:
             issues = None
 
@@ -868,8 +922,21 @@ def one_election_cast_confirm(request, election):
                 + reverse(one_election_cast_confirm, args=[election.uuid])
             )
 
+        # refuse a malformed ballot before it takes a place in the verification queue
+        issues = cast_vote.issues(election)
+        if issues:
+            del request.session["encrypted_vote"]
+            pipeline.record_rejection()
+            return render_template(
+                request,
+                "election_cast_rejected",
+                {"election": election, "issues": issues},
+            )
+
         # don't store the vote in the voter's data structure until verification
         cast_vote.save()
+        election.increment_queued_votes()
+        pipeline.record_cast()
 
         # status update?
         if request.POST.get("status_update", False):
@@ -1203,7 +1270,9 @@ def _register_voter(election, user):
     if not _check_eligibility(election, user):
         return None
 
-    return Voter.register_user_in_election(user, election)
+    voter = Voter.register_user_in_election(user, election)
+    tasks.voters_generate_qr_codes.delay(voter_ids=[voter.id])
+    return voter
 
 
 @election_view()
@@ -1282,26 +1351,65 @@ def one_election_compute_tally(request, election):
             + reverse(one_election_view, args=[election.election_id])
         )
 
+    # a tally still being computed is not started over
+    job = Job.get_active(election, Job.COMPUTE_TALLY)
+
     if request.method == "GET":
         return render_template(
-            request, "election_compute_tally", {"election": election}
+            request, "election_compute_tally", {"election": election, "job": job}
         )
 
     check_csrf(request)
 
+    if job:
+        return HttpResponseRedirect(
+            settings.SECURE_URL_HOST
+            + reverse(one_election_compute_tally, args=[election.uuid])
+        )
+
     if not election.voting_ended_at:
         election.voting_ended_at = datetime.datetime.utcnow()
 
     election.tallying_started_at = datetime.datetime.utcnow()
     election.save()
 
-    tasks.election_compute_tally.delay(election_id=election.id)
+    job = Job.create(election, Job.COMPUTE_TALLY)
+    tasks.election_compute_tally.delay(election_id=election.id, job_id=job.id)
 
     return HttpResponseRedirect(
         settings.SECURE_URL_HOST + reverse(one_election_view, args=[election.uuid])
     )
 
 
+@election_admin()
+@return_json
+def one_election_jobs(request, election):
+    """
+  the latest background jobs of the election, or the one of the uuid parameter,
+  for the admin pages to poll
+  """
+    jobs = Job.get_by_election(election)
+    if "uuid" in request.GET:
+        jobs = Job.objects.filter(election=election, uuid=request.GET["uuid"])
+
+    return {"jobs": [job.toJSONDict() for job in jobs]}
+
+
+@election_admin()
+def one_election_performance(request, election):
+    """
+  the timing of each stage of the election so far
+  """
+    return render_template(
+        request,
+        "election_performance",
+        {
+            "election": election,
+            "timings": ElectionStageTiming.get_by_election(election),
+        },
+    )
+
+
 @trustee_check
 def trustee_decrypt_and_prove(request, election, trustee):
     if not _check_election_tally_type(election) or election.encrypted_tally == None:
@@ -1344,6 +1452,15 @@ def trustee_upload_decryption(request, election, trustee_uuid):
     if trustee.verify_decryption_proofs():
         trustee.save()
 
+        # from when the encrypted tally was there to decrypt
+        ElectionStageTiming.record(
+            election,
+            ElectionStageTiming.TRUSTEE_DECRYPTION,
+            election.tallying_finished_at or timezone.now(),
+            label=trustee.name,
+            num_items=sum(len(q) for q in trustee.decryption_factors),
+        )
+
         try:
             # send a note to admin
             election.admin.send_message(
@@ -1479,7 +1596,12 @@ def voters_list_pretty(request, election):
 
     # load a bunch of voters
     # voters = Voter.get_by_election(election, order_by=order_by)
-    voters = Voter.objects.filter(election=election).order_by(order_by).defer("vote")
+    voters = (
+        Voter.objects.filter(election=election)
+        .select_related("cast_vote")
+        .defer("cast_vote__vote")
+        .order_by(order_by)
+    )
 
     if q != "":
         if election.use_voter_aliases:
@@ -1578,8 +1700,9 @@ def voters_upload(request, election):
     if request.method == "POST":
         if bool(request.POST.get("confirm_p", 0)):
             # launch the background task to parse that file
+            job = Job.create(election, Job.VOTER_FILE_PROCESS)
             tasks.voter_file_process.delay(
-                voter_file_id=request.session["voter_file_id"]
+                voter_file_id=request.session["voter_file_id"], job_id=job.id
             )
             del request.session["voter_file_id"]
 
@@ -1673,6 +1796,9 @@ def voters_email(request, election):
     election_url = get_election_url(election)
     election_vote_url = get_election_govote_url(election)
 
+    # the voters of an election are all of one type
+    sample_voter = election.voter_set.select_related("user").first()
+
     default_subject = render_template_raw(
         None, "email/%s_subject.txt" % template, {"custom_subject": "&lt;SUBJECT&gt;"}
     )
@@ -1690,7 +1816,7 @@ def voters_email(request, election):
                 "name": "<VOTER_NAME>",
                 "voter_login_id": "<VOTER_LOGIN_ID>",
                 "voter_password": "<VOTER_PASSWORD>",
-                "voter_type": election.voter_set.all()[0].voter_type,
+                "voter_type": sample_voter and sample_voter.voter_type,
                 "election": election,
             },
         },
@@ -1740,6 +1866,7 @@ def voters_email(request, election):
                 if email_form.cleaned_data["send_to"] == "not-voted":
                     voter_constraints_include = {"vote_hash": None}
 
+                job = Job.create(election, Job.VOTERS_EMAIL)
                 tasks.voters_email.delay(
                     election_id=election.id,
                     subject_template=subject_template,
@@ -1747,6 +1874,7 @@ def voters_email(request, election):
                     extra_vars=extra_vars,
                     voter_constraints_include=voter_constraints_include,
                     voter_constraints_exclude=voter_constraints_exclude,
+                    job_id=job.id,
                 )
 
             # this batch process is all async, so we can return a nice note
@@ -1781,8 +1909,14 @@ def voter_list(request, election):
 
     voters = Voter.get_by_election(
         election, order_by="uuid", after=request.GET.get("after", None), limit=limit
-    )
-    return [v.ld_object.toDict() for v in voters]
+    ).select_related("user")
+
+    # the voter ID hashes are stored, the election is the one already loaded
+    voter_dicts = []
+    for voter in voters:
+        voter.election = election
+        voter_dicts.append(voter.ld_object.toDict())
+    return voter_dicts
 
 
 @election_view()
@@ -1797,6 +1931,37 @@ def one_voter(request, election, voter_uuid):
     return voter.toJSONDict()
 
 
+@election_view()
+def voter_qr_code(request, election, voter_uuid):
+    """
+  the PNG QR code of a voter, for the voter and the election admins
+  """
+    voter = Voter.get_by_election_and_uuid(election, voter_uuid)
+    if not voter:
+        raise Http404
+
+    user = get_user(request)
+    if voter != get_voter(request, user, election) and not user_can_admin_election(
+        user, election
+    ):
+        raise PermissionDenied()
+
+    # generated on the spot if the background job hasn't got to it yet
+    qr_code = QrCode.get_or_generate(voter)
+
+    etag = '"%s"' % qr_code.etag
+    if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(bytes(qr_code.image), content_type="image/png")
+
+    response["ETag"] = etag
+    patch_cache_control(
+        response, private=True, max_age=settings.HELIOS_QR_CODE_MAX_AGE
+    )
+    return response
+
+
 @election_view()
 @return_json
 def voter_votes(request, election, voter_uuid):
@@ -1840,8 +2005,38 @@ def ballot_list(request, election):
         election, cast=True, order_by="cast_at", limit=limit, after=after
     )
 
-    # we explicitly cast this to a short cast vote
-    return [v.last_cast_vote().ld_object.short.toDict(complete=True) for v in voters]
+    # the short cast votes, from the columns kept on the voters,
+    # without loading the ballots or serializing the voters
+    return [
+        ballot_export.short_ballot_dict(*row)
+        for row in voters.values_list("cast_at", "uuid", "voter_hash", "vote_hash")
+    ]
+
+
+@election_view()
+def ballot_list_export(request, election):
+    """
+  every tallied ballot as newline-delimited JSON, streamed.
+  with gzip=1, a gzipped download, prepared once the election is tallied.
+  """
+    if request.GET.get("gzip"):
+        filename = "%s-ballots.ndjson.gz" % election.short_name
+        export = BallotExport.get_by_election(election)
+        if export:
+            export.export_file.open("rb")
+            response = FileResponse(export.export_file, content_type="application/gzip")
+            response["ETag"] = '"%s"' % export.sha256
+        else:
+            response = StreamingHttpResponse(
+                ballot_export.iter_ndjson(election, compress=True),
+                content_type="application/gzip",
+            )
+        response["Content-Disposition"] = 'attachment; filename="%s"' % filename
+        return response
+
+    return StreamingHttpResponse(
+        ballot_export.iter_ndjson(election), content_type="application/x-ndjson"
+    )
 
 
 def election_shortcut(request, election_short_name):
@@ -1913,10 +2108,20 @@ def one_election_view(request, election):
     # should we show the result?
     show_result = election.result_released_at or (election.result and admin_p)
 
+    # the progress of the tally being computed
+    tally_job = None
+    if admin_p and election.tallying_started_at and not election.encrypted_tally:
+        tally_job = (
+            Job.objects.filter(election=election, kind=Job.COMPUTE_TALLY)
+            .order_by("-created_at")
+            .first()
+        )
+
     return render_template(
         request,
         "election_view",
         {
+            "tally_job": tally_job,
             "election": election,
             "trustees": trustees,
             "admin_p": admin_p,
@@ -1936,6 +2141,7 @@ def one_election_view(request, election):
 
 
 @election_view()
+@election_state_cache
 @return_json
 def one_election(request, election):
     if not election:
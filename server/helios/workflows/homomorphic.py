@@ -6,10 +6,18 @@ Ben Adida
 reworked 2011-01-09
 """
 
-from helios.crypto import algs
+from helios.crypto import algs, opcounters
+from helios import profiling
 from . import WorkflowObject
 
 
+def are_integers(*values):
+    """
+  whether every value parsed from a ballot is a number, rather than a JSON null
+  """
+    return all(isinstance(value, int) for value in values)
+
+
 class EncryptedAnswer(WorkflowObject):
     """
   An encrypted answer to a single election question
@@ -62,6 +70,7 @@ class EncryptedAnswer(WorkflowObject):
 
         return False
 
+    @profiling.timed("crypto")
     def verify(self, pk, min=0, max=1):
         possible_plaintexts = self.generate_plaintexts(pk)
         homomorphic_sum = 0
@@ -97,7 +106,73 @@ class EncryptedAnswer(WorkflowObject):
             # approval voting, no need for overall proof verification
             return True
 
+    def structure_issues(self, pk, question):
+        """
+    the problems with the shape of this answer, found without verifying
+    the proofs: the number of choices and proofs, whether every value is a
+    number, and the range of the challenges and responses
+    """
+        num_answers = len(question["answers"])
+        if not isinstance(self.choices, list) or len(self.choices) != num_answers:
+            num_choices = len(self.choices) if isinstance(self.choices, list) else 0
+            return ["%s choices instead of %s" % (num_choices, num_answers)]
+
+        for choice in self.choices:
+            if not are_integers(choice.alpha, choice.beta):
+                return ["malformed choice"]
+
+        if not isinstance(self.individual_proofs, list):
+            return ["missing proofs of the choices"]
+        if len(self.individual_proofs) != num_answers:
+            return ["missing proofs of the choices"]
+
+        # one proof per possible plaintext, 0 or 1 for each choice
+        proofs = []
+        for individual_proof in self.individual_proofs:
+            choice_proofs = individual_proof.proofs
+            if not isinstance(choice_proofs, list) or len(choice_proofs) != 2:
+                return ["malformed proof of a choice"]
+            proofs += choice_proofs
+
+        if question["max"] != None:
+            min_answers = question.get("min", 0)
+            num_sums = question["max"] - min_answers + 1
+            overall_proofs = self.overall_proof and self.overall_proof.proofs
+            if not isinstance(overall_proofs, list) or len(overall_proofs) != num_sums:
+                return ["malformed proof of the number of choices"]
+            proofs += overall_proofs
+
+        for proof in proofs:
+            commitment = proof.commitment
+            if not isinstance(commitment, dict):
+                return ["malformed proof"]
+            values = (commitment.get("A"), commitment.get("B"))
+            if not are_integers(proof.challenge, proof.response, *values):
+                return ["malformed proof"]
+            if not (0 <= proof.challenge < pk.q and 0 <= proof.response < pk.q):
+                return ["proof challenge or response out of range"]
+
+        return []
+
+    def group_elements(self):
+        """
+    the elements of the choices and of the proof commitments, all of which
+    belong to the group of the election key
+    """
+        elements = []
+        for choice in self.choices:
+            elements += [choice.alpha, choice.beta]
+
+        proofs = [p for dp in self.individual_proofs for p in dp.proofs]
+        if self.overall_proof:
+            proofs += self.overall_proof.proofs
+        for proof in proofs:
+            elements += [proof.commitment["A"], proof.commitment["B"]]
+
+        return elements
+
     @classmethod
+    @profiling.timed("crypto")
     def fromElectionAndAnswer(cls, election, question_num, answer_indexes):
         """
     Given an election, a question number, and a list of answers to that question
@@ -211,13 +286,17 @@ class EncryptedVote(WorkflowObject):
 
     answers = property(_answers_get, _answers_set)
 
+    @profiling.timed("crypto")
     def verify(self, election):
         # right number of answers
         if len(self.encrypted_answers) != len(election.questions):
             return False
 
-        # check hash
-        if self.election_hash != election.hash:
+        # check hash, as text like the one the booth sends
+        election_hash = election.hash
+        if isinstance(election_hash, bytes):
+            election_hash = election_hash.decode()
+        if self.election_hash != election_hash:
             # print "%s / %s " % (self.election_hash, election.hash)
             return False
 
@@ -239,7 +318,55 @@ class EncryptedVote(WorkflowObject):
 
         return True
 
+    @profiling.timed("crypto")
+    def structure_issues(self, election, check_group_membership=True):
+        """
+    the problems that can be found cheaply, before the proofs are verified:
+    the election, the shape of each answer, and whether the group elements
+    are in the group, checked in one batch unless check_group_membership is
+    False
+    """
+        issues = []
+
+        if self.election_uuid != election.uuid:
+            issues.append(
+                "the vote's election UUID does not match the election for which this vote is being cast"
+            )
+
+        election_hash = election.hash
+        if isinstance(election_hash, bytes):
+            election_hash = election_hash.decode()
+        if self.election_hash != election_hash:
+            issues.append("the vote's election fingerprint does not match the election")
+
+        if not isinstance(self.encrypted_answers, list):
+            issues.append("the vote is malformed")
+            return issues
+
+        if len(self.encrypted_answers) != len(election.questions):
+            issues.append(
+                "the vote answers %s questions instead of %s"
+                % (len(self.encrypted_answers), len(election.questions))
+            )
+            return issues
+
+        pk = election.public_key
+        for question_num, question in enumerate(election.questions):
+            ea = self.encrypted_answers[question_num]
+            issues += [
+                "question %s: %s" % (question_num + 1, issue)
+                for issue in ea.structure_issues(pk, question)
+            ]
+
+        if check_group_membership and not issues:
+            elements = [e for ea in self.encrypted_answers for e in ea.group_elements()]
+            if not algs.EGCiphertext.check_group_membership_batch(elements, pk):
+                issues.append("the vote has values outside the election's group")
+
+        return issues
+
     @classmethod
+    @profiling.timed("crypto")
     def fromElectionAndAnswers(cls, election, answers):
         pk = election.public_key
 
@@ -288,6 +415,7 @@ class DLogTable(object):
         while self.counter < up_to:
             self.increment()
 
+    @opcounters.counted("dlog_lookup")
     def lookup(self, value):
         return self.dlogs.get(value, None)
 
@@ -324,6 +452,13 @@ class Tally(WorkflowObject):
         self.questions = election.questions
         self.public_key = election.public_key
 
+        # ciphertexts loaded from storage don't carry their public key
+        for question_tally in self.tally or []:
+            for choice_tally in question_tally:
+                if not isinstance(choice_tally, int):
+                    choice_tally.pk = self.public_key
+
+    @profiling.timed("crypto")
     def add_vote_batch(self, encrypted_votes, verify_p=True):
         """
     Add a batch of votes. Eventually, this will be optimized to do an aggregate proof verification
@@ -332,6 +467,7 @@ class Tally(WorkflowObject):
         for vote in encrypted_votes:
             self.add_vote(vote, verify_p)
 
+    @profiling.timed("crypto")
     def add_vote(self, encrypted_vote, verify_p=True):
         # do we verify?
         if verify_p:
@@ -357,10 +493,34 @@ class Tally(WorkflowObject):
 
         self.num_tallied += 1
 
-    def decryption_factors_and_proofs(self, sk):
+    @profiling.timed("crypto")
+    def add_tally(self, other_tally):
+        """
+    Homomorphically add another partial tally of the same election into this one
+    """
+        for question_num in range(len(self.questions)):
+            answers = self.questions[question_num]["answers"]
+
+            for answer_num in range(len(answers)):
+                other_choice = other_tally.tally[question_num][answer_num]
+
+                # nothing was tallied for this choice
+                if isinstance(other_choice, int):
+                    continue
+
+                other_choice.pk = self.public_key
+                self.tally[question_num][answer_num] = (
+                    other_choice * self.tally[question_num][answer_num]
+                )
+
+        self.num_tallied += other_tally.num_tallied
+
+    @profiling.timed("crypto")
+    def decryption_factors_and_proofs(self, sk, progress=None):
         """
     returns an array of decryption factors and a corresponding array of decryption proofs.
     makes the decryption factors into strings, for general Helios / JS compatibility.
+    progress, if given, is called once each choice is decrypted.
     """
         # for all choices of all questions (double list comprehension)
         decryption_factors = []
@@ -382,11 +542,15 @@ class Tally(WorkflowObject):
                 question_factors.append(dec_factor)
                 question_proof.append(proof)
 
+                if progress:
+                    progress()
+
             decryption_factors.append(question_factors)
             decryption_proof.append(question_proof)
 
         return decryption_factors, decryption_proof
 
+    @profiling.timed("crypto")
     def decrypt_and_prove(self, sk, discrete_logs=None):
         """
     returns an array of tallies and a corresponding array of decryption proofs.
@@ -421,6 +585,7 @@ class Tally(WorkflowObject):
 
         return decrypted_tally, decryption_proof
 
+    @profiling.timed("crypto")
     def verify_decryption_proofs(
         self, decryption_factors, decryption_proofs, public_key, challenge_generator
     ):
@@ -451,6 +616,7 @@ class Tally(WorkflowObject):
 
         return True
 
+    @profiling.timed("crypto")
     def decrypt_from_factors(self, decryption_factors, public_key):
         """
     decrypt a tally given decryption factors
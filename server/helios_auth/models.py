@@ -7,8 +7,12 @@ Ben Adida
 (ben@adida.net)
 """
 
+import copy
+import hashlib
+
 from django.contrib.postgres.fields import JSONField
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 
 from .auth_systems import AUTH_SYSTEMS
 
@@ -45,9 +49,58 @@ class User(models.Model):
     def type_and_id(self):
         return self._get_type_and_id(self.user_type, self.user_id)
 
+    CACHE_VERSION = 1
+
+    @classmethod
+    def cache_key(cls, user_type, user_id):
+        type_and_id = cls._get_type_and_id(user_type, user_id)
+        return "helios_auth:user:v%s:%s" % (
+            cls.CACHE_VERSION,
+            hashlib.sha256(type_and_id.encode("utf-8")).hexdigest(),
+        )
+
+    # the password of password users and the access token stay out of the cache
+    UNCACHED_FIELDS = ("info", "token")
+
+    def invalidate_cache(self):
+        key = self.cache_key(self.user_type, self.user_id)
+        cache.delete(key)
+
+        # again once committed, in case a concurrent request cached the old row
+        transaction.on_commit(lambda: cache.delete(key))
+
+    def cache_snapshot(self):
+        """
+    a copy of the user to cache, without the uncached fields. they are deferred,
+    and read from the database when accessed.
+    """
+        snapshot = copy.copy(self)
+        for field_name in self.UNCACHED_FIELDS:
+            snapshot.__dict__.pop(field_name, None)
+
+        return snapshot
+
+    def save(self, *args, **kwargs):
+        super(User, self).save(*args, **kwargs)
+        self.invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        result = super(User, self).delete(*args, **kwargs)
+        self.invalidate_cache()
+        return result
+
     @classmethod
     def get_by_type_and_id(cls, user_type, user_id):
-        return cls.objects.get(user_type=user_type, user_id=user_id)
+        """
+    looked up on every request, so cached, without the secrets in info and token
+    """
+        key = cls.cache_key(user_type, user_id)
+        user = cache.get(key)
+        if user is None:
+            user = cls.objects.get(user_type=user_type, user_id=user_id)
+            cache.set(key, user.cache_snapshot())
+
+        return user
 
     @classmethod
     def update_or_create(cls, user_type, user_id, name=None, info=None, token=None):
@@ -62,10 +115,15 @@ class User(models.Model):
             if "password" in obj.info:
                 info["password"] = obj.info["password"]
 
+            # the name only when it changed, as saving it updates the user's voters
+            update_fields = ["info", "token"]
+            if obj.name != name:
+                update_fields.append("name")
+
             obj.info = info
             obj.name = name
             obj.token = token
-            obj.save()
+            obj.save(update_fields=update_fields)
 
         return obj
 
@@ -6,18 +6,65 @@ ben@adida.net
 """
 
 import copy
-from celery import shared_task
-from celery.utils.log import get_logger
+from contextlib import contextmanager
 
-from helios import signals
-from helios.models import CastVote, Election, Voter, VoterFile
+from celery import chord, shared_task
+from celery.signals import task_prerun
+from celery.utils.log import get_logger
+from django.conf import settings
+
+from helios import profiling, signals
+from helios.crypto import opcounters
+from helios.datatypes import LDObject
+from helios.models import (
+    BallotExport,
+    CastVote,
+    Election,
+    Job,
+    QrCode,
+    Voter,
+    VoterFile,
+)
 from helios.view_utils import render_template_raw
 
 
+@task_prerun.connect
+def sync_crypto_counters(**kwargs):
+    profiling.sync_crypto_counters()
+
+
+@contextmanager
+def logging_crypto_operations(task_name):
+    """
+    log the crypto operations done in the block, when they are counted
+    """
+    if not opcounters.is_enabled():
+        yield
+        return
+
+    with opcounters.counting() as counting:
+        yield
+
+    logger = get_logger(task_name)
+    logger.info(
+        "crypto operations: %s" % (opcounters.format_counts(counting.counts) or "none")
+    )
+
+
+def get_job(job_id, election, kind):
+    """
+    the job a task reports to, created when the task was queued without one
+    """
+    if job_id:
+        return Job.objects.get(id=job_id)
+    return Job.create(election, kind)
+
+
 @shared_task()
 def cast_vote_verify_and_store(cast_vote_id, status_update_message=None, **kwargs):
     cast_vote = CastVote.objects.get(id=cast_vote_id)
-    result = cast_vote.verify_and_store()
+    with logging_crypto_operations(cast_vote_verify_and_store.__name__):
+        result = cast_vote.verify_and_store()
 
     voter = cast_vote.voter
     election = voter.election
@@ -48,12 +95,16 @@ def voters_email(
     extra_vars={},
     voter_constraints_include=None,
     voter_constraints_exclude=None,
+    job_id=None,
 ):
     """
     voter_constraints_include are conditions on including voters
     voter_constraints_exclude are conditions on excluding voters
+
+    the job is done once every single voter email is sent
     """
     election = Election.objects.get(id=election_id)
+    job = get_job(job_id, election, Job.VOTERS_EMAIL)
 
     # select the right list of voters
     voters = election.voter_set.all()
@@ -62,9 +113,13 @@ def voters_email(
     if voter_constraints_exclude:
         voters = voters.exclude(**voter_constraints_exclude)
 
+    job.start(total=voters.count())
+    if not job.total:
+        job.finish()
+
     for voter in voters:
         single_voter_email.delay(
-            voter.uuid, subject_template, body_template, extra_vars
+            voter.uuid, subject_template, body_template, extra_vars, job_id=job.id
         )
 
 
@@ -76,16 +131,25 @@ def voters_notify(election_id, notification_template, extra_vars={}):
 
 
 @shared_task()
-def single_voter_email(voter_uuid, subject_template, body_template, extra_vars={}):
-    voter = Voter.objects.get(uuid=voter_uuid)
+def single_voter_email(
+    voter_uuid, subject_template, body_template, extra_vars={}, job_id=None
+):
+    try:
+        voter = Voter.objects.get(uuid=voter_uuid)
 
-    the_vars = copy.copy(extra_vars)
-    the_vars.update({"voter": voter})
+        the_vars = copy.copy(extra_vars)
+        the_vars.update({"voter": voter})
 
-    subject = render_template_raw(None, subject_template, the_vars)
-    body = render_template_raw(None, body_template, the_vars)
+        subject = render_template_raw(None, subject_template, the_vars)
+        body = render_template_raw(None, body_template, the_vars)
 
-    voter.send_message(subject, body)
+        voter.send_message(subject, body)
+    finally:
+        # counted when it failed too, for the job to finish
+        if job_id:
+            job = Job.objects.get(id=job_id)
+            job.advance()
+            job.flush()
 
 
 @shared_task()
@@ -101,12 +165,80 @@ def single_voter_notify(voter_uuid, notification_template, extra_vars={}):
 
 
 @shared_task()
-def election_compute_tally(election_id):
+def election_compute_tally(election_id, num_shards=None, job_id=None):
+    election = Election.objects.get(id=election_id)
+    job = get_job(job_id, election, Job.COMPUTE_TALLY)
+
+    # voting is over
+    election.record_verification_timing()
+
+    if num_shards is None:
+        num_shards = settings.HELIOS_TALLY_SHARDS
+
+    # split the tally across workers, one task per range of voters
+    if num_shards > 1:
+        voter_ranges = election.tally_voter_ranges(num_shards)
+        if len(voter_ranges) > 1:
+            job.start(total=election.num_cast_votes)
+            chord(
+                election_compute_partial_tally.s(election_id, first, last, job.id)
+                for first, last in voter_ranges
+            )(election_combine_partial_tallies.s(election_id, job.id))
+            return
+
+    with job.running(total=election.num_cast_votes):
+        with logging_crypto_operations(election_compute_tally.__name__):
+            election.compute_tally(job=job)
+    election_tally_computed(election)
+
+
+@shared_task()
+def election_compute_partial_tally(
+    election_id, first_voter_id, last_voter_id, job_id=None
+):
     election = Election.objects.get(id=election_id)
-    election.compute_tally()
+    job = job_id and Job.objects.get(id=job_id)
+    try:
+        with logging_crypto_operations(election_compute_partial_tally.__name__):
+            tally = election.compute_partial_tally(
+                first_voter_id, last_voter_id, job=job
+            )
+    except Exception as e:
+        if job:
+            job.fail(e)
+        raise
+
+    if job:
+        job.flush()
+    return tally.toJSONDict()
+
+
+@shared_task()
+def election_combine_partial_tallies(partial_tallies, election_id, job_id=None):
+    election = Election.objects.get(id=election_id)
+    job = job_id and Job.objects.get(id=job_id)
+    try:
+        election.combine_partial_tallies(
+            [
+                LDObject.fromDict(partial_tally, type_hint="legacy/Tally").wrapped_obj
+                for partial_tally in partial_tallies
+            ],
+            started_at=job and job.started_at,
+        )
+    except Exception as e:
+        if job:
+            job.fail(e)
+        raise
 
+    # only now that the tally is stored, the job polled for it is done
+    if job:
+        job.finish()
+    election_tally_computed(election)
+
+
+def election_tally_computed(election):
     election_notify_admin.delay(
-        election_id=election_id,
+        election_id=election.id,
         subject="encrypted tally computed",
         body="""
 The encrypted tally for election %s has been computed.
@@ -117,14 +249,28 @@ Helios
         % election.name,
     )
 
+    election_export_ballots.delay(election_id=election.id)
+
     if election.has_helios_trustee():
-        tally_helios_decrypt.delay(election_id=election.id)
+        job = Job.create(election, Job.HELIOS_TRUSTEE_DECRYPT)
+        tally_helios_decrypt.delay(election_id=election.id, job_id=job.id)
+
+
+@shared_task()
+def election_export_ballots(election_id):
+    election = Election.objects.get(id=election_id)
+    BallotExport.generate(election)
 
 
 @shared_task()
-def tally_helios_decrypt(election_id):
+def tally_helios_decrypt(election_id, job_id=None):
     election = Election.objects.get(id=election_id)
-    election.helios_trustee_decrypt()
+    job = get_job(job_id, election, Job.HELIOS_TRUSTEE_DECRYPT)
+
+    num_choices = sum(len(question["answers"]) for question in election.questions)
+    with job.running(total=num_choices):
+        with logging_crypto_operations(tally_helios_decrypt.__name__):
+            election.helios_trustee_decrypt(job=job)
     election_notify_admin.delay(
         election_id=election_id,
         subject="Helios Decrypt",
@@ -140,9 +286,14 @@ Helios
 
 
 @shared_task()
-def voter_file_process(voter_file_id):
+def voter_file_process(voter_file_id, job_id=None):
     voter_file = VoterFile.objects.get(id=voter_file_id)
-    voter_file.process()
+    job = get_job(job_id, voter_file.election, Job.VOTER_FILE_PROCESS)
+
+    # counted once running, so that a file that doesn't parse fails the job
+    with job.running():
+        job.set_total(sum(1 for _ in voter_file.itervoters()))
+        voter_file.process(job=job)
     election_notify_admin.delay(
         election_id=voter_file.election.id,
         subject="voter file processed",
@@ -157,6 +308,34 @@ Helios
 """
         % (voter_file.election.name, voter_file.num_voters),
     )
+    election_generate_qr_codes.delay(election_id=voter_file.election.id)
+
+
+@shared_task()
+def voters_generate_qr_codes(voter_ids):
+    QrCode.generate_missing(Voter.objects.filter(id__in=voter_ids))
+
+
+@shared_task()
+def election_generate_qr_codes(election_id):
+    """
+    generate the missing QR codes of an election, in batches
+    """
+    election = Election.objects.get(id=election_id)
+    batch_size = settings.HELIOS_QR_CODE_BATCH_SIZE
+
+    last_voter_id = 0
+    while True:
+        voter_ids = list(
+            election.voter_set.filter(id__gt=last_voter_id, qrcode=None)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not voter_ids:
+            break
+
+        QrCode.generate_missing(Voter.objects.filter(id__in=voter_ids))
+        last_voter_id = voter_ids[-1]
 
 
 @shared_task()
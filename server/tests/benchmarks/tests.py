@@ -0,0 +1,158 @@
+"""
+Benchmark suite tests
+
+the benchmarks only run at a small scale here, the crypto ones once each.
+set HELIOS_BENCHMARKS=1 to time the crypto ones fully and fail on a
+regression against the stored baseline.
+"""
+
+import json
+import os
+
+import pytest
+
+from benchmarks import crypto, election, loadtest
+from helios.models import Election
+
+
+def test_crypto_benchmarks():
+    results = crypto.run_benchmarks(rounds=1, number=1)
+
+    assert list(results["results"]) == [name for name, _, _ in crypto.BENCHMARKS]
+    assert results["p_bits"] == 2048
+    for result in results["results"].values():
+        assert result["best"] > 0
+        assert result["best"] == result["median"]
+
+    # machine-readable, and comparable to the stored baseline
+    assert json.loads(json.dumps(results)) == results
+    baseline = crypto.load_baseline()
+    assert set(baseline["results"]) == set(results["results"])
+
+
+def test_crypto_benchmarks_by_name():
+    results = crypto.run_benchmarks(rounds=1, names=["dlog_table"])
+    assert list(results["results"]) == ["dlog_table"]
+
+
+def test_compare():
+    baseline = {"results": {"fast": {"best": 1.0}, "slow": {"best": 1.0}}}
+    results = {
+        "results": {"fast": {"best": 1.2}, "slow": {"best": 2.0}, "new": {"best": 9.0}}
+    }
+
+    assert crypto.compare(results, baseline) == [("slow", 2.0)]
+    assert crypto.compare(results, baseline, tolerance=2.5) == []
+    assert crypto.compare(results, baseline, tolerance=1.1) == [
+        ("fast", 1.2),
+        ("slow", 2.0),
+    ]
+
+
+@pytest.mark.skipif(
+    not os.environ.get("HELIOS_BENCHMARKS"), reason="HELIOS_BENCHMARKS is not set"
+)
+def test_crypto_baseline():
+    results = crypto.run_benchmarks()
+    assert crypto.compare(results, crypto.load_baseline()) == []
+
+
+@pytest.mark.django_db
+def test_election_benchmark():
+    benchmark = election.ElectionBenchmark(
+        7, num_questions=2, pool_size=2, processes=1, batch_size=3, num_verify=2
+    )
+    results = benchmark.run()
+
+    assert results["result_ok"]
+    assert [phase["phase"] for phase in results["phases"]] == [
+        "generate",
+        "store",
+        "verify",
+        "compute_tally",
+        "helios_trustee_decrypt",
+        "combine_decryptions",
+    ]
+    assert all(phase["peak_rss_mb"] > 0 for phase in results["phases"])
+
+    voters = benchmark.election.voter_set.all()
+    assert benchmark.election.num_cast_votes == 7
+    assert all(v.cast_vote_id and v.voter_hash for v in voters)
+    assert sum(benchmark.election.result[0]) == 7
+
+
+@pytest.mark.django_db
+def test_election_benchmark_rolled_back():
+    num_elections = Election.objects.count()
+    results = election.run_benchmark(num_voters=1, pool_size=1, processes=1)
+
+    assert results["result_ok"]
+    assert Election.objects.count() == num_elections
+
+
+def test_loadtest_arrival_times():
+    assert loadtest.arrival_times("burst", 3, 10.0) == [0.0, 0.0, 0.0]
+    assert loadtest.arrival_times("steady", 4, 10.0) == [0.0, 2.5, 5.0, 7.5]
+
+    rush = loadtest.arrival_times("rush", 4, 10.0)
+    assert rush[0] == 0.0 and rush[-1] < 10.0
+    gaps = [b - a for a, b in zip(rush, rush[1:])]
+    assert gaps == sorted(gaps, reverse=True)
+
+
+def test_loadtest_percentiles():
+    result = loadtest.percentiles(range(1, 101))
+    assert (result["p50"], result["p90"], result["p99"]) == (50, 90, 99)
+    assert (result["mean"], result["max"]) == (50.5, 100)
+
+    assert loadtest.percentiles([7]) == {
+        "p50": 7,
+        "p90": 7,
+        "p95": 7,
+        "p99": 7,
+        "mean": 7,
+        "max": 7,
+    }
+    assert loadtest.percentiles([]) == {}
+
+
+# the server threads only see committed rows
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_closing_hour_rush():
+    load_test = loadtest.LoadTest(
+        loadtest.SCENARIOS["closing_hour_rush"],
+        num_voters=3,
+        concurrency=2,
+        duration=0.5,
+        processes=1,
+    )
+    load_test.setup()
+    try:
+        results = load_test.run()
+    finally:
+        load_test.teardown()
+
+    assert results["completed"] == 3
+    assert results["errors"] == {}
+    assert results["verified"] == 3
+    assert set(results["latency_ms"]) == set(loadtest.STEPS)
+    assert all(len(t) for t in results["latency_ms"].values())
+    assert not Election.objects.filter(id=load_test.election.id).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_open_registration_burst():
+    load_test = loadtest.LoadTest(
+        loadtest.SCENARIOS["open_registration_burst"], num_voters=2, processes=1
+    )
+    load_test.setup()
+    try:
+        results = load_test.run()
+        # registered as they confirmed
+        assert load_test.election.voter_set.count() == 2
+    finally:
+        load_test.teardown()
+
+    assert results["completed"] == 2
+    assert results["verified"] == 2
+    assert "login" not in results["latency_ms"]
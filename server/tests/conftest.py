@@ -0,0 +1,41 @@
+import pytest
+from celery import current_app
+from django.core.cache import cache
+
+from helios.models import clear_alias_blocks
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """
+    cached rows would outlive the rollback of the test that created them
+    """
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def alias_blocks():
+    """
+    alias numbers reserved by a test are rolled back along with its election
+    """
+    clear_alias_blocks()
+    yield
+    clear_alias_blocks()
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    """
+    files stored by a test, such as ballot exports, go to a throwaway directory
+    """
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.fixture(autouse=True, scope="session")
+def eager_tasks():
+    """
+    there is no broker in tests, tasks run in process when they are sent
+    """
+    current_app.conf.update(task_always_eager=True, task_eager_propagates=True)
@@ -2,15 +2,30 @@
 Unit Tests for Helios
 """
 
+import copy
+import datetime
+import gzip
+import hashlib
+import io
+import os
+import pickle
+import random
 import re
 import uuid
+from unittest import mock
 
 import django_webtest
 import pytest
 from django.conf import settings
 from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.core.exceptions import MiddlewareNotUsed
 from django.core.files import File
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
 from django.utils.html import escape as html_escape
 from django.utils.timezone import now
 
@@ -18,7 +33,90 @@ import helios.datatypes as datatypes
 import helios.models as models
 import helios.utils as utils
 import helios.views as views
+from helios import pipeline, profiling
+from helios import election_url_names, election_urls, stats_url_names, stats_urls
+from helios.crypto import algs, opcounters
+from helios.security import HELIOS_TRUSTEE_UUID
+from helios.datatypes import ballotcodec, djangofield
+from helios.workflows import homomorphic
 from helios_auth import models as auth_models
+from taskapp import tasks
+
+
+class FrozenElectionMixin(object):
+    """
+    a frozen election with a helios trustee, where every voter has cast a vote
+    """
+
+    fixtures = ["users.json"]
+    allow_database_queries = True
+
+    NUM_VOTERS = 5
+
+    def setUp(self):
+        user = auth_models.User.objects.get(user_id="ben@adida.net", user_type="google")
+        self.election, _ = models.Election.get_or_create(
+            short_name="frozen",
+            uuid=str(uuid.uuid4()),
+            name="Frozen Election",
+            description="Frozen Election Description",
+            admin=user,
+        )
+        self.election.questions = [
+            {
+                "answer_urls": [None, None],
+                "answers": ["a", "b"],
+                "choice_type": "approval",
+                "max": 1,
+                "min": 0,
+                "question": "w?",
+                "result_type": "absolute",
+                "short_name": "w?",
+                "tally_type": "homomorphic",
+            }
+        ]
+        self.election.openreg = True
+        self.election.generate_trustee(views.ELGAMAL_PARAMS)
+        self.election.freeze()
+
+        for i in range(self.NUM_VOTERS):
+            self.cast_vote(self.create_voter(i), i % 2)
+
+    def create_voter(self, i):
+        voter = models.Voter(
+            uuid=str(uuid.uuid4()),
+            election=self.election,
+            voter_login_id="voter%s" % i,
+            voter_name="Voter %s" % i,
+            voter_email="voter%s@example.com" % i,
+        )
+        voter.save()
+        self.election.increment_voters()
+        return voter
+
+    def cast_vote(self, voter, answer):
+        """
+        store a vote made of bare ciphertexts, enough for tallying
+        """
+        pk = self.election.public_key
+        choices = [
+            pk.encrypt(algs.EGPlaintext(pow(pk.g, int(answer == j), pk.p), pk))
+            for j in range(2)
+        ]
+        vote = homomorphic.EncryptedVote()
+        vote.encrypted_answers = [homomorphic.EncryptedAnswer(choices=choices)]
+        vote.election_hash = self.election.hash.decode()
+        vote.election_uuid = self.election.uuid
+
+        cast_vote = models.CastVote(
+            voter=voter,
+            vote=vote,
+            vote_hash=datatypes.LDObject.instantiate(vote).hash,
+            cast_at=now(),
+            verified_at=now(),
+        )
+        cast_vote.save()
+        voter.store_vote(cast_vote)
 
 
 @pytest.mark.django_db
@@ -99,6 +197,58 @@ class ElectionModelTests(TestCase):
         assert voter.voter_email == "ben5@adida.net"
         assert voter.voter_name == "Ben5 Adida"
 
+    def test_voter_aliases(self):
+        self.election.use_voter_aliases = True
+        self.election.save()
+
+        with self.settings(HELIOS_ALIAS_BLOCK_SIZE=2):
+            voter = models.Voter.register_user_in_election(self.user, self.election)
+            assert voter.alias == "V1"
+            assert self.election.next_alias_num() == 2
+            assert self.election.next_alias_num() == 3
+
+        # the second block is reserved, but the numbers are not handed out twice
+        assert self.election.last_alias_num == 4
+
+        with open("helios/fixtures/voter-file.csv") as file:
+            vf = models.VoterFile.objects.create(
+                election=self.election, voter_file=File(file, "voter_file.css")
+            )
+            num_voters = vf.process()
+
+        aliases = set(
+            self.election.voter_set.exclude(user=self.user).values_list(
+                "alias", flat=True
+            )
+        )
+        assert aliases == set("V%s" % i for i in range(5, 5 + num_voters))
+        assert self.election.last_alias_num == 4 + num_voters
+
+    def test_generate_qr_codes(self):
+        voter = models.Voter.register_user_in_election(self.user, self.election)
+        assert not models.QrCode.objects.filter(voter=voter).exists()
+
+        with open("helios/fixtures/voter-file.csv") as file:
+            vf = models.VoterFile.objects.create(
+                election=self.election, voter_file=File(file, "voter_file.css")
+            )
+            num_voters = vf.process()
+
+        with self.settings(HELIOS_QR_CODE_BATCH_SIZE=2):
+            tasks.election_generate_qr_codes(self.election.id)
+
+        qr_codes = models.QrCode.objects.filter(voter__election=self.election)
+        assert qr_codes.count() == num_voters + 1
+        png = utils.create_qr_code_png(voter.qr_code_content)
+        assert bytes(qr_codes.get(voter=voter).image) == png
+
+        assert models.QrCode.generate_missing(self.election.voter_set.all()) == 0
+
+    def test_unfrozen_election_not_cached(self):
+        models.Election.get_by_uuid(self.election.uuid)
+        with self.assertNumQueries(1):
+            models.Election.get_by_uuid(self.election.uuid)
+
     def test_check_issues_before_freeze(self):
         # should be three issues: no trustees, and no questions, and no voters
         issues = self.election.issues_before_freeze
@@ -218,6 +368,82 @@ class ElectionModelTests(TestCase):
         assert voter.user == self.user
 
 
+class ElectionCounterTests(FrozenElectionMixin, TestCase):
+    def test_counters(self):
+        self.election.refresh_from_db()
+        assert self.election.num_voters == self.NUM_VOTERS
+        assert self.election.num_cast_votes == self.NUM_VOTERS
+
+        # a stale copy of the election doesn't write back its counters
+        stale_election = models.Election.objects.get(id=self.election.id)
+        voter = self.create_voter(self.NUM_VOTERS)
+        stale_election.save()
+        self.election.refresh_from_db()
+        assert self.election.num_voters == self.NUM_VOTERS + 1
+        assert self.election.num_cast_votes == self.NUM_VOTERS
+
+        # only the first vote of a voter counts
+        self.cast_vote(voter, 0)
+        self.cast_vote(voter, 1)
+        self.election.refresh_from_db()
+        assert self.election.num_cast_votes == self.NUM_VOTERS + 1
+
+        voter.delete()
+        self.election.refresh_from_db()
+        assert self.election.num_voters == self.NUM_VOTERS
+        assert self.election.num_cast_votes == self.NUM_VOTERS
+
+    def test_reconcile_counters(self):
+        models.Election.objects.filter(id=self.election.id).update(
+            voters_count=0, cast_votes_count=42, queued_votes_count=3
+        )
+
+        out = io.StringIO()
+        call_command("reconcile_election_counters", self.election.uuid, stdout=out)
+        assert "1 elections repaired" in out.getvalue()
+
+        self.election.refresh_from_db()
+        assert self.election.num_voters == self.NUM_VOTERS
+        assert self.election.num_cast_votes == self.NUM_VOTERS
+        assert self.election.queued_votes_count == 0
+        assert not self.election.reconcile_counters()
+
+
+class FrozenElectionCacheTests(FrozenElectionMixin, TestCase):
+    def test_frozen_election_cached(self):
+        models.Election.get_by_uuid(self.election.uuid)
+        with self.assertNumQueries(0):
+            election = models.Election.get_by_uuid(self.election.uuid)
+
+        # no user, with its password and token, is cached with the election
+        cached = cache.get(models.Election.cache_key(self.election.uuid))
+        assert not [
+            value
+            for value in cached.__dict__.values()
+            if isinstance(value, auth_models.User)
+        ]
+        assert b"helios_auth" not in pickle.dumps(cached)
+        assert election.admin == self.election.admin
+
+        # the counters are not cached, they are read together on first access
+        with self.assertNumQueries(1):
+            assert election.num_cast_votes == self.NUM_VOTERS
+            assert election.num_voters == self.NUM_VOTERS
+
+        # votes don't evict the cached election
+        self.election.increment_cast_votes()
+        with self.assertNumQueries(0):
+            election = models.Election.get_by_uuid(self.election.uuid)
+        assert election.num_cast_votes == self.NUM_VOTERS + 1
+
+        election.increment_cast_votes()
+        assert election.num_cast_votes == self.NUM_VOTERS + 2
+
+        self.election.name = "Renamed"
+        self.election.save()
+        assert models.Election.get_by_uuid(self.election.uuid).name == "Renamed"
+
+
 class VoterModelTests(TestCase):
     fixtures = ["users.json", "election.json"]
     allow_database_queries = True
@@ -246,6 +472,56 @@ class VoterModelTests(TestCase):
         # check that you can get at the voter user structure
         assert v.get_user().user_id == v.voter_email
 
+    def test_voter_hash(self):
+        # a voter of the legacy fixtures, with the hash listed with its ballot
+        voter = models.Voter(
+            uuid="36cab4d2-baf5-4fe6-9316-072bb10a08c5",
+            election=models.Election(uuid="40a17486-1446-11e0-b9ec-000c293e7de1"),
+            voter_login_id="benadida5",
+            voter_name="Ben5 Adida",
+            voter_email="ben5@adida.net",
+        )
+        voter.update_hashes()
+        assert voter.voter_hash == "/SnejZYob4Xvxv4gqsvj/ciEouUrrlZPpLTEYWnmgPg"
+
+    def test_voter_hashes_are_stored(self):
+        def stored_voter(voter_id):
+            voter = models.Voter.objects.get(id=voter_id)
+            assert voter.voter_id_hash == voter.compute_voter_id_hash()
+            assert voter.voter_hash == voter.ld_object.hash.decode()
+            return voter
+
+        user = auth_models.User.objects.get(user_id="ben@adida.net", user_type="google")
+        voter = models.Voter.register_user_in_election(user, self.election)
+        voter_hash = stored_voter(voter.id).voter_hash
+
+        # the name of the user is part of the voter
+        user.name = "Ben Renamed"
+        user.save()
+        assert stored_voter(voter.id).voter_hash != voter_hash
+
+        # logging in again saves the user, but only a new name changes its voters
+        with CaptureQueriesContext(connection) as queries:
+            auth_models.User.update_or_create(
+                user.user_type, user.user_id, name=user.name, info={}, token={}
+            )
+        assert not [q for q in queries if "helios_voter" in q["sql"]]
+
+        voter_hash = stored_voter(voter.id).voter_hash
+        auth_models.User.update_or_create(
+            user.user_type, user.user_id, name="Ben Again", info={}, token={}
+        )
+        assert stored_voter(voter.id).voter_hash != voter_hash
+
+        voter.alias = "V42"
+        voter.save(update_fields=["alias"])
+        stored_voter(voter.id)
+
+        # served as stored, without serializing the voter
+        voter = stored_voter(voter.id)
+        voter.voter_hash = "stored"
+        assert voter.hash == b"stored"
+
 
 class CastVoteModelTests(TestCase):
     fixtures = ["users.json", "election.json"]
@@ -261,8 +537,397 @@ class CastVoteModelTests(TestCase):
         self.voter = models.Voter.register_user_in_election(
             self.user, self.election)
 
-    # def test_cast_vote(self):
-    #     pass
+    def create_cast_vote(self, vote_hash):
+        vote = homomorphic.EncryptedVote()
+        vote.encrypted_answers = [
+            homomorphic.EncryptedAnswer(choices=[algs.EGCiphertext(alpha=2, beta=3)])
+        ]
+        vote.election_hash = self.election.hash.decode()
+        vote.election_uuid = self.election.uuid
+
+        cast_vote = models.CastVote(voter=self.voter, vote=vote, vote_hash=vote_hash)
+        cast_vote.save()
+        return cast_vote
+
+    def test_tinyhash_collisions(self):
+        assert self.create_cast_vote(b"ab/cdefghij").vote_tinyhash == "abcdefgh"
+        assert self.create_cast_vote(b"abcdefghik").vote_tinyhash == "abcdefghi"
+        assert self.create_cast_vote(b"abcdefghil").vote_tinyhash == "abcdefghil"
+
+        # the same hash again has no free tinyhash left
+        with pytest.raises(IntegrityError):
+            self.create_cast_vote(b"abcdefghil")
+
+    def test_benchmark_cast_ingestion(self):
+        out = io.StringIO()
+        call_command("benchmark_cast_ingestion", ballots=5, colliding=True, stdout=out)
+        assert "cast: 5 ballots" in out.getvalue()
+        assert "store: 5 ballots" in out.getvalue()
+        assert models.Election.objects.count() == 1
+
+
+class TallyTests(FrozenElectionMixin, TestCase):
+    def serial_tally(self):
+        self.election.compute_tally(checkpoint_interval=0)
+        return self.election.encrypted_tally.toJSONDict()
+
+    def test_voter_references_latest_verified_vote(self):
+        voter = self.election.voter_set.order_by("id")[0]
+        cast_vote = voter.last_cast_vote()
+
+        assert cast_vote.id == voter.cast_vote_id
+        assert cast_vote.voter == voter
+        assert voter.vote_tinyhash == cast_vote.vote_tinyhash
+
+        self.election.refresh_from_db()
+        assert self.election.num_cast_votes == self.NUM_VOTERS
+
+        # an older vote verified late doesn't replace the latest one
+        older_vote = models.CastVote(
+            voter=voter, vote=cast_vote.vote, vote_hash=b"older-vote-hash"
+        )
+        older_vote.save()
+        older_vote.cast_at = cast_vote.cast_at - datetime.timedelta(minutes=1)
+        voter.store_vote(older_vote)
+
+        voter = models.Voter.objects.get(id=voter.id)
+        assert voter.cast_vote_id == cast_vote.id
+
+    def test_concurrent_first_votes_counted_once(self):
+        voter = self.create_voter(self.NUM_VOTERS)
+        vote = self.election.voter_set.order_by("id")[0].vote
+
+        # two first votes verified at once, by tasks that each loaded the voter
+        loaded = [models.Voter.objects.get(id=voter.id) for _ in range(2)]
+        cast_votes = []
+        for i, voter_copy in enumerate(loaded):
+            cast_vote = models.CastVote(
+                voter=voter_copy, vote=vote, vote_hash="first%s" % i, cast_at=now()
+            )
+            cast_vote.save()
+            cast_votes.append(cast_vote)
+        for voter_copy, cast_vote in zip(loaded, cast_votes):
+            voter_copy.store_vote(cast_vote)
+
+        self.election.refresh_from_db()
+        assert self.election.num_cast_votes == self.NUM_VOTERS + 1
+        voter.refresh_from_db()
+        assert voter.cast_vote_id == cast_votes[1].id
+
+    def test_checkpointed_tally_matches_serial_tally(self):
+        expected = self.serial_tally()
+
+        self.election.compute_tally(checkpoint_interval=2)
+        assert self.election.encrypted_tally.toJSONDict() == expected
+        assert self.election.encrypted_tally.num_tallied == self.NUM_VOTERS
+
+        # checkpoints are cleaned up once the tally is done
+        assert not models.TallyCheckpoint.objects.exists()
+
+    def test_sharded_tally_matches_serial_tally(self):
+        expected = self.serial_tally()
+
+        voter_ranges = self.election.tally_voter_ranges(2)
+        assert len(voter_ranges) == 2
+
+        voter_ids = list(
+            self.election.voter_set.order_by("id").values_list("id", flat=True)
+        )
+        assert voter_ranges[0][0] == voter_ids[0]
+        assert voter_ranges[-1][1] == voter_ids[-1]
+
+        partial_tallies = [
+            datatypes.LDObject.fromDict(
+                tasks.election_compute_partial_tally(self.election.id, first, last),
+                type_hint="legacy/Tally",
+            ).wrapped_obj
+            for first, last in voter_ranges
+        ]
+        self.election.combine_partial_tallies(partial_tallies)
+
+        assert self.election.encrypted_tally.toJSONDict() == expected
+        assert self.election.encrypted_tally.num_tallied == self.NUM_VOTERS
+
+    def test_sharded_tally_task(self):
+        expected = self.serial_tally()
+
+        # the partial tallies go through a chord, run in process in tests
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        tasks.election_compute_tally(self.election.id, num_shards=2, job_id=job.id)
+
+        self.election.refresh_from_db()
+        assert self.election.encrypted_tally.toJSONDict() == expected
+        assert self.election.encrypted_tally.num_tallied == self.NUM_VOTERS
+
+        # every shard reported to the job
+        job.refresh_from_db()
+        assert job.status == models.Job.DONE
+        assert job.processed == job.total == self.NUM_VOTERS
+
+    def test_tally_resumes_from_checkpoint(self):
+        expected = self.serial_tally()
+
+        # simulate a tally interrupted after the first two ballots
+        voters = list(self.election.voter_set.order_by("id"))
+        tally = self.election.init_tally()
+        digest = ""
+        for voter in voters[:2]:
+            tally.add_vote(voter.vote, verify_p=False)
+            digest = models.TallyCheckpoint.chain_digest(
+                digest, voter.id, voter.vote_hash
+            )
+        models.TallyCheckpoint.save_for_election(
+            self.election, tally, voters[1].id, digest
+        )
+
+        checkpoint = models.TallyCheckpoint.get_valid_for_election(self.election)
+        assert checkpoint is not None
+
+        self.election.compute_tally(checkpoint_interval=2)
+        assert self.election.encrypted_tally.toJSONDict() == expected
+
+        # timed for the ballots tallied since the checkpoint only
+        timing = models.ElectionStageTiming.objects.filter(
+            election=self.election, stage=models.ElectionStageTiming.TALLY
+        ).latest("id")
+        assert timing.num_items == self.NUM_VOTERS - 2
+
+    def test_stale_checkpoint_is_discarded(self):
+        voters = list(self.election.voter_set.order_by("id"))
+        tally = self.election.init_tally()
+        tally.add_vote(voters[0].vote, verify_p=False)
+        models.TallyCheckpoint.save_for_election(
+            self.election,
+            tally,
+            voters[0].id,
+            models.TallyCheckpoint.chain_digest("", voters[0].id, voters[0].vote_hash),
+        )
+
+        # the voter changes their vote after the checkpoint was taken
+        self.cast_vote(voters[0], 1)
+
+        assert models.TallyCheckpoint.get_valid_for_election(self.election) is None
+        assert not models.TallyCheckpoint.objects.exists()
+
+        expected = self.serial_tally()
+        self.election.compute_tally()
+        assert self.election.encrypted_tally.toJSONDict() == expected
+
+
+class BallotCodecTests(TestCase):
+    fixtures = ["users.json", "election.json"]
+    allow_database_queries = True
+
+    def setUp(self):
+        self.election = models.Election.objects.get(short_name="test")
+
+    @staticmethod
+    def random_proofs(count):
+        p = views.ELGAMAL_PARAMS.p
+        q = views.ELGAMAL_PARAMS.q
+        return [
+            {
+                "commitment": {
+                    "A": str(random.randrange(2, p)),
+                    "B": str(random.randrange(2, p)),
+                },
+                "challenge": str(random.randrange(1, q)),
+                "response": str(random.randrange(1, q)),
+            }
+            for _ in range(count)
+        ]
+
+    def vote_dict(self):
+        p = views.ELGAMAL_PARAMS.p
+        return {
+            "answers": [
+                {
+                    "choices": [
+                        {
+                            "alpha": str(random.randrange(2, p)),
+                            "beta": str(random.randrange(2, p)),
+                        }
+                        for _ in range(3)
+                    ],
+                    "individual_proofs": [self.random_proofs(2) for _ in range(3)],
+                    "overall_proof": self.random_proofs(2),
+                },
+                {
+                    "choices": [{"alpha": "2", "beta": "3"}],
+                    "individual_proofs": None,
+                    "overall_proof": None,
+                },
+            ],
+            "election_hash": "w5hNnyCRyjEXvN1rIIIlmuk4hVtQN0sGhW9Q5Xcx2cY",
+            "election_uuid": self.election.uuid,
+        }
+
+    def test_roundtrip(self):
+        vote_dict = self.vote_dict()
+        data = ballotcodec.encode(vote_dict)
+
+        assert ballotcodec.is_encoded(data)
+        assert ballotcodec.decode_dict(data) == vote_dict
+        assert len(data) < len(utils.to_json(vote_dict))
+
+        vote = ballotcodec.decode(data)
+        ld_vote = datatypes.LDObject.instantiate(vote)
+        assert ld_vote.toDict() == vote_dict
+
+        legacy_vote = datatypes.LDObject.fromDict(
+            vote_dict, type_hint="legacy/EncryptedVote"
+        )
+        assert ld_vote.hash == legacy_vote.hash
+
+    def test_non_canonical_votes_are_refused(self):
+        vote_dict = self.vote_dict()
+        vote_dict["answers"][1]["choices"][0]["alpha"] = "002"
+
+        with pytest.raises(ballotcodec.BallotEncodingError):
+            ballotcodec.encode(vote_dict)
+
+        vote_dict["answers"][1]["choices"][0]["alpha"] = None
+        with pytest.raises(ballotcodec.BallotEncodingError):
+            ballotcodec.encode(vote_dict)
+
+    def test_legacy_json_votes_are_converted(self):
+        vote_dict = self.vote_dict()
+        voter = models.Voter(
+            uuid=str(uuid.uuid4()),
+            election=self.election,
+            voter_login_id="codec",
+            voter_name="Codec",
+            voter_email="codec@example.com",
+        )
+        voter.save()
+        cast_vote = models.CastVote(
+            voter=voter, vote=utils.to_json(vote_dict), vote_hash=b"codec-vote-hash"
+        )
+        cast_vote.save()
+
+        # a vote stored before the binary encoding existed
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "update helios_castvote set vote = convert_to(%s, 'UTF8') where id = %s",
+                [utils.to_json(vote_dict), cast_vote.id],
+            )
+
+        cast_vote = models.CastVote.objects.get(id=cast_vote.id)
+        assert datatypes.LDObject.instantiate(cast_vote.vote).toDict() == vote_dict
+
+        call_command("convert_votes_to_binary", stdout=io.StringIO())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "select vote from helios_castvote where id = %s", [cast_vote.id]
+            )
+            assert ballotcodec.is_encoded(bytes(cursor.fetchone()[0]))
+
+        cast_vote = models.CastVote.objects.get(id=cast_vote.id)
+        assert datatypes.LDObject.instantiate(cast_vote.vote).toDict() == vote_dict
+
+
+class CompressedFieldTests(TestCase):
+    fixtures = ["users.json", "election.json"]
+    allow_database_queries = True
+
+    VOTER_FILE = "".join(
+        "voter%s,voter%s@example.com,Voter %s\n" % (i, i, i) for i in range(50)
+    )
+
+    def setUp(self):
+        self.election = models.Election.objects.get(short_name="test")
+
+    def raw_column(self, table, column, row_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "select %s from helios_%s where id = %%s" % (column, table), [row_id]
+            )
+            return bytes(cursor.fetchone()[0])
+
+    def test_values_are_stored_compressed_and_loaded_lazily(self):
+        voter_file = models.VoterFile.objects.create(
+            election=self.election, voter_file_content=self.VOTER_FILE
+        )
+
+        raw = self.raw_column("voterfile", "voter_file_content", voter_file.id)
+        assert raw.startswith(djangofield.COMPRESSED_MAGIC)
+        assert len(raw) < len(self.VOTER_FILE)
+
+        voter_file = models.VoterFile.objects.get(id=voter_file.id)
+        assert isinstance(
+            voter_file.__dict__["voter_file_content"], djangofield.CompressedValue
+        )
+
+        # saving without reading the value writes back the compressed bytes
+        voter_file.num_voters = 50
+        voter_file.save()
+        assert self.raw_column("voterfile", "voter_file_content", voter_file.id) == raw
+
+        assert voter_file.voter_file_content == self.VOTER_FILE
+        assert len(list(voter_file.itervoters())) == 50
+
+    def test_json_values(self):
+        self.election.result_proof = [["%s" % (10 ** 100)] * 10]
+        self.election.save()
+
+        election = models.Election.objects.get(id=self.election.id)
+        assert election.result_proof == self.election.result_proof
+
+    def test_ld_object_values(self):
+        big = str(10 ** 100)
+        tally = {"num_tallied": 1, "tally": [[{"alpha": big, "beta": big}] * 10]}
+        self.election.encrypted_tally = datatypes.LDObject.fromDict(
+            tally, type_hint="legacy/Tally"
+        ).wrapped_obj
+        self.election.save()
+
+        raw = self.raw_column("election", "encrypted_tally", self.election.id)
+        assert raw.startswith(djangofield.COMPRESSED_MAGIC)
+
+        # a deferred value is loaded through the LDObject field on first access
+        election = models.Election.objects.defer("encrypted_tally").get(
+            id=self.election.id
+        )
+        assert "encrypted_tally" not in election.__dict__
+        assert election.encrypted_tally.toJSONDict() == tally
+
+        proofs = [
+            [{"challenge": big, "commitment": {"A": big, "B": big}, "response": big}]
+        ]
+        proofs_type = models.Trustee._meta.get_field("decryption_proofs").type_hint
+        self.election.generate_trustee(views.ELGAMAL_PARAMS)
+        trustee = self.election.get_helios_trustee()
+        trustee.decryption_proofs = datatypes.LDObject.fromDict(
+            proofs, type_hint=proofs_type
+        ).wrapped_obj
+        trustee.save()
+
+        raw = self.raw_column("trustee", "decryption_proofs", trustee.id)
+        assert raw.startswith(djangofield.COMPRESSED_MAGIC)
+
+        trustee = models.Trustee.objects.get(id=trustee.id)
+        assert isinstance(
+            trustee.__dict__["decryption_proofs"], djangofield.CompressedValue
+        )
+        decryption_proofs = datatypes.LDObject.instantiate(
+            trustee.decryption_proofs, datatype=proofs_type
+        )
+        assert decryption_proofs.toDict() == proofs
+
+    def test_plain_legacy_values_are_read(self):
+        audited_ballot = models.AuditedBallot.objects.create(
+            election=self.election, raw_vote="", vote_hash="hash"
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "update helios_auditedballot set raw_vote = convert_to(%s, 'UTF8') where id = %s",
+                ['{"answers": []}', audited_ballot.id],
+            )
+
+        audited_ballot = models.AuditedBallot.objects.get(id=audited_ballot.id)
+        assert audited_ballot.raw_vote == '{"answers": []}'
 
 
 class DatatypeTests(TestCase):
@@ -427,6 +1092,61 @@ class ElectionBlackboxTests(WebTest):
         del session["user"]
         session.save()
 
+    def test_election_json_conditional_get(self):
+        url = "/helios/elections/%s/" % self.election.uuid
+        response = self.client.get(url)
+        self.assertStatusCode(response, 200)
+        assert "Last-Modified" in response
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertStatusCode(response, 304)
+
+        # a frozen public election may be cached by proxies
+        self.election.frozen_at = datetime.datetime.utcnow()
+        self.election.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertStatusCode(response, 200)
+        assert response["ETag"] != etag
+        assert "public" in response["Cache-Control"]
+
+        # so do the trustees, until one of them changes
+        url = "/helios/elections/%s/trustees/" % self.election.uuid
+        etag = self.client.get(url)["ETag"]
+        self.election.generate_trustee(views.ELGAMAL_PARAMS)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertStatusCode(response, 200)
+        assert len(utils.from_json(response.content)) == 1
+
+        response = self.client.get("/helios/elections/params")
+        response = self.client.get(
+            "/helios/elections/params", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertStatusCode(response, 304)
+
+    def test_voter_qr_code(self):
+        voter = models.Voter.register_user_in_election(self.user, self.election)
+        url = "/helios/elections/%s/voters/%s/qrcode.png" % (
+            self.election.uuid,
+            voter.uuid,
+        )
+
+        response = self.client.get(url)
+        self.assertStatusCode(response, 403)
+
+        # generated on the fly
+        self.setup_login(from_scratch=True)
+        response = self.client.get(url)
+        self.assertStatusCode(response, 200)
+        assert response["Content-Type"] == "image/png"
+        assert response.content == utils.create_qr_code_png(voter.qr_code_content)
+        assert "private" in response["Cache-Control"]
+        assert response["ETag"] == '"%s"' % models.QrCode.objects.get(voter=voter).etag
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertStatusCode(response, 304)
+        assert not response.content
+
     def test_election_params(self):
         response = self.client.get("/helios/elections/params")
         self.assertEquals(
@@ -627,6 +1347,16 @@ class ElectionBlackboxTests(WebTest):
         NUM_VOTERS = 4
         self.assertEquals(len(utils.from_json(response.content)), NUM_VOTERS)
 
+        # the processing was reported as it went
+        response = self.client.get("/helios/elections/%s/jobs" % election_id)
+        job = utils.from_json(response.content)["jobs"][0]
+        assert job["kind"] == models.Job.VOTER_FILE_PROCESS
+        assert (job["status"], job["processed"], job["total"]) == (
+            models.Job.DONE,
+            NUM_VOTERS,
+            NUM_VOTERS,
+        )
+
         # let's get a single voter
         single_voter = models.Election.objects.get(
             uuid=election_id).voter_set.all()[0]
@@ -776,6 +1506,11 @@ class ElectionBlackboxTests(WebTest):
                 settings.URL_HOST, election_id),
         )
 
+        # verified as soon as cast, the tasks running eagerly
+        summary = pipeline.summarize(pipeline.get_series(2))
+        assert summary["cast"] == summary["verified"] > 0
+        assert models.Election.objects.get(uuid=election_id).queued_votes_count == 0
+
         # at this point an email should have gone out to the user
         # at position num_messages after, since that was the len() before we cast this ballot
         email_message = mail.outbox[len(mail.outbox) - 1]
@@ -856,6 +1591,13 @@ class ElectionBlackboxTests(WebTest):
         response = self.client.get("/helios/elections/%s/result" % election_id)
         self.assertEquals(utils.from_json(response.content), [[0, 1]])
 
+        # every stage was timed
+        election = models.Election.objects.get(uuid=election_id)
+        timings = models.ElectionStageTiming.get_by_election(election)
+        assert {t.stage for t in timings} == set(models.ElectionStageTiming.STAGES)
+        response = self.client.get("/helios/elections/%s/performance" % election_id)
+        self.assertContains(response, "combine decryptions")
+
     # def test_do_complete_election(self):
     #     election_id, username, password = self._setup_complete_election()
     #
@@ -938,6 +1680,1007 @@ class ElectionBlackboxTests(WebTest):
     #     pass
 
 
+class BoothBundleTests(FrozenElectionMixin, TestCase):
+    def test_booth_bundle(self):
+        # prepared when frozen
+        election = models.Election.objects.get(id=self.election.id)
+        with self.assertNumQueries(0):
+            election.booth_bundle()
+
+        url = "/helios/elections/%s/booth-bundle" % self.election.uuid
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        assert response["Content-Encoding"] == "gzip"
+        bundle = utils.from_json(gzip.decompress(response.content).decode())
+
+        # the same raw JSON as the election itself, so that the hashes match
+        election_json = self.client.get("/helios/elections/%s/" % self.election.uuid)
+        assert bundle["election"] == election_json.content.decode()
+        assert bundle["meta"] == self.election.metadata
+        assert len(bundle["trustees"]) == 1
+
+        response = self.client.get(url)
+        assert "Content-Encoding" not in response
+        assert utils.from_json(response.content.decode()) == bundle
+
+
+class BallotExportTests(FrozenElectionMixin, TestCase):
+    def test_ballot_export(self):
+        url = "/helios/elections/%s/ballots/export" % self.election.uuid
+        response = self.client.get(url)
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        ballots = [utils.from_json(line) for line in lines]
+
+        voters = self.election.voter_set.order_by("id")
+        assert [b["voter_uuid"] for b in ballots] == [v.uuid for v in voters]
+        for ballot, voter in zip(ballots, voters):
+            # serialized as in the ballot list
+            short_cast_vote = voter.last_cast_vote().ld_object.short.toDict(
+                alternate_fields=["cast_at", "vote_hash", "voter_uuid"]
+            )
+            assert dict(ballot, vote=None, voter_hash=None) == dict(
+                short_cast_vote, vote=None, voter_hash=None
+            )
+            assert ballot["voter_hash"] == voter.hash.decode()
+            assert ballot["vote"] == voter.vote.ld_object.toDict()
+
+        # the same through the command, in small batches and gzipped
+        export_path = os.path.join(settings.MEDIA_ROOT, "export.ndjson.gz")
+        call_command(
+            "export_ballots",
+            self.election.uuid,
+            output=export_path,
+            gzip=True,
+            batch_size=2,
+        )
+        with gzip.open(export_path, "rt") as export_file:
+            assert export_file.read().splitlines() == lines
+
+        # prepared once tallied
+        tasks.election_compute_tally(self.election.id)
+        export = models.BallotExport.get_by_election(self.election)
+        assert export.num_ballots == self.NUM_VOTERS
+        assert export.sha256 in export.export_file.name
+
+        response = self.client.get(url, {"gzip": "1"})
+        assert response["ETag"] == '"%s"' % export.sha256
+        content = b"".join(response.streaming_content)
+        assert hashlib.sha256(content).hexdigest() == export.sha256
+        assert gzip.decompress(content).decode().splitlines() == lines
+
+
+class BallotListTests(FrozenElectionMixin, TestCase):
+    def get_ballots(self):
+        response = self.client.get("/helios/elections/%s/ballots/" % self.election.uuid)
+        assert response.status_code == 200
+        return utils.from_json(response.content)
+
+    def test_ballot_list(self):
+        ballots = self.get_ballots()
+
+        voters = self.election.voter_set.order_by("cast_at")
+        assert [b["voter_uuid"] for b in ballots] == [v.uuid for v in voters]
+        for ballot, voter in zip(ballots, voters):
+            short_cast_vote = voter.last_cast_vote().ld_object.short.toDict(
+                complete=True
+            )
+            assert ballot == short_cast_vote
+            assert ballot["voter_hash"] == voter.ld_object.hash.decode()
+
+    def test_ballot_list_queries(self):
+        # with the election cached
+        self.get_ballots()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_ballots()
+        num_queries = len(queries)
+        # the ballots themselves are never read
+        assert not [q for q in queries if "helios_castvote" in q["sql"]]
+
+        for i in range(self.NUM_VOTERS, 2 * self.NUM_VOTERS):
+            self.cast_vote(self.create_voter(i), i % 2)
+
+        with self.assertNumQueries(num_queries):
+            assert len(self.get_ballots()) == 2 * self.NUM_VOTERS
+
+
+class VoterListTests(FrozenElectionMixin, TestCase):
+    def get_json(self, path):
+        response = self.client.get(
+            "/helios/elections/%s/voters/%s" % (self.election.uuid, path)
+        )
+        assert response.status_code == 200
+        return utils.from_json(response.content)
+
+    def test_voter_list(self):
+        voters = self.election.voter_set.order_by("uuid")
+        assert self.get_json("") == [v.ld_object.toDict() for v in voters]
+
+        voter = voters[0]
+        assert self.get_json(voter.uuid) == voter.toJSONDict()
+
+    def test_voter_list_queries(self):
+        # with the election cached
+        self.get_json("")
+        with CaptureQueriesContext(connection) as queries:
+            self.get_json("")
+
+        for i in range(self.NUM_VOTERS, 2 * self.NUM_VOTERS):
+            self.create_voter(i)
+
+        with self.assertNumQueries(len(queries)):
+            assert len(self.get_json("")) == 2 * self.NUM_VOTERS
+
+
+ANONYMOUS, ADMIN, VOTER, TRUSTEE = "anonymous", "admin", "voter", "trustee"
+FROZEN, TALLIED = "frozen", "tallied"
+
+
+class QueryBudgetTests(FrozenElectionMixin, TestCase):
+    """
+    every view of an election, and the stats views, answers within a budget
+    of queries that stays the same as the election grows
+    """
+
+    # url name: the state of the election, who asks, and the most queries
+    # a request makes once the election is cached
+    BUDGETS = {
+        election_url_names.ELECTION_HOME: (FROZEN, ANONYMOUS, 0),
+        election_url_names.ELECTION_META: (FROZEN, ANONYMOUS, 0),
+        election_url_names.ELECTION_EXTEND: (FROZEN, ADMIN, 1),
+        election_url_names.ELECTION_BADGE: (FROZEN, ANONYMOUS, 2),
+        election_url_names.ELECTION_TRUSTEES_HOME: (FROZEN, ADMIN, 2),
+        election_url_names.ELECTION_TRUSTEES_VIEW: (FROZEN, ANONYMOUS, 2),
+        election_url_names.ELECTION_TRUSTEE_HOME: (FROZEN, TRUSTEE, 3),
+        election_url_names.ELECTION_TRUSTEE_KEY_GENERATOR: (FROZEN, TRUSTEE, 3),
+        election_url_names.ELECTION_TRUSTEE_CHECK_SK: (FROZEN, TRUSTEE, 3),
+        election_url_names.ELECTION_TRUSTEE_DECRYPT_AND_PROVE: (TALLIED, TRUSTEE, 3),
+        election_url_names.ELECTION_VIEW: (FROZEN, VOTER, 6),
+        election_url_names.ELECTION_RESULT: (TALLIED, ANONYMOUS, 0),
+        election_url_names.ELECTION_RESULT_PROOF: (TALLIED, ANONYMOUS, 0),
+        election_url_names.ELECTION_AUDITED_BALLOTS: (FROZEN, ANONYMOUS, 2),
+        election_url_names.ELECTION_GET_RANDOMNESS: (FROZEN, VOTER, 0),
+        election_url_names.ELECTION_BOOTH_BUNDLE: (FROZEN, ANONYMOUS, 0),
+        election_url_names.ELECTION_QUESTIONS: (FROZEN, ADMIN, 1),
+        election_url_names.ELECTION_COMPUTE_TALLY: (FROZEN, ADMIN, 3),
+        election_url_names.ELECTION_JOBS: (FROZEN, ADMIN, 2),
+        election_url_names.ELECTION_PERFORMANCE: (TALLIED, ADMIN, 2),
+        election_url_names.ELECTION_COMBINE_DECRYPTIONS: (TALLIED, ADMIN, 1),
+        election_url_names.ELECTION_RELEASE_RESULT: (TALLIED, ADMIN, 1),
+        election_url_names.ELECTION_CAST_CONFIRM: (FROZEN, VOTER, 4),
+        election_url_names.ELECTION_CAST_DONE: (FROZEN, VOTER, 1),
+        election_url_names.ELECTION_VOTERS_LIST: (FROZEN, ANONYMOUS, 1),
+        election_url_names.ELECTION_VOTERS_UPLOAD: (FROZEN, ADMIN, 1),
+        election_url_names.ELECTION_VOTERS_LIST_PRETTY: (FROZEN, ADMIN, 4),
+        election_url_names.ELECTION_VOTERS_EMAIL: (FROZEN, ADMIN, 2),
+        election_url_names.ELECTION_VOTER: (FROZEN, ANONYMOUS, 1),
+        election_url_names.ELECTION_VOTER_QR_CODE: (FROZEN, ADMIN, 5),
+        election_url_names.ELECTION_BALLOTS_LIST: (FROZEN, ANONYMOUS, 1),
+        election_url_names.ELECTION_BALLOTS_EXPORT: (TALLIED, ANONYMOUS, 0),
+        election_url_names.ELECTION_BALLOTS_VOTER: (FROZEN, ANONYMOUS, 2),
+        election_url_names.ELECTION_BALLOTS_VOTER_LAST: (FROZEN, ANONYMOUS, 2),
+        stats_url_names.STATS_HOME: (FROZEN, ADMIN, 2),
+        stats_url_names.STATS_ELECTIONS: (FROZEN, ADMIN, 3),
+        stats_url_names.STATS_ELECTIONS_PROBLEMS: (FROZEN, ADMIN, 2),
+        stats_url_names.STATS_RECENT_VOTES: (FROZEN, ADMIN, 2),
+        stats_url_names.STATS_VERIFICATION: (FROZEN, ADMIN, 3),
+        stats_url_names.STATS_PERFORMANCE: (TALLIED, ADMIN, 3),
+        stats_url_names.STATS_PROFILES: (FROZEN, ADMIN, 2),
+        stats_url_names.STATS_CRYPTO: (FROZEN, ADMIN, 2),
+        stats_url_names.STATS_CRYPTO_METRICS: (FROZEN, ADMIN, 2),
+    }
+
+    # the URLs that change the election or send messages, even on a GET,
+    # or that only answer a POST
+    UNBUDGETED = {
+        election_url_names.ELECTION_EDIT,
+        election_url_names.ELECTION_SCHEDULE,
+        election_url_names.ELECTION_ARCHIVE,
+        election_url_names.ELECTION_COPY,
+        election_url_names.ELECTION_TRUSTEES_NEW,
+        election_url_names.ELECTION_TRUSTEES_ADD_HELIOS,
+        election_url_names.ELECTION_TRUSTEES_DELETE,
+        election_url_names.ELECTION_TRUSTEE_SEND_URL,
+        election_url_names.ELECTION_TRUSTEE_UPLOAD_PK,
+        election_url_names.ELECTION_TRUSTEE_UPLOAD_DECRYPTION,
+        election_url_names.ELECTION_ENCRYPT_BALLOT,
+        election_url_names.ELECTION_SET_REG,
+        election_url_names.ELECTION_SET_FEATURED,
+        election_url_names.ELECTION_SAVE_QUESTIONS,
+        election_url_names.ELECTION_REGISTER,
+        election_url_names.ELECTION_FREEZE,
+        election_url_names.ELECTION_CAST,
+        election_url_names.ELECTION_PASSWORD_VOTER_LOGIN,
+        election_url_names.ELECTION_POST_AUDITED_BALLOT,
+        election_url_names.ELECTION_VOTERS_UPLOAD_CANCEL,
+        election_url_names.ELECTION_VOTERS_ELIGIBILITY,
+        election_url_names.ELECTION_VOTER_DELETE,
+        stats_url_names.STATS_FORCE_QUEUE,
+        stats_url_names.STATS_PROFILES_RESET,
+        stats_url_names.STATS_CRYPTO_SWITCH,
+    }
+
+    def setUp(self):
+        super(QueryBudgetTests, self).setUp()
+        self.admin = self.election.admin
+        self.admin.admin_p = True
+        self.admin.save()
+
+        self.voter = self.election.voter_set.order_by("id")[0]
+        self.trustee = self.election.get_helios_trustee()
+
+    def url(self, name):
+        if name.startswith("stats@"):
+            return reverse(name)
+
+        kwargs = {"election_uuid": self.election.uuid}
+        pattern = [p for p in election_urls.urlpatterns if p.name == name][0]
+        if "trustee_uuid" in pattern.regex.groupindex:
+            kwargs["trustee_uuid"] = self.trustee.uuid
+        if "voter_uuid" in pattern.regex.groupindex:
+            kwargs["voter_uuid"] = self.voter.uuid
+        return reverse(name, kwargs=kwargs)
+
+    def login(self, who):
+        self.client.logout()
+        session = self.client.session
+        if who == ADMIN:
+            session["user"] = {
+                "type": self.admin.user_type,
+                "user_id": self.admin.user_id,
+            }
+        elif who == VOTER:
+            session["CURRENT_VOTER_ID"] = self.voter.id
+            session["encrypted_vote"] = utils.to_json(
+                self.voter.last_cast_vote().vote.ld_object.toDict()
+            )
+        elif who == TRUSTEE:
+            session[HELIOS_TRUSTEE_UUID] = self.trustee.uuid
+        session.save()
+
+    def count_queries(self, state):
+        """
+        the queries of a second request to every view budgeted in that state
+        """
+        num_queries = {}
+        for name, (view_state, who, _) in sorted(self.BUDGETS.items()):
+            if view_state != state:
+                continue
+
+            self.login(who)
+            url = self.url(name)
+            response = self.client.get(url)
+            assert response.status_code in (200, 302), (name, response.status_code)
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            num_queries[name] = len(queries)
+
+        return num_queries
+
+    def grow(self):
+        """
+        three times as many voters, with a vote each, and more votes by the
+        voter whose pages are looked at, audited ballots and another election
+        """
+        for i in range(self.NUM_VOTERS, 3 * self.NUM_VOTERS):
+            self.cast_vote(self.create_voter(i), i % 2)
+        for i in range(self.NUM_VOTERS):
+            self.cast_vote(self.voter, i % 2)
+            models.AuditedBallot.objects.create(
+                election=self.election, raw_vote="{}", vote_hash="audited%s" % i
+            )
+
+        other_election, _ = models.Election.get_or_create(
+            short_name="other",
+            uuid=str(uuid.uuid4()),
+            name="Other Election",
+            description="",
+            admin=self.admin,
+        )
+        other_voter = models.Voter.objects.create(
+            uuid=str(uuid.uuid4()),
+            election=other_election,
+            voter_login_id="other",
+            voter_name="Other",
+        )
+        models.CastVote.objects.create(
+            voter=other_voter,
+            vote=self.voter.vote,
+            vote_hash="other",
+            cast_at=now(),
+        )
+
+    def tally(self):
+        self.election.compute_tally()
+        self.election.helios_trustee_decrypt()
+        self.election.combine_decryptions()
+        self.election.release_result()
+        self.election.save()
+
+    def assertWithinBudget(self, small, large):
+        for name, num_queries in large.items():
+            assert num_queries == small[name], (name, small[name], num_queries)
+            assert num_queries <= self.BUDGETS[name][2], (name, num_queries)
+
+    def test_every_url_is_budgeted(self):
+        names = {
+            pattern.name
+            for pattern in election_urls.urlpatterns + stats_urls.urlpatterns
+        }
+        assert set(self.BUDGETS) | self.UNBUDGETED == names
+        assert not set(self.BUDGETS) & self.UNBUDGETED
+
+    def test_frozen_election_query_budgets(self):
+        small = self.count_queries(FROZEN)
+        self.grow()
+        self.assertWithinBudget(small, self.count_queries(FROZEN))
+
+    def test_tallied_election_query_budgets(self):
+        self.tally()
+        small = self.count_queries(TALLIED)
+        self.grow()
+        self.tally()
+        self.assertWithinBudget(small, self.count_queries(TALLIED))
+
+
+class ProfilingTests(FrozenElectionMixin, TestCase):
+    def test_timed(self):
+        # a clock that only moves when the timed functions say so
+        clock = [0.0]
+
+        @profiling.timed("crypto")
+        def outer():
+            clock[0] += 1
+            inner()
+
+        @profiling.timed("crypto")
+        def inner():
+            clock[0] += 2
+
+        with mock.patch.object(profiling.time, "perf_counter", lambda: clock[0]):
+            # outside of a sampled request
+            outer()
+
+            profile = profiling._local.profile = profiling.Profile()
+            try:
+                outer()
+            finally:
+                profiling._local.profile = None
+
+        # counted once, by the outer call
+        assert profile.seconds["crypto"] == 3
+        assert profile.seconds["templates"] == 0
+
+    def test_middleware_off_by_default(self):
+        with pytest.raises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+
+    @override_settings(HELIOS_PROFILING_SAMPLE_RATE=1.0)
+    def test_sampled_requests(self):
+        for _ in range(2):
+            response = self.client.get(
+                "/helios/elections/%s/view" % self.election.uuid
+            )
+            assert response.status_code == 200
+        self.client.get("/helios/elections/%s/voters/" % self.election.uuid)
+
+        profiles = {p["view"]: p for p in profiling.get_profiles()}
+        assert set(profiles) == {"election@view", "election@voters@list"}
+
+        profile = profiles["election@view"]
+        assert profile["requests"] == 2
+        assert sum(profile["histogram"]) == 2
+        assert profile["wall_p95_ms"] >= profile["wall_p50_ms"]
+        assert profile["db_queries"] > 0
+        assert profile["templates_ms"] > 0
+        assert profiles["election@voters@list"]["serialization_ms"] > 0
+
+        # shown to the site admins, and reset by them
+        admin = self.election.admin
+        admin.admin_p = True
+        admin.save()
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session["csrf_token"] = "token"
+        session.save()
+
+        response = self.client.get("/helios/stats/profiles")
+        assert b"election@voters@list" in response.content
+
+        response = self.client.post(
+            "/helios/stats/profiles/reset", {"csrf_token": "token"}
+        )
+        assert response.status_code == 302
+        # all but the reset itself, sampled once it was done
+        assert [p["view"] for p in profiling.get_profiles()] == ["stats@profiles-reset"]
+
+
+class JobTests(FrozenElectionMixin, TestCase):
+    def setUp(self):
+        super(JobTests, self).setUp()
+        admin = self.election.admin
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session["csrf_token"] = "token"
+        session.save()
+
+    def jobs(self, kind):
+        return models.Job.objects.filter(election=self.election, kind=kind)
+
+    def test_compute_tally(self):
+        url = "/helios/elections/%s/compute_tally" % self.election.uuid
+        response = self.client.post(url, {"csrf_token": "token"})
+        assert response.status_code == 302
+
+        job = self.jobs(models.Job.COMPUTE_TALLY).get()
+        assert job.status == models.Job.DONE
+        assert job.processed == job.total == self.NUM_VOTERS
+        assert job.started_at <= job.finished_at
+
+        # one decryption factor per choice
+        job = self.jobs(models.Job.HELIOS_TRUSTEE_DECRYPT).get()
+        assert (job.status, job.processed, job.total) == (models.Job.DONE, 2, 2)
+
+        result = job.toJSONDict()
+        assert result["rate"] > 0
+        assert result["eta"] is None
+
+    def test_tally_not_started_twice(self):
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        job.start(total=self.NUM_VOTERS)
+        job.advance(2)
+        job.flush()
+
+        url = "/helios/elections/%s/compute_tally" % self.election.uuid
+        response = self.client.get(url)
+        assert b"being computed" in response.content
+        assert ("running: 2 of %s" % self.NUM_VOTERS).encode() in response.content
+
+        response = self.client.post(url, {"csrf_token": "token"})
+        assert response.status_code == 302
+        assert self.jobs(models.Job.COMPUTE_TALLY).count() == 1
+        self.election.refresh_from_db()
+        assert not self.election.encrypted_tally
+
+        # unless the job was lost
+        stale_at = now() - datetime.timedelta(
+            seconds=settings.HELIOS_JOB_STALE_SECONDS + 1
+        )
+        models.Job.objects.filter(id=job.id).update(updated_at=stale_at)
+        assert not models.Job.get_active(self.election, models.Job.COMPUTE_TALLY)
+
+        self.client.post(url, {"csrf_token": "token"})
+        assert self.jobs(models.Job.COMPUTE_TALLY).count() == 2
+
+    def test_queued_job_is_not_stale(self):
+        # waiting in a backed up queue, the job is not taken for lost
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        stale_at = now() - datetime.timedelta(
+            seconds=settings.HELIOS_JOB_STALE_SECONDS + 1
+        )
+        models.Job.objects.filter(id=job.id).update(updated_at=stale_at)
+        assert models.Job.get_active(self.election, models.Job.COMPUTE_TALLY) == job
+
+    def test_sharded_tally_done_once_combined(self):
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        job.start(total=self.NUM_VOTERS)
+        job.advance(self.NUM_VOTERS)
+        job.flush()
+
+        # every ballot is tallied, but the partial tallies are not combined yet
+        job.refresh_from_db()
+        assert job.status == models.Job.RUNNING
+
+        job.finish()
+        job.refresh_from_db()
+        assert job.status == models.Job.DONE
+
+    def test_unreadable_voter_file(self):
+        voter_file = models.VoterFile.objects.create(
+            election=self.election, voter_file_content="voter\0,v@example.com"
+        )
+        job = models.Job.create(self.election, models.Job.VOTER_FILE_PROCESS)
+        with pytest.raises(Exception):
+            tasks.voter_file_process(voter_file.id, job_id=job.id)
+
+        job.refresh_from_db()
+        assert job.status == models.Job.FAILED
+        assert "NUL" in job.error
+
+    def test_failed_job(self):
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        with pytest.raises(ZeroDivisionError):
+            with job.running(total=3):
+                job.advance()
+                1 / 0
+
+        job.refresh_from_db()
+        assert (job.status, job.processed) == (models.Job.FAILED, 1)
+        assert job.error == "division by zero"
+
+    def test_jobs_json(self):
+        job = models.Job.create(self.election, models.Job.VOTERS_EMAIL)
+        job.start(total=4)
+        job.advance()
+        job.flush()
+        models.Job.objects.filter(id=job.id).update(
+            started_at=now() - datetime.timedelta(seconds=10)
+        )
+
+        url = "/helios/elections/%s/jobs" % self.election.uuid
+        result = self.client.get(url, {"uuid": job.uuid}).json()
+        assert [j["uuid"] for j in result["jobs"]] == [job.uuid]
+        assert result["jobs"][0]["status"] == models.Job.RUNNING
+        assert 0.09 < result["jobs"][0]["rate"] < 0.11
+        assert 29 < result["jobs"][0]["eta"] < 31
+
+        self.client.logout()
+        assert self.client.get(url).status_code == 403
+
+    def test_voters_email(self):
+        tasks.voters_email(
+            self.election.id, "email/simple_subject.txt", "email/simple_body.txt"
+        )
+
+        job = self.jobs(models.Job.VOTERS_EMAIL).get()
+        assert job.status == models.Job.DONE
+        assert job.processed == job.total == self.NUM_VOTERS
+        assert len(mail.outbox) == self.NUM_VOTERS
+
+
+class ElectionStageTimingTests(FrozenElectionMixin, TestCase):
+    def timings(self, stage):
+        return models.ElectionStageTiming.objects.filter(
+            election=self.election, stage=stage
+        )
+
+    def test_verification(self):
+        # two votes verified a minute before the others
+        an_hour_ago = now() - datetime.timedelta(hours=1)
+        cast_votes = models.CastVote.objects.filter(voter__election=self.election)
+        first_ids = cast_votes.order_by("id").values_list("id", flat=True)[:2]
+        models.CastVote.objects.filter(id__in=list(first_ids)).update(
+            verified_at=an_hour_ago
+        )
+        models.CastVote.objects.filter(id=first_ids[0]).update(
+            verified_at=an_hour_ago - datetime.timedelta(minutes=1)
+        )
+
+        self.election.record_verification_timing()
+        timing = self.election.record_verification_timing()
+
+        assert self.timings(models.ElectionStageTiming.VERIFICATION).count() == 1
+        assert timing.num_items == self.NUM_VOTERS
+        assert timing.peak_per_minute == self.NUM_VOTERS - 2
+        assert timing.num_cast_votes == self.NUM_VOTERS
+        assert timing.seconds > 3600
+        assert timing.per_second < 1
+
+    def test_tally_stages(self):
+        job = models.Job.create(self.election, models.Job.COMPUTE_TALLY)
+        tasks.election_compute_tally(self.election.id, num_shards=2, job_id=job.id)
+        self.election.refresh_from_db()
+        self.election.combine_decryptions()
+
+        timings = models.ElectionStageTiming.get_by_election(self.election)
+        assert [t.stage for t in timings] == [
+            models.ElectionStageTiming.VERIFICATION,
+            models.ElectionStageTiming.TALLY,
+            models.ElectionStageTiming.TRUSTEE_DECRYPTION,
+            models.ElectionStageTiming.COMBINE_DECRYPTIONS,
+        ]
+
+        tally, decryption, combination = timings[1:]
+        job.refresh_from_db()
+        assert tally.num_items == self.NUM_VOTERS
+        assert tally.started_at == job.started_at
+        assert decryption.label == self.election.get_helios_trustee().name
+        assert decryption.num_items == combination.num_items == 2
+        assert tally.toJSONDict()["per_second"] > 0
+
+    def test_voter_import(self):
+        voter_file = self.election.add_voters_file(
+            File(io.BytesIO(b"new1,new1@example.com,New 1\n"), "voters.csv")
+        )
+        voter_file.process()
+
+        timing = self.timings(models.ElectionStageTiming.VOTER_IMPORT).get()
+        assert timing.label == "voter file %s" % voter_file.id
+        assert timing.num_items == 1
+        assert timing.num_voters == self.NUM_VOTERS + 1
+
+    def test_stats_page(self):
+        admin = self.election.admin
+        admin.admin_p = True
+        admin.save()
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session.save()
+
+        tasks.election_compute_tally(self.election.id)
+
+        response = self.client.get("/helios/stats/performance")
+        self.assertContains(response, self.election.name)
+
+        response = self.client.get("/helios/stats/performance?stage=voter+import")
+        self.assertContains(response, "No election was timed at this stage yet.")
+
+
+class PipelineTests(FrozenElectionMixin, TestCase):
+    def queue_vote(self, voter):
+        # cast for another version of the election, so it is invalidated
+        vote = voter.vote
+        vote.election_hash = "changed"
+        cast_vote = models.CastVote(
+            voter=voter,
+            vote=vote,
+            vote_hash="queued%s" % voter.id,
+            cast_at=datetime.datetime.utcnow(),
+        )
+        cast_vote.save()
+        self.election.increment_queued_votes()
+        pipeline.record_cast()
+        return cast_vote
+
+    def test_queued_votes(self):
+        voters = self.election.voter_set.order_by("id")
+        cast_votes = [self.queue_vote(voter) for voter in voters[:2]]
+        self.election.refresh_from_db()
+        assert self.election.queued_votes_count == 2
+
+        assert not cast_votes[0].verify_and_store()
+        assert not cast_votes[0].verify_and_store()
+        self.election.refresh_from_db()
+        assert self.election.queued_votes_count == 1
+
+        summary = pipeline.summarize(pipeline.get_series(2))
+        assert (summary["cast"], summary["invalidated"]) == (2, 1)
+        assert summary["invalidation_rate"] == 1
+
+        # still queued, until the voter is deleted
+        voters[1].delete()
+        self.election.refresh_from_db()
+        assert self.election.queued_votes_count == 0
+
+    def test_concurrent_verifications(self):
+        voter = self.election.voter_set.order_by("id")[0]
+        cast_vote = self.queue_vote(voter)
+
+        # two tasks verify the same vote, as when the queue is forced
+        first = models.CastVote.objects.get(id=cast_vote.id)
+        second = models.CastVote.objects.get(id=cast_vote.id)
+        assert not first.verify_and_store()
+        assert not second.verify_and_store()
+
+        self.election.refresh_from_db()
+        assert self.election.queued_votes_count == 0
+        summary = pipeline.summarize(pipeline.get_series(2))
+        assert summary["invalidated"] == 1
+
+    def test_force_queue_ignores_drifted_counter(self):
+        admin = self.election.admin
+        admin.admin_p = True
+        admin.save()
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session.save()
+
+        cast_vote = self.queue_vote(self.election.voter_set.order_by("id")[0])
+        models.Election.objects.filter(id=self.election.id).update(
+            queued_votes_count=0
+        )
+
+        self.client.get("/helios/stats/force-queue")
+        cast_vote.refresh_from_db()
+        assert cast_vote.invalidated_at
+
+    def test_record_verification(self):
+        verified_at = datetime.datetime.utcnow()
+        pipeline.record_verification(
+            verified_at - datetime.timedelta(seconds=90), verified_at, True
+        )
+        pipeline.record_verification(
+            now() - datetime.timedelta(seconds=0.5), verified_at, True, worker="w2"
+        )
+
+        summary = pipeline.summarize(pipeline.get_series(2))
+        assert (summary["verified"], summary["late"]) == (2, 1)
+        assert summary["latency_p50_seconds"] == 1
+        assert summary["latency_p95_seconds"] == 120
+        assert 45 <= summary["latency_mean_seconds"] < 46
+        assert summary["verified_per_minute"] == 1
+        assert [w["worker"] for w in summary["workers"]] == [pipeline.WORKER, "w2"]
+        assert summary["histogram"][pipeline.bucket_index(90)] == 1
+
+        # half the votes took longer than the alert threshold
+        assert pipeline.falling_behind(summary, 0)
+
+    def test_falling_behind(self):
+        recent = pipeline.summarize(pipeline.get_series(pipeline.ALERT_WINDOW_MINUTES))
+        assert not pipeline.falling_behind(recent, 0)
+        assert pipeline.falling_behind(recent, 1)
+
+        pipeline.record_verification(now(), now(), True)
+        recent = pipeline.summarize(pipeline.get_series(pipeline.ALERT_WINDOW_MINUTES))
+        assert not pipeline.falling_behind(recent, 1)
+
+    def test_stats_pages(self):
+        admin = self.election.admin
+        admin.admin_p = True
+        admin.save()
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session.save()
+
+        self.queue_vote(self.election.voter_set.order_by("id")[0])
+
+        response = self.client.get("/helios/stats/")
+        assert b"<b>1</b> votes in queue" in response.content
+        assert b"falling behind" in response.content
+
+        response = self.client.get("/helios/stats/verification")
+        assert b"No vote was verified" in response.content
+        assert self.election.name.encode() in response.content
+
+        self.client.get("/helios/stats/force-queue")
+        response = self.client.get("/helios/stats/verification")
+        assert b"keeping up" in response.content
+        assert b"No vote in queue." in response.content
+
+
+class CastValidationTests(FrozenElectionMixin, TestCase):
+    def setUp(self):
+        super(CastValidationTests, self).setUp()
+        self.voter = self.create_voter(self.NUM_VOTERS)
+        # the election as the booth gets it
+        election = models.Election.objects.get(id=self.election.id)
+        vote = homomorphic.EncryptedVote.fromElectionAndAnswers(election, [[1]])
+        vote.election_hash = election.hash.decode()
+        self.vote_dict = datatypes.LDObject.instantiate(
+            vote, datatype="legacy/EncryptedVote"
+        ).toDict()
+
+    def set_vote(self, vote_dict):
+        session = self.client.session
+        session["CURRENT_VOTER_ID"] = self.voter.id
+        session["csrf_token"] = "token"
+        if isinstance(vote_dict, dict):
+            vote_dict = utils.to_json(vote_dict)
+        session["encrypted_vote"] = vote_dict
+        session.save()
+
+    def cast(self, vote_dict):
+        self.set_vote(vote_dict)
+
+        def num_rejected():
+            return pipeline.summarize(pipeline.get_series(2))["rejected"]
+
+        rejected_before = num_rejected()
+        response = self.client.post(
+            "/helios/elections/%s/cast_confirm" % self.election.uuid,
+            {"csrf_token": "token"},
+        )
+        return response, num_rejected() - rejected_before
+
+    def assertRejected(self, vote_dict, issue):
+        response, num_rejected = self.cast(vote_dict)
+        self.assertContains(response, issue)
+        assert num_rejected == 1
+        assert "encrypted_vote" not in self.client.session
+        assert not models.CastVote.objects.filter(voter=self.voter).exists()
+        self.election.refresh_from_db()
+        assert self.election.queued_votes_count == 0
+
+    def test_valid_vote_is_cast(self):
+        response, num_rejected = self.cast(self.vote_dict)
+        assert response.status_code == 302
+        assert num_rejected == 0
+        assert self.voter.castvote_set.get().verified_at
+
+    def test_wrong_election(self):
+        self.vote_dict["election_hash"] = "changed"
+        self.assertRejected(self.vote_dict, "fingerprint does not match")
+
+        self.vote_dict["election_uuid"] = str(uuid.uuid4())
+        self.assertRejected(self.vote_dict, "election UUID does not match")
+
+    def test_wrong_counts(self):
+        answer = self.vote_dict["answers"][0]
+        self.vote_dict["answers"].append(answer)
+        self.assertRejected(self.vote_dict, "answers 2 questions instead of 1")
+
+        del self.vote_dict["answers"][1]
+        answer["choices"].pop()
+        self.assertRejected(self.vote_dict, "question 1: 1 choices instead of 2")
+
+    def test_wrong_proofs(self):
+        answer = self.vote_dict["answers"][0]
+        answer["overall_proof"].pop()
+        self.assertRejected(self.vote_dict, "malformed proof of the number of choices")
+
+    def test_values_out_of_range(self):
+        pk = self.election.public_key
+        proof = self.vote_dict["answers"][0]["individual_proofs"][0][0]
+        proof["response"] = str(pk.q)
+        self.assertRejected(self.vote_dict, "challenge or response out of range")
+
+        proof["response"] = "0"
+        choice = self.vote_dict["answers"][0]["choices"][1]
+        choice["alpha"] = "2"
+        self.assertRejected(self.vote_dict, "outside the election&#39;s group")
+
+    def test_malformed_vote(self):
+        self.assertRejected("{not json", "the vote is malformed")
+        del self.vote_dict["answers"][0]["choices"][0]["beta"]
+        self.assertRejected(self.vote_dict, "the vote is malformed")
+
+    def test_null_values(self):
+        def nulled(path):
+            vote_dict = copy.deepcopy(self.vote_dict)
+            parent = vote_dict
+            for key in path[:-1]:
+                parent = parent[key]
+            parent[path[-1]] = None
+            return vote_dict
+
+        answer = ("answers", 0)
+        proof = answer + ("overall_proof", 0)
+        for path in [
+            ("answers",),
+            answer,
+            answer + ("choices",),
+            answer + ("choices", 0),
+            answer + ("choices", 0, "alpha"),
+            answer + ("choices", 1, "beta"),
+            answer + ("individual_proofs",),
+            answer + ("individual_proofs", 0),
+            answer + ("overall_proof",),
+            proof,
+            proof + ("commitment",),
+            proof + ("commitment", "A"),
+            proof + ("challenge",),
+            proof + ("response",),
+        ]:
+            vote_dict = nulled(path)
+            self.set_vote(vote_dict)
+            response = self.client.get(
+                "/helios/elections/%s/cast_confirm" % self.election.uuid
+            )
+            assert response.status_code == 200, path
+
+            response, num_rejected = self.cast(vote_dict)
+            assert response.status_code == 200, path
+            assert b"malformed" in response.content, path
+            assert num_rejected == 1, path
+
+        assert not models.CastVote.objects.filter(voter=self.voter).exists()
+
+    def test_confirmation_page_skips_group_check(self):
+        self.set_vote(self.vote_dict)
+        with opcounters.counting() as counting:
+            response = self.client.get(
+                "/helios/elections/%s/cast_confirm" % self.election.uuid
+            )
+        assert response.status_code == 200
+        assert counting.counts["modexp"]["count"] == 0
+
+    def test_batch_group_membership(self):
+        pk = self.election.public_key
+        elements = [pow(pk.g, random.randrange(1, pk.q), pk.p) for _ in range(5)]
+        assert algs.EGCiphertext.check_group_membership_batch(elements, pk)
+
+        # 2 is not in the group, and its order has no small factor
+        assert pow(2, pk.q, pk.p) != 1
+        assert not algs.EGCiphertext.check_group_membership_batch(elements + [2], pk)
+        assert not algs.EGCiphertext.check_group_membership_batch([pk.p - 1], pk)
+
+
+class CryptoCounterTests(FrozenElectionMixin, TestCase):
+    def tearDown(self):
+        opcounters.enable()
+        super(CryptoCounterTests, self).tearDown()
+
+    def login_admin(self):
+        admin = self.election.admin
+        admin.admin_p = True
+        admin.save()
+        session = self.client.session
+        session["user"] = {"type": admin.user_type, "user_id": admin.user_id}
+        session["csrf_token"] = "token"
+        session.save()
+
+    def test_counted(self):
+        @opcounters.counted("proof_verify")
+        def verify(depth):
+            if depth:
+                verify(depth - 1)
+            return opcounters.modexp(3, 5, 7)
+
+        with opcounters.counting() as counting:
+            assert verify(2) == pow(3, 5, 7)
+
+        # the nested calls are counted once, unlike the exponentiations
+        assert counting.counts["proof_verify"]["count"] == 1
+        assert counting.counts["modexp"]["count"] == 3
+        assert counting.counts["proof_verify"]["seconds"] > 0
+        assert counting.counts["decrypt"] == {"count": 0, "seconds": 0.0}
+
+        opcounters.disable()
+        before = opcounters.snapshot()
+        verify(0)
+        assert opcounters.snapshot() == before
+
+        # counting a block turns the counters on for it only
+        with opcounters.counting() as counting:
+            verify(0)
+        assert counting.counts["modexp"]["count"] == 1
+        assert not opcounters.is_enabled()
+
+    def test_tally_operations(self):
+        with opcounters.counting() as tally:
+            self.election.compute_tally()
+        with opcounters.counting() as decrypt:
+            self.election.helios_trustee_decrypt()
+        with opcounters.counting() as combine:
+            self.election.combine_decryptions()
+
+        # one decryption factor and proof per choice
+        assert tally.counts["modexp"]["count"] == 0
+        assert decrypt.counts["decrypt"]["count"] == 2
+        assert decrypt.counts["proof_generate"]["count"] == 2
+        assert decrypt.counts["modexp"]["count"] > 0
+        assert combine.counts["dlog_lookup"]["count"] == 2
+        assert combine.counts["inverse"]["count"] == 2
+        assert "dlog_lookup=2" in opcounters.format_counts(combine.counts)
+
+    def test_task_logs(self):
+        with self.assertLogs("election_compute_tally", "INFO") as logs:
+            tasks.election_compute_tally(self.election.id)
+        assert "crypto operations: none" in logs.output[0]
+
+        with self.assertLogs("tally_helios_decrypt", "INFO") as logs:
+            tasks.tally_helios_decrypt(self.election.id)
+        assert "proof_generate=2" in logs.output[0]
+
+    def test_prometheus_text(self):
+        with opcounters.counting() as counting:
+            opcounters.modexp(3, 5, 7)
+
+        text = opcounters.prometheus_text(counting.counts, {"pid": 12})
+        assert 'helios_crypto_operations_total{operation="modexp",pid="12"} 1\n' in text
+        assert "# TYPE helios_crypto_operation_seconds_total counter" in text
+        assert len(text.splitlines()) == 4 + 2 * len(opcounters.OPERATIONS)
+
+    def test_stats_pages(self):
+        self.login_admin()
+
+        response = self.client.get("/helios/stats/crypto")
+        assert b"proof_verify" in response.content
+        assert b"Counting is on." in response.content
+
+        response = self.client.get("/helios/stats/crypto/metrics")
+        assert response["Content-Type"].startswith("text/plain")
+        assert b'helios_crypto_operations_total{operation="modexp",pid="' in (
+            response.content
+        )
+
+        response = self.client.post(
+            "/helios/stats/crypto/switch", {"csrf_token": "token", "enabled": "0"}
+        )
+        assert response.status_code == 302
+        assert not opcounters.is_enabled()
+
+        # picked up by the processes running tasks, before each one
+        opcounters.enable()
+        tasks.election_generate_qr_codes.delay(self.election.id)
+        assert not opcounters.is_enabled()
+
+        response = self.client.post(
+            "/helios/stats/crypto/switch", {"csrf_token": "token", "enabled": "1"}
+        )
+        assert opcounters.is_enabled()
+
+
 class UtilityTests(TestCase):
 
     def test_qr_code_creation_base64(self):
@@ -6,8 +6,10 @@ import pytest
 import unittest
 
 from django.core import mail
-from django.db import IntegrityError, transaction
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from helios_auth import models
 from helios_auth.auth_systems import AUTH_SYSTEMS
@@ -35,6 +37,32 @@ class UserModelTests(unittest.TestCase):
                 self.assertEqual(u.id, u2.id)
                 self.assertEqual(u2.info["name"], new_name)
 
+    def test_get_by_type_and_id_cached(self):
+        u = models.User.update_or_create(
+            user_type="password",
+            user_id="foobar_cached",
+            info={"name": "Foo Bar", "password": "secret"},
+        )
+        models.User.get_by_type_and_id("password", "foobar_cached")
+
+        with CaptureQueriesContext(connection) as queries:
+            u2 = models.User.get_by_type_and_id("password", "foobar_cached")
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(u2.id, u.id)
+
+        # the password is not cached, but still read when needed
+        cached = cache.get(models.User.cache_key("password", "foobar_cached"))
+        self.assertNotIn("info", cached.__dict__)
+        self.assertNotIn("token", cached.__dict__)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(u2.info["password"], "secret")
+        self.assertEqual(len(queries), 1)
+
+        u.name = "Foo2 Bar"
+        u.save()
+        u2 = models.User.get_by_type_and_id("password", "foobar_cached")
+        self.assertEqual(u2.name, "Foo2 Bar")
+
     def test_can_create_election(self):
         """
         check that auth systems have the can_create_election call and that it's true for the common ones